@@ -0,0 +1,146 @@
+"""
+Parity check and benchmark for the tvlist extractor.
+
+    python benchmarks/bench_extractor.py [--items 3000] [--repeat 3]
+
+1. Parity: the lxml extractor must yield exactly the same records as the
+   original BeautifulSoup logic on benchmarks/fixtures/tvlist_sample.html.
+   Exits with status 1 on any difference.
+2. Benchmark: the fixture's items are replicated into a full-history sized
+   page and both extractors are timed on it; peak RSS of each is measured in
+   a fresh child process.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.extractor import extract_records, extract_records_bs4
+
+FIXTURE = os.path.join(ROOT, 'benchmarks', 'fixtures', 'tvlist_sample.html')
+TODAY = '2000-01-01'
+
+EXTRACTORS = {
+    'bs4': extract_records_bs4,
+    'lxml': extract_records,
+}
+
+
+def load_fixture():
+    with open(FIXTURE, encoding='utf-8') as f:
+        return f.read()
+
+
+def check_parity(html):
+    expected = list(extract_records_bs4(html, today=TODAY))
+    actual = list(extract_records(html, today=TODAY))
+    if not expected:
+        print("parity: fixture produced no records")
+        return False
+    if expected == actual:
+        print(f"parity: OK ({len(actual)} records)")
+        return True
+
+    print(f"parity: FAILED (bs4={len(expected)} records, lxml={len(actual)} records)")
+    for i, (a, b) in enumerate(zip(expected, actual)):
+        if a != b:
+            print(f"  first difference at record {i}:")
+            print(f"    bs4:  {a}")
+            print(f"    lxml: {b}")
+            break
+    return False
+
+
+def build_page(html, items):
+    """
+    Repeats the fixture's tvlist items until the page holds `items` entries,
+    renumbering episodes and magnets so every record stays distinct.
+    """
+    start = html.index('<ul id="tvlist">') + len('<ul id="tvlist">')
+    end = html.index('</ul>', start)
+    blocks = re.findall(r'<li class="ylist-items">.*?</li>', html[start:end], re.S)
+
+    out = []
+    for i in range(items):
+        block = blocks[i % len(blocks)]
+        n = i // len(blocks)
+        block = re.sub(r'<span>(\d+)</span>', lambda m: f'<span>{int(m.group(1)) + n * 10000}</span>', block, count=1)
+        block = block.replace('urn:btih:', f'urn:btih:{n:08x}')
+        out.append(block)
+    return html[:start] + '\n'.join(out) + html[end:]
+
+
+def peak_rss_kb():
+    # ru_maxrss 会从父进程继承（fork/exec 后不清零），优先用本进程的 VmHWM
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def timed_run(name, html):
+    before = peak_rss_kb()
+    t0 = time.perf_counter()
+    count = sum(1 for _ in EXTRACTORS[name](html, today=TODAY))
+    elapsed = time.perf_counter() - t0
+    return {"count": count, "seconds": elapsed, "peak_mb": (peak_rss_kb() - before) / 1024}
+
+
+def bench(items, repeat):
+    results = {}
+    for name in EXTRACTORS:
+        best = None
+        for _ in range(repeat):
+            # 每次在新进程里跑，峰值内存互不干扰
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--run', name, '--items', str(items)],
+                capture_output=True, text=True, check=True
+            )
+            run = json.loads(proc.stdout)
+            if best is None or run["seconds"] < best["seconds"]:
+                best = run
+        results[name] = best
+        print(f"{name:>5}: {best['count']} records in {best['seconds'] * 1000:.0f} ms, "
+              f"+{best['peak_mb']:.0f} MB peak RSS")
+
+    speedup = results['bs4']['seconds'] / results['lxml']['seconds']
+    print(f"speedup: {speedup:.1f}x")
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--items', type=int, default=3000, help="episodes on the synthetic page")
+    arg_parser.add_argument('--repeat', type=int, default=3, help="runs per extractor, best time wins")
+    arg_parser.add_argument('--run', choices=list(EXTRACTORS), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    html = load_fixture()
+    if args.run:
+        # 子进程模式：只跑一个提取器，结果以 JSON 输出
+        print(json.dumps(timed_run(args.run, build_page(html, args.items))))
+        return
+
+    if not check_parity(html):
+        sys.exit(1)
+
+    page = build_page(html, args.items)
+    print(f"page: {args.items} items, {len(page) / 1024 / 1024:.1f} MB")
+    if not check_parity(page):
+        sys.exit(1)
+    bench(args.items, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
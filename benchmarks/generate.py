@@ -0,0 +1,188 @@
+"""
+Synthetic dataset generator for the benchmark suite.
+
+    python benchmarks/generate.py [--sizes 1k 10k 100k] [--out benchmarks/data] [--seed 4869]
+
+For every size it writes
+  tvlist_<size>.html  a data page shaped like www.sbsub.com/data/ (newest first)
+  magnets_<size>.db   that page run through the real extractor + ingest
+
+The mix follows the live site: numbered TV episodes with 1-6 magnets spread
+over WEBRIP/BDRIP/... groups, an M-movie every ~40 episodes, a few labels the
+parser cannot read and the odd entry without a date or magnet. Output is
+deterministic for a given seed.
+"""
+import os
+import sys
+import random
+import hashlib
+import argparse
+from html import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.db import Database
+from utils.extractor import extract_records
+from utils.ingest import ingest
+
+DATA_DIR = os.path.join(ROOT, 'benchmarks', 'data')
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000}
+SEED = 4869
+
+# (值, 权重)
+RESOLUTIONS = [('1080P', 60), ('720P', 25), ('2160P', 4), ('4K', 3), ('', 8)]
+SUBTITLES = [('简日', 45), ('繁日', 25), ('简繁日双语', 12), ('简日双语', 8), ('简体', 5), ('繁体', 5)]
+CONTAINERS = [('MP4', 60), ('MKV', 35), ('AVI', 5)]
+SOURCES = [('WEBRIP', 55), ('BDRIP', 25), ('HDTV', 10), ('数码重映', 5), ('webrip', 5)]
+SEPARATORS = [('·', 85), (' · ', 15)]
+TITLE_WORDS = ['黑衣组织', '消失的', '签名', '密室', '杀人事件', '侦探', '列车', '雪山', '怪盗基德',
+               '红与黑', '的阴谋', '（前篇）', '（后篇）', '绑架', '幽灵船', '博物馆']
+
+PAGE_HEAD = '''<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>数据 - SBSUB</title>
+</head>
+<body>
+<div id="tvcontainer">
+  <ul id="tvlist">
+'''
+PAGE_TAIL = '''  </ul>
+  <div class="loadMore loadA">加载全部</div>
+</div>
+</body>
+</html>
+'''
+
+
+def _pick(rnd, choices):
+    values, weights = zip(*choices)
+    return rnd.choices(values, weights)[0]
+
+
+def _magnet(rnd, i):
+    digest = hashlib.sha1(f"{rnd.random()}-{i}".encode()).hexdigest()
+    return f"magnet:?xt=urn:btih:{digest}&amp;dn=sbsub_{i}"
+
+
+def _label(rnd):
+    if rnd.random() < 0.02:
+        # 解析器认不出的标签
+        return rnd.choice(['合集', '外挂字幕', 'SP 特别篇'])
+    resolution = _pick(rnd, RESOLUTIONS)
+    return f"{resolution}{_pick(rnd, SEPARATORS)}{_pick(rnd, SUBTITLES)}{_pick(rnd, CONTAINERS)}"
+
+
+def _date(rnd, day):
+    if rnd.random() < 0.01:
+        return None
+    year, rest = 1996 + day // 365, day % 365
+    text = f"{year:04d}-{rest // 28 % 12 + 1:02d}-{rest % 28 + 1:02d}"
+    return text.replace('-', '/') if rnd.random() < 0.2 else text
+
+
+def generate_items(rows, seed=SEED):
+    """
+    Episode entries holding about `rows` magnets in total, oldest first:
+    dicts with episode, title, date and groups [(source, [(label, magnet)])].
+    """
+    rnd = random.Random(seed)
+    items = []
+    total = 0
+    tv = movie = 0
+    while total < rows:
+        if rnd.random() < 0.025:
+            movie += 1
+            episode = f"M{movie}" if rnd.random() < 0.8 else f"剧场版{movie}"
+        else:
+            tv += 1
+            episode = str(tv)
+
+        groups = []
+        for _ in range(1 if rnd.random() < 0.7 else 2):
+            links = []
+            for _ in range(rnd.randint(1, 3)):
+                # 偶尔有空链接，提取时会被跳过
+                magnet = '' if rnd.random() < 0.01 else _magnet(rnd, total)
+                links.append((_label(rnd), magnet))
+                total += 1
+            groups.append((_pick(rnd, SOURCES), links))
+
+        title = ''.join(rnd.sample(TITLE_WORDS, rnd.randint(2, 4)))
+        items.append({"episode": episode, "title": title, "date": _date(rnd, tv * 7), "groups": groups})
+    return items
+
+
+def render_item(item):
+    parts = ['    <li class="ylist-items">', '      <div class="resdiv-l">',
+             f'        <span>{escape(item["episode"])}</span>',
+             f'        <span class="restitle">{escape(item["title"])}</span>']
+    for source, links in item["groups"]:
+        parts.append('        <div class="btn-group">')
+        parts.append(f'          <a class="btn btn-sm" href="javascript:;">{escape(source)}</a>')
+        for label, magnet in links:
+            parts.append('          <div class="resbox">')
+            parts.append(f'            <label class="resb">{escape(label)}</label>')
+            parts.append(f'            <div class="d-flex"><input class="reslink form-control" value="{magnet}" readonly></div>')
+            parts.append('          </div>')
+        parts.append('        </div>')
+    parts.append('      </div>')
+    date = f'<span>{item["date"]}</span>' if item["date"] else ''
+    parts.append(f'      <div class="resdiv-r">{date}</div>')
+    parts.append('    </li>')
+    return '\n'.join(parts)
+
+
+def render_page(items):
+    # 页面和真实站点一样从新到旧排列
+    return PAGE_HEAD + '\n'.join(render_item(item) for item in reversed(items)) + '\n' + PAGE_TAIL
+
+
+def build_database(path, html):
+    """
+    Fresh database at `path` filled from `html` through the scraper's own
+    extract + ingest path. Returns the ingest summary.
+    """
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    database = Database(path)
+    database.init()
+    try:
+        with database.write() as conn:
+            return ingest(conn, list(extract_records(html)))
+    finally:
+        database.close()
+
+
+def dataset_paths(size, out=DATA_DIR):
+    return os.path.join(out, f'tvlist_{size}.html'), os.path.join(out, f'magnets_{size}.db')
+
+
+def generate(size, out=DATA_DIR, seed=SEED):
+    html_path, db_path = dataset_paths(size, out)
+    os.makedirs(out, exist_ok=True)
+    html = render_page(generate_items(SIZES[size], seed))
+    with open(html_path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    summary = build_database(db_path, html)
+    return html_path, db_path, summary
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+    arg_parser.add_argument('--out', default=DATA_DIR, help="output directory")
+    arg_parser.add_argument('--seed', type=int, default=SEED)
+    args = arg_parser.parse_args()
+
+    for size in args.sizes:
+        html_path, db_path, summary = generate(size, args.out, args.seed)
+        print(f"{size}: {summary['inserted']} rows -> {os.path.relpath(db_path)}, "
+              f"{os.path.getsize(html_path) / 1024 / 1024:.1f} MB page -> {os.path.relpath(html_path)}")
+
+
+if __name__ == '__main__':
+    main()
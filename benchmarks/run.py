@@ -0,0 +1,337 @@
+"""
+Benchmark suite: times the hot paths on synthetic datasets and writes the
+results as JSON so runs can be compared across commits.
+
+    python benchmarks/run.py [--sizes 1k 10k] [--only parse_title api_magnets] [--repeat 5]
+                             [--data benchmarks/data] [--output results.json]
+
+Missing datasets are generated first (see benchmarks/generate.py). Every
+benchmark works on a copy of the dataset, so runs never affect each other.
+Default output: benchmarks/results/<UTC timestamp>_<commit>.json
+
+Benchmarks:
+  parse_title      every resb label of the page, cold cache and warm cache
+  extract          lxml tvlist extraction of the saved page
+  ingest           all-new rows into an empty DB, then the same batch again (unchanged)
+  api_magnets      GET /api/magnets variants, response cache cold and warm
+  api_options      GET /api/options, response cache cold and warm
+  api_search       GET /api/search with FTS, short (substring) and mixed terms, cache cold and warm
+  emby_missing     missing/downloadable diff against a 90% complete Emby snapshot
+  startup          web_server import time and peak RSS in a fresh interpreter, after
+                   import and after the app lifespan startup (independent of size)
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import platform
+import argparse
+import datetime
+import tempfile
+import statistics
+import subprocess
+from html import unescape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.generate import SIZES, DATA_DIR, dataset_paths, generate
+from utils.db import Database, db
+from utils.parser import parse_title, _parse_cached
+from utils.extractor import extract_records
+from utils.ingest import ingest
+from utils.emby import missing_episodes
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+LABEL_RE = re.compile(r'<label class="resb">(.*?)</label>')
+# 这些模块只应在任务运行时加载，API 进程启动后不该出现
+HEAVY_MODULES = ('feedparser', 'httpx', 'apscheduler', 'lxml', 'bs4', 'playwright', 'monitor_rss')
+
+STARTUP_SCRIPT = """
+import sys, json, time, asyncio, resource
+started = time.perf_counter()
+import web_server
+import_ms = (time.perf_counter() - started) * 1000
+import_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+from utils.db import db
+db.path = sys.argv[1]
+
+async def main():
+    async with web_server.lifespan(web_server.app):
+        pass
+
+asyncio.run(main())
+print(json.dumps({
+    "import_ms": import_ms,
+    "import_rss_kb": import_rss,
+    "startup_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+    "heavy": [name for name in sys.argv[2:] if name in sys.modules],
+}))
+"""
+
+MAGNETS_QUERIES = [
+    "page=1&page_size=24",
+    "page=5&page_size=24&status=existing",
+    "page=1&page_size=24&q=%E4%BE%A6%E6%8E%A2",      # q=侦探
+    "page=1&page_size=24&resolution=1080P&subtitle=%E7%AE%80%E6%97%A5",
+    "page=1&page_size=24&best=true",
+]
+
+SEARCH_QUERIES = [
+    "q=%E7%AE%80%E6%97%A5%E5%8F%8C%E8%AF%AD",          # q=简日双语（FTS）
+    "q=%E7%AE%80%E6%97%A5",                            # q=简日（短词，子串扫描）
+    "q=1080p+%E7%AE%80%E6%97%A5%E5%8F%8C%E8%AF%AD",    # q=1080p 简日双语
+]
+
+
+def measure(fn, repeat, setup=None):
+    """
+    Runs fn() `repeat` times (setup() before each run, untimed) and returns
+    timing stats in milliseconds plus the last return value.
+    """
+    times = []
+    value = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        value = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    stats = {
+        "runs": repeat,
+        "min_ms": round(min(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "mean_ms": round(statistics.fmean(times), 3),
+    }
+    return stats, value
+
+
+class Dataset:
+    def __init__(self, size, data_dir):
+        self.size = size
+        self.html_path, self.db_path = dataset_paths(size, data_dir)
+        if not (os.path.exists(self.html_path) and os.path.exists(self.db_path)):
+            print(f"[{size}] generating dataset...")
+            generate(size, data_dir)
+        with open(self.html_path, encoding='utf-8') as f:
+            self.html = f.read()
+        with sqlite3.connect(self.db_path) as conn:
+            self.rows = conn.execute("SELECT COUNT(*) FROM magnets").fetchone()[0]
+        self.tmp = tempfile.mkdtemp(prefix=f'bench_{size}_')
+
+    def copy_db(self, name):
+        path = os.path.join(self.tmp, f'{name}.db')
+        shutil.copy(self.db_path, path)
+        return path
+
+    def cleanup(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+# --- 各项基准 ---
+
+def bench_parse_title(ds, repeat):
+    titles = [unescape(label) for label in LABEL_RE.findall(ds.html)]
+    run = lambda: [parse_title(title) for title in titles]
+    cold, _ = measure(run, repeat, setup=_parse_cached.cache_clear)
+    warm, _ = measure(run, repeat)
+    return [
+        dict(cold, variant="cold", calls=len(titles), distinct=len(set(titles))),
+        dict(warm, variant="warm", calls=len(titles), distinct=len(set(titles))),
+    ]
+
+
+def bench_extract(ds, repeat):
+    stats, count = measure(lambda: sum(1 for _ in extract_records(ds.html)), repeat)
+    return [dict(stats, records=count, page_mb=round(len(ds.html.encode()) / 1024 / 1024, 2))]
+
+
+def bench_ingest(ds, repeat):
+    records = list(extract_records(ds.html))
+    results = []
+    for variant in ("fresh", "unchanged"):
+        database = None
+
+        def setup():
+            nonlocal database
+            if database is not None:
+                database.close()
+            path = os.path.join(ds.tmp, 'ingest.db')
+            if variant == "unchanged":
+                shutil.copy(ds.db_path, path)
+            else:
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+            database = Database(path)
+            database.init()
+
+        def run():
+            with database.write() as conn:
+                return ingest(conn, records)
+
+        stats, summary = measure(run, repeat, setup)
+        database.close()
+        results.append(dict(stats, variant=variant, records=len(records),
+                            inserted=summary['inserted'], unchanged=summary['unchanged']))
+    return results
+
+
+def _use_database(path):
+    # web_server 和 run_read/run_write 都使用 utils.db 里的共享实例
+    db.close()
+    db.path = path
+    db.schema_version = None
+    db.init()
+
+
+def _bench_api(ds, repeat, queries):
+    import web_server
+    from fastapi.testclient import TestClient
+
+    _use_database(ds.copy_db('api'))
+    results = []
+    with TestClient(web_server.app) as client:
+        for query in queries:
+            def run():
+                res = client.get(query)
+                res.raise_for_status()
+                return len(res.content)
+
+            cold, size = measure(run, repeat, setup=web_server.response_cache.clear)
+            warm, _ = measure(run, repeat)
+            results.append(dict(cold, variant="cold", query=query, bytes=size))
+            results.append(dict(warm, variant="warm", query=query, bytes=size))
+    return results
+
+
+def bench_api_magnets(ds, repeat):
+    return _bench_api(ds, repeat, [f"/api/magnets?{q}" for q in MAGNETS_QUERIES])
+
+
+def bench_api_options(ds, repeat):
+    return _bench_api(ds, repeat, ["/api/options"])
+
+
+def bench_api_search(ds, repeat):
+    return _bench_api(ds, repeat, [f"/api/search?{q}" for q in SEARCH_QUERIES])
+
+
+def bench_emby_missing(ds, repeat):
+    host, tmdb_id = "http://bench", "30983"
+    path = ds.copy_db('emby')
+    database = Database(path)
+    database.init()
+    with database.write() as conn:
+        nums = [row[0] for row in conn.execute(
+            "SELECT DISTINCT episode_num FROM magnets WHERE kind = 'tv' ORDER BY episode_num")]
+        # 媒体库里有 90% 的集，缺失分散在各处
+        owned = [num for num in nums if num % 10]
+        conn.executemany("INSERT INTO emby_episodes (host, tmdb_id, item_id, episode_num) VALUES (?, ?, ?, ?)",
+                         [(host, tmdb_id, f"item{num}", num) for num in owned])
+    try:
+        def run():
+            with database.read() as conn:
+                return missing_episodes(conn, host, tmdb_id)
+
+        stats, result = measure(run, repeat)
+    finally:
+        database.close()
+    return [dict(stats, max_episode=result['max_episode'], missing=result['missing_count'],
+                 downloadable=result['downloadable_count'], ranges=len(result['missing']))]
+
+
+def bench_startup(ds, repeat):
+    # 每次都是新解释器，导入耗时不受缓存的模块影响（ru_maxrss 在 Linux 上单位是 KB）
+    path = ds.copy_db('startup')
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, path, *HEAVY_MODULES],
+                             cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    times = [run["import_ms"] for run in runs]
+    last = runs[-1]
+    return [{
+        "runs": repeat,
+        "min_ms": round(min(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "mean_ms": round(statistics.fmean(times), 3),
+        "import_rss_mb": round(statistics.median(run["import_rss_kb"] for run in runs) / 1024, 1),
+        "startup_rss_mb": round(statistics.median(run["startup_rss_kb"] for run in runs) / 1024, 1),
+        "modules": last["modules"],
+        "heavy_modules": last["heavy"],
+    }]
+
+
+BENCHMARKS = {
+    "parse_title": bench_parse_title,
+    "extract": bench_extract,
+    "ingest": bench_ingest,
+    "api_magnets": bench_api_magnets,
+    "api_options": bench_api_options,
+    "api_search": bench_api_search,
+    "emby_missing": bench_emby_missing,
+    "startup": bench_startup,
+}
+
+
+def environment():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git('rev-parse', 'HEAD'),
+        "dirty": bool(git('status', '--porcelain', '--untracked-files=no')),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['1k', '10k'])
+    arg_parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    arg_parser.add_argument('--repeat', type=int, default=5, help="timed runs per case")
+    arg_parser.add_argument('--data', default=DATA_DIR, help="dataset directory")
+    arg_parser.add_argument('--output', help="result file (default: benchmarks/results/<timestamp>_<commit>.json)")
+    args = arg_parser.parse_args()
+
+    # web_server 按相对路径挂载 static/
+    os.chdir(ROOT)
+    report = {"environment": environment(), "repeat": args.repeat, "results": []}
+    for size in args.sizes:
+        ds = Dataset(size, args.data)
+        try:
+            for name in args.only:
+                for case in BENCHMARKS[name](ds, args.repeat):
+                    entry = {"benchmark": name, "size": size, "rows": ds.rows, **case}
+                    report["results"].append(entry)
+                    label = case.get("variant") or ""
+                    detail = case.get("query", "")
+                    print(f"[{size}] {name:<13} {label:<9} median {case['median_ms']:>10.2f} ms  {detail}")
+        finally:
+            ds.cleanup()
+
+    output = args.output
+    if not output:
+        env = report["environment"]
+        stamp = env["timestamp"].replace(':', '').replace('-', '').split('+')[0]
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{(env['commit'] or 'unknown')[:8]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"results written to {os.path.relpath(output)}")
+
+
+if __name__ == '__main__':
+    main()
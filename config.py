@@ -1,10 +1,21 @@
 import os
 import logging
+from logging.handlers import RotatingFileHandler
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
 DB_PATH = os.path.join(DATA_DIR, 'project4869.db')
+# 抓取到的原始页面快照（可离线重新解析入库）
+SNAPSHOT_DIR = os.path.join(DATA_DIR, 'snapshots')
+SNAPSHOT_KEEP = 30
+# 爬虫浏览器的 cookie / localStorage（版权页同意状态），下次抓取时复用
+BROWSER_STATE_PATH = os.path.join(DATA_DIR, 'browser_state.json')
+
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+# Log files that can be viewed from the web UI
+LOG_NAMES = ('scraper', 'monitor', 'web_server')
 
 def setup_logger(name):
     """
@@ -20,7 +31,8 @@ def setup_logger(name):
     if not logger.handlers:
         # File Handler
         log_file = os.path.join(LOGS_DIR, f"{name}.log")
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        # 按大小轮转，避免日志无限增长
+        file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
         file_formatter = logging.Formatter('[%(asctime)s] %(levelname)s - %(message)s')
         file_handler.setFormatter(file_formatter)
         logger.addHandler(file_handler)
@@ -53,6 +65,78 @@ CREATE TABLE IF NOT EXISTS magnets (
 );
 """
 
+# Key/value store for bookkeeping (e.g. data_version, bumped on every write to magnets)
+CREATE_META_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS app_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Full-text index over titles and tags (external content table, kept in sync by triggers).
+# The trigram tokenizer matches arbitrary substrings, so CJK titles such as "简日双语"
+# work without word segmentation. Terms shorter than 3 characters can't use the index.
+FTS_COLUMNS = "episode, raw_title, episode_title, resolution, subtitle, source_type, container"
+
+CREATE_FTS_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS magnets_fts USING fts5(
+    {FTS_COLUMNS},
+    content='magnets', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS magnets_fts_ai AFTER INSERT ON magnets BEGIN
+    INSERT INTO magnets_fts (rowid, {FTS_COLUMNS})
+    VALUES (new.id, new.episode, new.raw_title, new.episode_title, new.resolution, new.subtitle, new.source_type, new.container);
+END;
+
+CREATE TRIGGER IF NOT EXISTS magnets_fts_ad AFTER DELETE ON magnets BEGIN
+    INSERT INTO magnets_fts (magnets_fts, rowid, {FTS_COLUMNS})
+    VALUES ('delete', old.id, old.episode, old.raw_title, old.episode_title, old.resolution, old.subtitle, old.source_type, old.container);
+END;
+
+CREATE TRIGGER IF NOT EXISTS magnets_fts_au AFTER UPDATE ON magnets BEGIN
+    INSERT INTO magnets_fts (magnets_fts, rowid, {FTS_COLUMNS})
+    VALUES ('delete', old.id, old.episode, old.raw_title, old.episode_title, old.resolution, old.subtitle, old.source_type, old.container);
+    INSERT INTO magnets_fts (rowid, {FTS_COLUMNS})
+    VALUES (new.id, new.episode, new.raw_title, new.episode_title, new.resolution, new.subtitle, new.source_type, new.container);
+END;
+"""
+
+# 变更日志：magnets 的每次增删改记一行，seq 单调递增，作为增量同步的游标
+# 只保留最近 CHANGE_LOG_KEEP 条，更早的游标需要全量重新同步
+CHANGE_LOG_KEEP = 100000
+
+CREATE_CHANGES_SQL = f"""
+CREATE TABLE IF NOT EXISTS magnet_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    magnet_id INTEGER,
+    series_id INTEGER,
+    episode_num INTEGER,
+    changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS magnets_log_ai AFTER INSERT ON magnets BEGIN
+    INSERT INTO magnet_changes (op, magnet_id, series_id, episode_num)
+    VALUES ('insert', new.id, new.series_id, new.episode_num);
+END;
+
+CREATE TRIGGER IF NOT EXISTS magnets_log_au AFTER UPDATE ON magnets BEGIN
+    INSERT INTO magnet_changes (op, magnet_id, series_id, episode_num)
+    VALUES ('update', new.id, new.series_id, new.episode_num);
+END;
+
+CREATE TRIGGER IF NOT EXISTS magnets_log_ad AFTER DELETE ON magnets BEGIN
+    INSERT INTO magnet_changes (op, magnet_id, series_id, episode_num)
+    VALUES ('delete', old.id, old.series_id, old.episode_num);
+END;
+
+CREATE TRIGGER IF NOT EXISTS magnet_changes_prune AFTER INSERT ON magnet_changes
+WHEN new.seq % 1000 = 0 BEGIN
+    DELETE FROM magnet_changes WHERE seq <= new.seq - {CHANGE_LOG_KEEP};
+END;
+"""
+
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
 # Emby Configuration
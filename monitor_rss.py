@@ -1,35 +1,24 @@
+import time
+import asyncio
 import feedparser
-import sqlite3
+import httpx
 import datetime
-from config import DB_PATH, SBSUB_RSS_URL, CREATE_TABLE_SQL, USER_AGENT, setup_logger
-from utils.parser import parse_title
+from config import USER_AGENT, setup_logger
+from utils.parser import parse_title, episode_key, parse_cache_info
+from utils.ingest import ingest
+from utils.feed import fetch_feed, get_feed_state, save_feed_state, HostLimiter, FETCH_TIMEOUT
+from utils.series import list_feeds
+from utils.db import db
+from utils.metrics import rss_fetch_seconds, rss_parse_seconds, record_parse_stats
 
 # Configure logging
 logger = setup_logger('monitor')
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(CREATE_TABLE_SQL)
-    conn.commit()
-    return conn
+    return db.init()
 
-def monitor():
-    conn = init_db()
-    cursor = conn.cursor()
-
-    logger.info(f"Fetching RSS feed from {SBSUB_RSS_URL}")
-    
-    # Use agent to avoid 403
-    feed = feedparser.parse(SBSUB_RSS_URL, agent=USER_AGENT)
-
-    if feed.bozo:
-        logger.error(f"Error parsing RSS feed: {feed.bozo_exception}")
-        return
-
-    logger.info(f"Found {len(feed.entries)} entries.")
-    
-    new_count = 0
+def parse_entries(feed, series_id):
+    records = []
     for entry in feed.entries:
         raw_title = entry.title
         magnet_link = None
@@ -42,49 +31,130 @@ def monitor():
                 if enc.get('type') == 'application/x-bittorrent' or enc.get('href', '').startswith('magnet:'):
                     magnet_link = enc.get('href')
                     break
-        
+
         if not magnet_link:
             # logger.debug(f"No magnet link found for {raw_title}")
             continue
 
-        # Check if exists
-        cursor.execute("SELECT id FROM magnets WHERE magnet_link = ?", (magnet_link,))
-        if cursor.fetchone():
-            continue
-
         # Parse
         parsed = parse_title(raw_title)
-        
+
         # Publish date
         pub_date = datetime.datetime.now().isoformat()
         if hasattr(entry, 'published'):
             pub_date = entry.published
 
+        episode_num, kind = episode_key(parsed['episode'])
+        records.append({
+            "magnet_link": magnet_link,
+            "series_id": series_id,
+            "episode": parsed['episode'],
+            "episode_num": episode_num,
+            "kind": kind,
+            "resolution": parsed['resolution'],
+            "container": parsed['container'],
+            "subtitle": parsed['subtitle'],
+            "source_type": parsed['source_type'],
+            "raw_title": raw_title,
+            "publish_date": pub_date
+        })
+    return records
+
+def process_feed(source, result):
+    """
+    Parses and stores a changed feed body. Runs in a worker thread, so the
+    event loop keeps fetching the other feeds meanwhile.
+    """
+    url = source['url']
+    started = time.perf_counter()
+    cache_before = parse_cache_info()
+    feed = feedparser.parse(result['body'], response_headers=result['headers'])
+
+    if feed.bozo:
+        logger.error(f"Error parsing RSS feed {url}: {feed.bozo_exception}")
+        return False
+
+    logger.info(f"[{source['series']}] Found {len(feed.entries)} entries in {url}.")
+    records = parse_entries(feed, source['series_id'])
+
+    cache_after = parse_cache_info()
+    record_parse_stats("rss", cache_after.hits - cache_before.hits, cache_after.misses - cache_before.misses)
+    rss_parse_seconds.observe(time.perf_counter() - started)
+
+    # 已收录的磁链一律跳过（update=False），新条目在同一事务里批量写入
+    with db.write() as conn:
+        summary = ingest(conn, records, update=False, series_id=source['series_id'])
+        # 入库成功后才记录新的校验值，失败时下次会重新处理
+        save_feed_state(conn.cursor(), url, result['etag'], result['last_modified'],
+                        result['content_hash'], changed=True)
+
+    for record in summary['new']:
+        logger.info(f"Added new: {record['raw_title']}")
+    logger.info(f"[{source['series']}] {url} finished. Added {summary['inserted']} new items.")
+    return True
+
+async def check_feed(client, limiter, source, state):
+    """
+    Fetches one feed and stores what changed. Errors are logged and reported
+    as False, so one broken feed never stops the others.
+    """
+    url = source['url']
+    # 条件请求：带上次的 ETag / Last-Modified，未变化时不下载也不解析
+    async with limiter(url):
+        started = time.perf_counter()
         try:
-            cursor.execute("""
-                INSERT INTO magnets 
-                (magnet_link, episode, resolution, container, subtitle, source_type, raw_title, publish_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                magnet_link, 
-                parsed['episode'], 
-                parsed['resolution'], 
-                parsed['container'], 
-                parsed['subtitle'], 
-                parsed['source_type'], 
-                raw_title,
-                pub_date
-            ))
-            new_count += 1
-            logger.info(f"Added new: {raw_title}")
-        except sqlite3.IntegrityError:
-            pass # Already exists (double check)
-        except Exception as e:
-            logger.error(f"Error inserting {raw_title}: {e}")
-
-    conn.commit()
-    conn.close()
-    logger.info(f"RSS check finished. Added {new_count} new items.")
+            result = await fetch_feed(client, url, state, USER_AGENT)
+        except httpx.HTTPError as e:
+            rss_fetch_seconds.observe(time.perf_counter() - started, status="error")
+            logger.error(f"Error fetching RSS feed {url}: {e!r}")
+            return False
+    rss_fetch_seconds.observe(time.perf_counter() - started, status=result['status'])
+
+    try:
+        if result['status'] != 'changed':
+            with db.write() as conn:
+                save_feed_state(conn.cursor(), url, result['etag'], result['last_modified'],
+                                result['content_hash'], changed=False)
+            reason = "304 Not Modified" if result['status'] == 'not_modified' else "content unchanged"
+            logger.info(f"RSS feed {url} not changed ({reason}), skipping.")
+            return True
+        return await asyncio.to_thread(process_feed, source, result)
+    except Exception as e:
+        logger.exception(f"Error processing RSS feed {url}: {e}")
+        return False
+
+async def monitor_feeds():
+    """
+    One check of every enabled feed, all fetched concurrently (at most
+    PER_HOST_LIMIT at a time per site), so a cycle takes about as long as
+    the slowest feed. Returns True when every feed was processed.
+    """
+    with db.read() as conn:
+        cursor = conn.cursor()
+        sources = list_feeds(cursor, enabled_only=True)
+        states = [get_feed_state(cursor, source['url']) for source in sources]
+
+    if not sources:
+        logger.info("No RSS feeds enabled.")
+        return True
+    logger.info(f"Checking {len(sources)} RSS feeds...")
+
+    limiter = HostLimiter()
+    async with httpx.AsyncClient(timeout=FETCH_TIMEOUT, follow_redirects=True) as client:
+        results = await asyncio.gather(*(check_feed(client, limiter, source, state)
+                                         for source, state in zip(sources, states)))
+    failed = results.count(False)
+    if failed:
+        logger.warning(f"RSS check finished with {failed}/{len(sources)} failed feeds.")
+    return not failed
+
+def monitor():
+    """
+    One RSS check. Returns True when every feed was processed (or unchanged),
+    False if any feed had fetch/parse errors.
+    """
+    init_db()
+    return asyncio.run(monitor_feeds())
 
 if __name__ == "__main__":
     monitor()
@@ -1,16 +1,23 @@
 import socket
-import sqlite3
-import re
 import sys
+import signal
+import argparse
 import time
+import asyncio
 import logging
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
-from datetime import datetime
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 
 # 引入项目原有配置
-from config import DB_PATH, CREATE_TABLE_SQL, setup_logger
-from utils.parser import parse_title
+from config import setup_logger
+from utils.extractor import extract_records, SECTION_LISTS, SECTIONS, DEFAULT_SECTIONS
+from utils.ingest import ingest, get_item_hashes, save_item_hashes
+from utils.queries import get_max_episodes
+from utils.snapshots import save_snapshot, load_snapshot
+from utils.jobs import report_progress
+from utils.metrics import PhaseClock
+from utils.parser import parse_cache_info
+from utils.browser import ScraperSession, BLOCKED_RESOURCE_TYPES
+from utils.db import db
 
 # 配置日志
 logger = setup_logger('scraper')
@@ -19,6 +26,18 @@ logger = setup_logger('scraper')
 TARGET_DOMAIN = "www.sbsub.com"
 TARGET_URL = "https://www.sbsub.com/data/"
 
+# 每个分区在同一个浏览器里用单独的页面并发加载，分区的选择器见 utils.extractor.SECTIONS。
+# 页面上找不到分区时记 WARNING 并在进度里上报 missing_sections，不会悄悄跳过
+SECTION_LIST_IDS = {name: section['list'] for name, section in SECTIONS.items()}
+ANY_SECTION_SELECTOR = ", ".join(f"{section['container']}, #{SECTION_LIST_IDS[name]}"
+                                 for name, section in SECTIONS.items())
+
+# 版权页最多等这么久（毫秒）看是否出现；已保存同意状态时一般不会再出现，只短暂确认
+GATE_TIMEOUT = 3000
+GATE_RECHECK_TIMEOUT = 1500
+# 连续这么多次滚动后都没有新条目（且网络已空闲），就认为列表加载完了
+STALL_CHECKS = 3
+
 def check_connectivity(host, port=443, timeout=5):
     """检查网络连通性"""
     try:
@@ -30,250 +49,335 @@ def check_connectivity(host, port=443, timeout=5):
         return False
 
 def init_db():
-    """初始化数据库连接"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(CREATE_TABLE_SQL)
-    conn.commit()
-    return conn
-
-def run_scraper():
+    """初始化数据库（WAL + 迁移）"""
+    return db.init()
+
+# 已加载条目中最小的集号（列表从新到旧排列，越往下集数越小）；集号取 pattern 的第一个分组或整个匹配
+MIN_LOADED_EPISODE_JS = """
+([selector, pattern]) => {
+    const re = new RegExp(pattern);
+    let min = null;
+    for (const span of document.querySelectorAll(selector)) {
+        const match = span.textContent.trim().match(re);
+        if (match) {
+            const num = parseInt(match[1] ?? match[0], 10);
+            if (min === null || num < min) min = num;
+        }
+    }
+    return min;
+}
+"""
+
+# 分区列表的 HTML，页面上没有时为 null
+LIST_HTML_JS = "listId => document.getElementById(listId)?.outerHTML ?? null"
+
+def get_known_max_episodes():
+    """数据库中各 kind 已收录的最大集号 {kind: max}（空库为 {}）"""
+    with db.read() as conn:
+        return get_max_episodes(conn.cursor())
+
+async def reached_known_episodes(page, name, known_max):
+    """页面是否已经加载到数据库里已有的集数"""
+    selector = f"#{SECTION_LIST_IDS[name]} li.ylist-items .resdiv-l > span:first-child"
+    min_loaded = await page.evaluate(MIN_LOADED_EPISODE_JS, [selector, SECTIONS[name]['number_re']])
+    return min_loaded is not None and min_loaded <= known_max
+
+async def pass_gate(session, page):
+    """处理版权声明页；点了同意返回 True（之后保存 cookie / localStorage，下次抓取不用再点）"""
+    try:
+        gate_trigger = page.get_by_text("版权声明确认", exact=False).first
+        try:
+            await gate_trigger.wait_for(state="visible",
+                                        timeout=GATE_RECHECK_TIMEOUT if session.has_state else GATE_TIMEOUT)
+        except PlaywrightTimeoutError:
+            return False
+
+        logger.info("Handling Copyright Gate...")
+        await gate_trigger.click()
+        agree_btn = page.get_by_text("我已认真阅读并同意以上说明", exact=False).first
+        await agree_btn.wait_for(state="visible", timeout=5000)
+        await agree_btn.click()
+        logger.info("Clicked agree.")
+        await agree_btn.wait_for(state="hidden", timeout=5000)
+        return True
+    except Exception as e:
+        logger.warning(f"Gate warning: {e}")
+        return False
+
+async def load_list(session, page, name, known_max=None, loaded=None):
+    """
+    点击分区的“加载全部”并滚动到底，直到列表不再增长。
+    known_max 不为 None 时（增量模式），加载到已收录的集数就停。
+    loaded: 各分区已加载条目数，所有分区共用，用于上报进度。
+    """
+    container = SECTIONS[name]['container']
+    item_selector = f"#{SECTION_LIST_IDS[name]} li.ylist-items"
+    loaded = loaded if loaded is not None else {}
+    try:
+        logger.info(f"[{name}] Looking for 'Load All' button...")
+        load_btn = page.locator(f"{container} .loadMore.loadA")
+        try:
+            await load_btn.wait_for(state="visible", timeout=10000)
+        except PlaywrightTimeoutError:
+            logger.warning(f"[{name}] Load button not immediately visible...")
+
+        if known_max is not None and await reached_known_episodes(page, name, known_max):
+            # 第一页已经包含已知集数，无需“加载全部”
+            logger.info(f"[{name}] First page already reaches known episodes, skipping 'Load All'.")
+            return
+        if not (await load_btn.count() > 0 and await load_btn.is_visible()):
+            logger.warning(f"[{name}] 'Load All' button not visible. Assuming page loaded or selector error.")
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            await session.wait_for_idle(page)
+            return
+
+        count = await page.locator(item_selector).count()
+        logger.info(f"[{name}] Found '.loadA', clicking...")
+        await load_btn.click()
+
+        logger.info(f"[{name}] Button clicked. Start scrolling to the bottom...")
+        stalls = 0
+        while True:
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+
+            if known_max is not None and await reached_known_episodes(page, name, known_max):
+                logger.info(f"[{name}] Reached known episodes after {count} items, stop scrolling.")
+                break
+
+            # 新条目一插入就返回；没有请求在进行时说明不会再有新条目，也不再干等
+            current_count = await session.wait_for_more(page, item_selector, count)
+            if current_count > count:
+                logger.info(f"[{name}] Loaded items: {current_count} ...")
+                loaded[name] = current_count
+                report_progress(loaded=sum(loaded.values()), sections=loaded)
+                count = current_count
+                stalls = 0
+            else:
+                stalls += 1
+                if stalls >= STALL_CHECKS:
+                    logger.info(f"[{name}] List fully loaded! Total items: {count}")
+                    break
+    except Exception as e:
+        logger.warning(f"[{name}] Load/Scroll error: {e}")
+
+async def scrape_section(session, name, known_max, loaded):
+    """
+    一个分区一个页面：打开数据页、处理版权页、加载全部并滚动到底。
+    返回 (分区列表的 HTML，页面上没有这个分区时为 None, 是否点了版权页同意, 各阶段耗时)。
+    """
+    list_id = SECTION_LIST_IDS[name]
+    clock = PhaseClock()
+    page = await session.new_page()
+    try:
+        await page.goto(TARGET_URL, timeout=90000)
+        clock.lap("navigation")
+        agreed = await pass_gate(session, page)
+        clock.lap("gate")
+
+        # 任一分区出现说明页面已经渲染出来，这时还找不到本分区就跳过，不再干等
+        try:
+            await page.locator(ANY_SECTION_SELECTOR).first.wait_for(state="attached", timeout=10000)
+        except PlaywrightTimeoutError:
+            pass
+        if await page.locator(f"{SECTIONS[name]['container']}, #{list_id}").count() == 0:
+            logger.warning(f"[{name}] Section not found on the page "
+                           f"(no {SECTIONS[name]['container']} / #{list_id}); check SECTIONS.")
+            return None, agreed, clock.timings
+
+        await load_list(session, page, name, known_max, loaded)
+        html = await page.evaluate(LIST_HTML_JS, list_id)
+        clock.lap("scroll")
+        if html is None:
+            logger.warning(f"[{name}] Section container found but list #{list_id} is missing; check SECTIONS.")
+            return None, agreed, clock.timings
+        logger.info(f"[{name}] Section done: " + ", ".join(f"{k}={v:.2f}s" for k, v in clock.timings.items()))
+        return html, agreed, clock.timings
+    finally:
+        await session.close_page(page)
+
+async def scrape_sections(names, known, block_resources, clock):
+    """
+    所有分区在同一个浏览器里并发加载，总耗时接近最慢的分区。
+    返回各分区列表拼成的 HTML，一个分区都没拿到时返回空串。
+    """
+    loaded = {}
+    async with async_playwright() as p:
+        logger.info("Launching browser (Headless Mode)...")
+        async with ScraperSession(p, block_types=BLOCKED_RESOURCE_TYPES if block_resources else ()) as session:
+            clock.lap("launch")
+
+            logger.info(f"Navigating to {TARGET_URL} ({', '.join(names)})")
+            report_progress(phase="loading", loaded=0)
+            results = await asyncio.gather(
+                *(scrape_section(session, name, known.get(name), loaded) for name in names),
+                return_exceptions=True
+            )
+            clock.lap("sections")
+
+            parts = []
+            missing = []
+            agreed = False
+            for name, result in zip(names, results):
+                if isinstance(result, Exception):
+                    logger.error(f"[{name}] Page load failed: {result}")
+                    continue
+                html, section_agreed, timings = result
+                # 各分区的阶段耗时带上分区名（navigation_tv …），和顶层阶段一起上报到 /metrics
+                clock.timings.update({f"{phase}_{name}": seconds for phase, seconds in timings.items()})
+                agreed = agreed or section_agreed
+                if html:
+                    parts.append(html)
+                else:
+                    missing.append(name)
+            if missing:
+                # 配置了却没抓到的分区要让人看得到，选择器失效时不至于一直空跑
+                logger.warning(f"Configured sections missing from the page: {', '.join(missing)}")
+                report_progress(missing_sections=missing)
+            if agreed:
+                try:
+                    await session.save_state()
+                except Exception as e:
+                    logger.warning(f"Failed to save browser state: {e}")
+
+    if not parts:
+        return ""
+    # 只保留各分区的列表，快照更小，解析也不用扫整页
+    return "<html><body>\n" + "\n".join(parts) + "\n</body></html>"
+
+def run_scraper(full=False, skip_unchanged=True, block_resources=True, sections=DEFAULT_SECTIONS):
+    """
+    full=False: 增量模式，各分区加载到已收录的最大集数就停止滚动
+    full=True:  加载全部历史
+    skip_unchanged: 跳过页面结构与上次完全相同的条目
+    block_resources: 不下载图片、字体、样式表等（页面异常时可关掉）
+    sections: 要抓取的分区（SECTIONS 的键，默认只抓核对过的）
+    """
     # 1. 网络检查
+    report_progress(phase="connecting", mode="full" if full else "incremental")
     if not check_connectivity(TARGET_DOMAIN):
         return
 
     # 2. 初始化数据库
     logger.info("Initializing DB...")
-    conn = init_db()
-    cursor = conn.cursor()
-    
-    html_content = ""
+    init_db()
 
-    # 3. 启动浏览器抓取源码
-    with sync_playwright() as p:
-        logger.info("Launching browser (Headless Mode)...")
-        browser = p.chromium.launch(headless=True) 
-        context = browser.new_context(viewport={'width': 1920, 'height': 1080})
-        page = context.new_page()
-        
-        logger.info(f"Navigating to {TARGET_URL}")
-        try:
-            page.goto(TARGET_URL, timeout=90000)
-            
-            # --- 处理版权页 ---
-            try:
-                gate_trigger = page.get_by_text("版权声明确认", exact=False)
-                page.wait_for_timeout(3000)
-                
-                if gate_trigger.count() > 0 and gate_trigger.first.is_visible():
-                    logger.info("Handling Copyright Gate...")
-                    gate_trigger.first.click()
-                    page.wait_for_timeout(1000)
-                    
-                    agree_btn = page.get_by_text("我已认真阅读并同意以上说明", exact=False)
-                    if agree_btn.count() > 0:
-                        agree_btn.first.click()
-                        logger.info("Clicked agree.")
-                        page.wait_for_timeout(3000)
-            except Exception as e:
-                logger.warning(f"Gate warning: {e}")
-
-            # --- 点击 TV 版的“加载全部” ---
-            try:
-                logger.info("Looking for TV Section 'Load All' button...")
-                load_btn = page.locator("#tvcontainer .loadMore.loadA")
-                
-                try:
-                    load_btn.wait_for(state="visible", timeout=10000)
-                except:
-                    logger.warning("TV Load button not immediately visible...")
-
-                if load_btn.count() > 0 and load_btn.is_visible():
-                    logger.info("Found TV Section '.loadA', clicking...")
-                    load_btn.click()
-                    
-                    logger.info("Button clicked. Start scrolling to the bottom...")
-                    last_count = 0
-                    stable_checks = 0
-                    
-                    while True:
-                        current_count = page.locator('#tvlist li.ylist-items').count()
-                        page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                        
-                        if current_count != last_count:
-                            logger.info(f"Loaded items: {current_count} ...")
-                            last_count = current_count
-                            stable_checks = 0 
-                            page.wait_for_timeout(3000) 
-                        else:
-                            stable_checks += 1
-                            page.wait_for_timeout(2000)
-                            if stable_checks >= 4:
-                                logger.info(f"List fully loaded! Total items: {current_count}")
-                                break
-                else:
-                    logger.warning("TV 'Load All' button not visible. Assuming page loaded or selector error.")
-                    page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                    page.wait_for_timeout(3000)
+    known = {}
+    if not full:
+        known = {name: num for name, num in get_known_max_episodes().items()
+                 if name in SECTIONS and SECTIONS[name]['number_re'] and num > 0}
+    if known:
+        logger.info("Incremental mode: will stop once these episodes are loaded: "
+                    + ", ".join(f"{name} {num}" for name, num in known.items()))
+    else:
+        logger.info("Full mode: loading the entire history.")
 
-            except Exception as e:
-                logger.warning(f"Load/Scroll error: {e}")
+    # 各阶段耗时，随最终进度上报给 web 进程的 /metrics
+    clock = PhaseClock()
 
-            html_content = page.content()
-            
-        except Exception as e:
-            logger.error(f"Page load failed: {e}")
-        finally:
-            browser.close()
+    # 3. 启动浏览器抓取源码
+    html_content = asyncio.run(scrape_sections(list(sections), known, block_resources, clock))
+    clock.lap("teardown")
 
     if not html_content:
         logger.error("No HTML content retrieved.")
-        conn.close()
         return
 
+    # 保存原始页面，解析逻辑改动后可以离线重放，不必重新抓取
+    try:
+        name = save_snapshot(html_content)
+        logger.info(f"Saved page snapshot {name}")
+    except OSError as e:
+        logger.warning(f"Failed to save page snapshot: {e}")
+    clock.lap("snapshot")
+
+    return process_page(html_content, clock, skip_unchanged=skip_unchanged)
+
+def process_page(html_content, clock, skip_unchanged=True, today=None):
+    """解析页面并入库（抓取和快照重放共用）"""
     # 4. 解析与入库
     logger.info("Parsing content...")
-    soup = BeautifulSoup(html_content, 'lxml')
-    
-    tv_list = soup.find('ul', id='tvlist')
-    if not tv_list:
-        logger.error("Error: <ul id='tvlist'> not found!")
-        conn.close()
+    report_progress(phase="parsing")
+    with db.read() as conn:
+        known = get_item_hashes(conn.cursor()) if skip_unchanged else None
+    seen = {}
+    records = list(extract_records(html_content, today=today, known_hashes=known, seen_hashes=seen))
+    clock.lap("parse")
+    episodes = {(record['kind'], record['episode']) for record in records}
+    skipped = sum(1 for key, digest in seen.items() if known and known.get(key) == digest)
+    report_progress(phase="ingesting", parsed=len(records), episodes=len(episodes), skipped=skipped)
+    if not seen:
+        logger.error(f"Error: no episodes found in any section list ({', '.join(SECTION_LISTS)})!")
         return
+    logger.info(f"Extracted {len(records)} magnets from {len(episodes)} episodes "
+                f"({skipped} unchanged episodes skipped).")
 
-    items = tv_list.find_all('li', class_='ylist-items')
-    logger.info(f"Total items to process: {len(items)}")
-
-    count = 0
-    new_count = 0
-
-    for item in items:
-        # --- 基础信息 ---
-        div_l = item.find('div', class_='resdiv-l')
-        if not div_l: continue
-
-        spans_l = div_l.find_all('span', recursive=False)
-        if not spans_l: continue
-            
-        episode_raw = spans_l[0].get_text(strip=True)
-        if not (episode_raw.isdigit() or episode_raw.upper().startswith('M') or '剧场版' in episode_raw):
-            continue
-
-        episode = episode_raw
-        
-        title_span = div_l.find('span', class_='restitle')
-        ep_title = title_span.get_text(strip=True) if title_span else ""
-
-        # 日期
-        div_r = item.find('div', class_='resdiv-r')
-        publish_date = datetime.now().strftime("%Y-%m-%d")
-        if div_r:
-            date_spans = div_r.find_all('span')
-            if date_spans:
-                date_text = date_spans[-1].get_text(strip=True)
-                if re.match(r'\d{4}[-/]\d{2}[-/]\d{2}', date_text):
-                    publish_date = date_text
-
-        # --- 资源列表循环 ---
-        btn_groups = div_l.find_all('div', class_='btn-group')
-        
-        for group in btn_groups:
-            # 获取来源类型 (WEBRIP/数码重映)
-            type_link = group.find('a')
-            source_type_label = type_link.get_text(strip=True) if type_link else "Unknown"
-
-            # 获取所有 input
-            magnet_inputs = group.find_all('input', class_='reslink')
-            
-            if not magnet_inputs:
-                continue
-
-            for magnet_input in magnet_inputs:
-                magnet_link = magnet_input.get('value')
-                if not magnet_link: continue
-
-                # 精准查找 Label
-                detail_label = ""
-                parent_flex = magnet_input.find_parent('div')
-                if parent_flex:
-                    parent_container = parent_flex.find_parent('div')
-                    if parent_container:
-                        resb_label = parent_container.find('label', class_='resb')
-                        if resb_label:
-                            detail_label = resb_label.get_text(strip=True)
-                
-                # 兜底
-                if not detail_label:
-                    resb_label_fallback = group.find('label', class_='resb')
-                    detail_label = resb_label_fallback.get_text(strip=True) if resb_label_fallback else ""
-
-                # --- 【关键修改】 ---
-                # 直接使用 detail_label 作为存入数据库的 raw_title
-                # 这样前端列表里就只会显示 "1080P·简日MP4..." 这一段干净的文字
-                full_raw_title = detail_label
-                
-                # 为了提取 metadata，我们依然传这个字符串给 parser
-                # 只要 detail_label 里包含 "1080P", "MP4" 等关键字，parser 就能正常工作
-                parsed = parse_title(full_raw_title)
-                
-                resolution = parsed['resolution']
-                container = parsed['container']
-                source_type = parsed['source_type']
-                
-                # 如果 detail_label 里没写 WEBRIP，我们从外层按钮补救
-                if not source_type and source_type_label:
-                    source_type = source_type_label.upper()
-
-                # 字幕提取
-                subtitle = None
-                sub_match = re.search(r'·\s*(.*?)\s*(?=MP4|MKV|AVI)', detail_label, re.IGNORECASE)
-                if sub_match:
-                    subtitle = sub_match.group(1).strip()
-                else:
-                    if "简日" in detail_label: subtitle = "简日"
-                    elif "繁日" in detail_label: subtitle = "繁日"
-                    elif "简繁" in detail_label: subtitle = "简繁"
-                    elif "简体" in detail_label or "简" in detail_label: subtitle = "简体"
-                    elif "繁体" in detail_label or "繁" in detail_label: subtitle = "繁体"
+    # 一次性比对已有数据，只写入新增/变化的行，单个事务提交；条目指纹随同一事务保存
+    with db.write() as conn:
+        summary = ingest(conn, records)
+        save_item_hashes(conn.cursor(), seen)
+    clock.lap("db_write")
 
-                try:
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO magnets
-                        (magnet_link, episode, episode_title, resolution, container, subtitle, source_type, raw_title, publish_date)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        magnet_link,
-                        episode,
-                        ep_title,
-                        resolution,
-                        container,
-                        subtitle,
-                        source_type,
-                        full_raw_title, # 这里现在只有 detail_label
-                        publish_date
-                    ))
-                    if cursor.rowcount > 0:
-                        new_count += 1
-                except Exception as e:
-                    logger.error(f"DB Error: {e}")
-
-        count += 1
-        if count % 100 == 0:
-            conn.commit()
-            logger.info(f"Parsed {count} episodes...")
-
-    conn.commit()
-    conn.close()
-    
     logger.info("="*30)
     logger.info(f"SCRAPE SUMMARY")
-    logger.info(f"Total Items processed: {count}")
-    logger.info(f"New Records Added: {new_count}")
+    logger.info(f"Total Items processed: {len(episodes)}")
+    logger.info(f"Unchanged Items skipped: {skipped}")
+    logger.info(f"New Records Added: {summary['inserted']}")
+    logger.info(f"Records Updated: {summary['updated']}")
+    logger.info(f"Records Unchanged: {summary['unchanged']}")
+    logger.info(f"DB time: {summary['db_seconds']:.3f}s")
+    logger.info("Phase timings: " + ", ".join(f"{k}={v:.2f}s" for k, v in clock.timings.items()))
     logger.info("="*30)
+    cache = parse_cache_info()
+    report_progress(phase="done", inserted=summary['inserted'], updated=summary['updated'],
+                    unchanged=summary['unchanged'], skipped=skipped, timings=clock.timings,
+                    parse_cache={"hits": cache.hits, "misses": cache.misses})
+    return summary
+
+def run_replay(name="latest"):
+    """
+    离线重放：从保存的快照重新解析并入库，不启动浏览器。
+    所有条目都重新解析（通常是因为解析逻辑改了）。
+    """
+    clock = PhaseClock()
+    report_progress(phase="loading", snapshot=name)
+    init_db()
+    try:
+        html_content, info = load_snapshot(name)
+    except (FileNotFoundError, RuntimeError) as e:
+        logger.error(f"Cannot load snapshot: {e}")
+        return
+    logger.info(f"Replaying snapshot {info['name']}")
+    clock.lap("snapshot")
+    # 没有日期的条目按快照当天计
+    return process_page(html_content, clock, skip_unchanged=False,
+                        today=info['taken_at'].strftime("%Y-%m-%d"))
 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Scrape the sbsub data page into the magnets table.")
+    arg_parser.add_argument("--full", action="store_true", help="load the entire history instead of stopping at known episodes")
+    arg_parser.add_argument("--no-skip", action="store_true", help="parse every item, even when its markup is unchanged")
+    arg_parser.add_argument("--replay", nargs="?", const="latest", metavar="SNAPSHOT",
+                            help="re-run extraction and ingest from a stored page snapshot (default: latest) instead of scraping")
+    arg_parser.add_argument("--sections", default=",".join(DEFAULT_SECTIONS),
+                            help=f"comma-separated sections to scrape concurrently, of {','.join(SECTIONS)} "
+                                 f"(default: {','.join(DEFAULT_SECTIONS)}; the others are not verified against the live page yet)")
+    arg_parser.add_argument("--no-block", action="store_true",
+                            help="also load images, fonts and stylesheets (if the page misbehaves without them)")
+    args = arg_parser.parse_args()
+    sections = [name.strip() for name in args.sections.split(",") if name.strip()]
+    unknown = [name for name in sections if name not in SECTIONS]
+    if unknown or not sections:
+        arg_parser.error(f"unknown sections: {', '.join(unknown)}" if unknown else "no sections given")
+    # 任务取消时收到 SIGTERM：转成 SystemExit，让 finally 关闭浏览器、回滚未提交的写入
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
     try:
-        run_scraper()
+        if args.replay:
+            summary = run_replay(args.replay)
+        else:
+            summary = run_scraper(full=args.full, skip_unchanged=not args.no_skip,
+                                  block_resources=not args.no_block, sections=sections)
+        if summary is None:
+            sys.exit(1)
     except Exception as e:
         logger.exception("Fatal error in scraper process:")
         sys.exit(1)
\ No newline at end of file
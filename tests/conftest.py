@@ -0,0 +1,38 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import utils.db
+
+# web_server / monitor_rss 在导入时就调用 setup_logger，所以收集测试模块之前就把日志目录换掉，
+# 测试不会往仓库里的 logs/ 写东西
+_SESSION_LOGS_DIR = tempfile.mkdtemp(prefix='project4869-logs-')
+config.LOGS_DIR = _SESSION_LOGS_DIR
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_SESSION_LOGS_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def logs_dir(tmp_path, monkeypatch):
+    """Loggers set up during a test write to tmp_path/logs."""
+    path = tmp_path / 'logs'
+    monkeypatch.setattr(config, 'LOGS_DIR', str(path))
+    return path
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """A migrated database in tmp_path, used by run_read / run_write."""
+    database = utils.db.Database(str(tmp_path / 'test.db'))
+    database.init()
+    monkeypatch.setattr(utils.db, 'db', database)
+    yield database
+    database.close()
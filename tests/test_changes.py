@@ -0,0 +1,24 @@
+import asyncio
+import sqlite3
+
+from utils.changes import ChangeWatcher
+
+
+def test_watcher_survives_read_errors(caplog):
+    cursors = iter([1, sqlite3.OperationalError("database is locked"), sqlite3.OperationalError("database is locked"), 2])
+
+    async def read_cursor():
+        value = next(cursors, 2)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    async def run():
+        watcher = ChangeWatcher(read_cursor, interval=0.01)
+        # 出错后继续轮询，游标移动时照样唤醒等待者
+        return await watcher.wait(1, timeout=5), watcher
+
+    moved, watcher = asyncio.run(run())
+    assert moved
+    assert watcher.cursor == 2
+    assert "database is locked" in caplog.text
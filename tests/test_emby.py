@@ -0,0 +1,160 @@
+import asyncio
+
+import httpx
+import pytest
+
+from utils.emby import EmbyClient, EmbyError, missing_episodes
+
+HOST = 'http://emby.test'
+API_KEY = 'good-key'
+TMDB_ID = '30983'
+
+
+class FakeEmby:
+    """Minimal /Items endpoint: series lookup, paging and MinDateLastSaved."""
+
+    def __init__(self, count):
+        self.items = [
+            {"Id": f"i{n}", "IndexNumber": n, "DateLastSaved": f"2024-01-01T00:00:{n:02d}.0000000Z"}
+            for n in range(1, count + 1)
+        ]
+        self.calls = []
+
+    def add(self, item_id, number, saved, end=None):
+        self.items.append({"Id": item_id, "IndexNumber": number, "IndexNumberEnd": end, "DateLastSaved": saved})
+
+    def delete(self, item_id):
+        self.items = [item for item in self.items if item['Id'] != item_id]
+
+    def __call__(self, request):
+        if request.headers.get('X-Emby-Token') != API_KEY:
+            return httpx.Response(401)
+        params = dict(request.url.params)
+        self.calls.append(params)
+        if params.get('IncludeItemTypes') == 'Series':
+            found = params.get('AnyProviderIdEquals') == f'tmdb.{TMDB_ID}'
+            return httpx.Response(200, json={"Items": [{"Id": "S1"}] if found else []})
+
+        items = self.items
+        if params.get('MinDateLastSaved'):
+            items = [item for item in items if item['DateLastSaved'] >= params['MinDateLastSaved']]
+        start, limit = int(params.get('StartIndex', 0)), int(params['Limit'])
+        return httpx.Response(200, json={"Items": items[start:start + limit], "TotalRecordCount": len(items)})
+
+    def episode_calls(self):
+        return [c for c in self.calls if c.get('IncludeItemTypes') == 'Episode' and c['Limit'] != '0']
+
+
+class StubClient(EmbyClient):
+    def __init__(self, emby, **kwargs):
+        super().__init__(**kwargs)
+        self.emby = emby
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(transport=httpx.MockTransport(self.emby))
+        return self._client
+
+
+def sync(client, api_key=API_KEY, refresh=False):
+    async def run():
+        try:
+            return await client.sync_library(HOST + '/', api_key, TMDB_ID, refresh)
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+
+def stored_missing(database, max_episode):
+    with database.read() as conn:
+        return missing_episodes(conn, HOST, TMDB_ID, max_episode)['missing']
+
+
+def test_fetch_episodes_pages_and_expands_multi_episode_items():
+    emby = FakeEmby(7)
+    emby.add('double', 8, '2024-01-02T00:00:00.0000000Z', end=9)
+    client = StubClient(emby, page_size=3)
+
+    async def run():
+        try:
+            return await client.fetch_episodes(HOST, API_KEY, 'S1')
+        finally:
+            await client.close()
+    items = asyncio.run(run())
+
+    assert [c['StartIndex'] for c in emby.episode_calls()] == ['0', '3', '6']
+    assert len(items) == 8
+    assert items[-1]['numbers'] == [8, 9]
+
+
+def test_first_sync_is_full_then_served_from_cache(temp_db):
+    emby = FakeEmby(10)
+    emby.delete('i4')
+    client = StubClient(emby, page_size=4)
+
+    state, cached = sync(client)
+    assert not cached
+    assert state['item_count'] == 9
+    assert all('MinDateLastSaved' not in c for c in emby.episode_calls())
+    assert stored_missing(temp_db, 12) == [[4, 4], [11, 12]]
+
+    emby.calls.clear()
+    state, cached = sync(client)
+    assert cached
+    assert emby.episode_calls() == []
+
+
+def test_cached_library_rejects_bad_api_key(temp_db):
+    client = StubClient(FakeEmby(5))
+    sync(client)
+
+    with pytest.raises(EmbyError):
+        sync(client, api_key='revoked')
+    state, cached = sync(client)
+    assert cached
+
+
+def test_incremental_sync_uses_min_date_last_saved(temp_db):
+    emby = FakeEmby(10)
+    client = StubClient(emby, ttl=0)
+    state, _ = sync(client)
+    watermark = state['last_saved']
+    assert watermark == '2024-01-01T00:00:10.0000000Z'
+
+    emby.add('i11', 11, '2024-02-01T00:00:00.0000000Z')
+    emby.calls.clear()
+    state, cached = sync(client)
+
+    assert not cached
+    assert [c.get('MinDateLastSaved') for c in emby.episode_calls()] == [watermark]
+    assert state['item_count'] == 11
+    assert state['last_saved'] == '2024-02-01T00:00:00.0000000Z'
+    assert stored_missing(temp_db, 11) == []
+
+
+def test_deletion_falls_back_to_full_sync(temp_db):
+    emby = FakeEmby(10)
+    client = StubClient(emby, ttl=0)
+    sync(client)
+
+    emby.delete('i3')
+    emby.calls.clear()
+    state, _ = sync(client)
+
+    # 增量请求之后数量对不上，再全量拉一次
+    assert [c.get('MinDateLastSaved') is None for c in emby.episode_calls()] == [False, True]
+    assert state['item_count'] == 9
+    assert stored_missing(temp_db, 10) == [[3, 3]]
+
+
+def test_unknown_series_is_404(temp_db):
+    client = StubClient(FakeEmby(1))
+
+    async def run():
+        try:
+            return await client.sync_library(HOST, API_KEY, '1')
+        finally:
+            await client.close()
+    with pytest.raises(EmbyError) as err:
+        asyncio.run(run())
+    assert err.value.status_code == 404
@@ -0,0 +1,74 @@
+import os
+import re
+
+from lxml import html as lxml_html
+
+from utils.extractor import DEFAULT_SECTIONS, SECTION_LISTS, SECTIONS, extract_records, extract_records_bs4
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+TODAY = '2000-01-01'
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def test_tvlist_matches_bs4_reference():
+    page = load('tvlist_sample.html')
+    expected = list(extract_records_bs4(page, today=TODAY))
+    assert expected
+    assert list(extract_records(page, today=TODAY)) == expected
+
+
+def test_every_section_is_extracted():
+    records = list(extract_records(load('sections_sample.html'), today=TODAY))
+    keys = [(r['episode'], r['episode_num'], r['kind']) for r in records]
+    assert sorted(set(keys), key=keys.index) == [
+        ("1151", 1151, "tv"),
+        ("1150", 1150, "tv"),
+        ("M26", 26, "movie"),
+        ("M27", 27, "movie"),
+        ("剧场版 26", 26, "movie"),
+        ("SP1", 1, "special"),
+        ("OVA 12", 12, "special"),
+    ]
+    assert len(records) == 9
+
+
+def test_section_hash_keys_and_skipping():
+    page = load('sections_sample.html')
+    seen = {}
+    records = list(extract_records(page, today=TODAY, seen_hashes=seen))
+    assert {"1151", "M26", "movie:M27", "special:SP1", "special:OVA 12"} <= set(seen)
+
+    # 没变化的条目不再解析
+    assert list(extract_records(page, today=TODAY, known_hashes=seen)) == []
+    known = dict(seen, **{"movie:M27": "changed"})
+    assert [r['episode'] for r in extract_records(page, today=TODAY, known_hashes=known)] == ["M27", "M27"]
+    assert len(records) == 9
+
+
+def test_lists_limits_sections():
+    page = load('sections_sample.html')
+    kinds = {r['kind'] for r in extract_records(page, today=TODAY, lists={"splist": "special"})}
+    assert kinds == {"special"}
+
+
+def test_sections_match_fixture():
+    tree = lxml_html.fromstring(load('sections_sample.html'))
+    for name, section in SECTIONS.items():
+        assert tree.get_element_by_id(section['container'].lstrip('#'), None) is not None, name
+        assert SECTION_LISTS[section['list']] == name
+        labels = [span.text_content().strip() for span in tree.xpath(
+            f"//ul[@id='{section['list']}']/li[contains(@class, 'ylist-items')]/div[contains(@class, 'resdiv-l')]/span[1]")]
+        assert labels, name
+        if section['number_re']:
+            # 增量模式靠 number_re 认出集号才能提前停止
+            assert all(re.match(section['number_re'], label) for label in labels
+                       if name != "tv" or label.isdigit()), name
+
+
+def test_only_verified_sections_are_scraped_by_default():
+    assert DEFAULT_SECTIONS == ("tv",)
+    assert all(SECTIONS[name]['verified'] for name in DEFAULT_SECTIONS)
@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+
+import httpx
+import pytest
+
+import monitor_rss
+from utils.feed import HostLimiter, fetch_feed, get_feed_state
+
+URL = 'http://feeds.test/rss/'
+AGENT = 'test-agent'
+
+
+def rss(episodes, build_date='Mon, 01 Jan 2024 00:00:00 +0000'):
+    items = ''.join(
+        f'<item><title>[SBSUB][名侦探柯南][{ep}][1080P][简日][MP4]</title>'
+        f'<link>magnet:?xt=urn:btih:{hashlib.sha1(str(ep).encode()).hexdigest()}</link></item>'
+        for ep in episodes
+    )
+    return (f'<?xml version="1.0"?><rss version="2.0"><channel><title>test</title>'
+            f'<lastBuildDate>{build_date}</lastBuildDate>{items}</channel></rss>').encode()
+
+
+class FakeFeed:
+    """Serves one feed body with an ETag and answers If-None-Match with 304."""
+
+    def __init__(self, body):
+        self.body = body
+        self.requests = []
+
+    @property
+    def etag(self):
+        return '"' + hashlib.md5(self.body).hexdigest() + '"'
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if request.headers.get('If-None-Match') == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, content=self.body, headers={
+            'ETag': self.etag, 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT',
+            'Content-Type': 'application/rss+xml'})
+
+
+def fetch(handler, state):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await fetch_feed(client, URL, state, AGENT)
+    return asyncio.run(run())
+
+
+def test_not_modified_keeps_previous_validators():
+    feed = FakeFeed(rss([1, 2]))
+    state = {"etag": feed.etag, "last_modified": 'Sun, 31 Dec 2023 00:00:00 GMT', "content_hash": 'abc'}
+
+    result = fetch(feed, state)
+
+    sent = feed.requests[0].headers
+    assert sent['If-None-Match'] == feed.etag
+    assert sent['If-Modified-Since'] == state['last_modified']
+    assert sent['User-Agent'] == AGENT
+    assert result['status'] == 'not_modified'
+    assert result['body'] is None
+    # 304 没带校验值时沿用旧的
+    assert (result['etag'], result['last_modified'], result['content_hash']) == \
+        (state['etag'], state['last_modified'], 'abc')
+
+
+def test_first_fetch_sends_no_validators():
+    feed = FakeFeed(rss([1]))
+    result = fetch(feed, {})
+
+    assert 'If-None-Match' not in feed.requests[0].headers
+    assert 'If-Modified-Since' not in feed.requests[0].headers
+    assert result['status'] == 'changed'
+    assert result['etag'] == feed.etag
+    assert result['body'] == feed.body
+    assert result['headers']['content-type'] == 'application/rss+xml'
+
+
+def test_new_build_date_alone_is_unchanged():
+    first = fetch(FakeFeed(rss([1, 2])), {})
+    # 服务器不支持条件请求时，只有 lastBuildDate 变化也不重新解析
+    result = fetch(FakeFeed(rss([1, 2], build_date='Tue, 02 Jan 2024 00:00:00 +0000')),
+                   {"content_hash": first['content_hash']})
+    assert result['status'] == 'unchanged'
+    assert result['body'] is None
+
+    result = fetch(FakeFeed(rss([1, 2, 3])), {"content_hash": first['content_hash']})
+    assert result['status'] == 'changed'
+
+
+def test_http_error_raises():
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch(lambda request: httpx.Response(500), {})
+
+
+def test_check_feed_skips_unmodified_feed(temp_db, monkeypatch):
+    monkeypatch.setattr(monitor_rss, 'db', temp_db)
+    feed = FakeFeed(rss([1, 2, 3]))
+    source = {"url": URL, "series": "test", "series_id": 1}
+
+    def check():
+        with temp_db.read() as conn:
+            state = get_feed_state(conn.cursor(), URL)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(feed)) as client:
+                return await monitor_rss.check_feed(client, HostLimiter(), source, state)
+        assert asyncio.run(run())
+        with temp_db.read() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM magnets").fetchone()[0]
+            stored = conn.execute("SELECT etag, changed_at FROM feed_state WHERE url = ?", (URL,)).fetchone()
+        return count, stored
+
+    count, (etag, changed_at) = check()
+    assert count == 3
+    assert etag == feed.etag
+
+    count, stored = check()
+    assert feed.requests[-1].headers['If-None-Match'] == feed.etag
+    assert count == 3
+    assert stored == (etag, changed_at)
+
+    feed.body = rss([1, 2, 3, 4])
+    count, (new_etag, _) = check()
+    assert count == 4
+    assert new_etag == feed.etag != etag
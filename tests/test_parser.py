@@ -0,0 +1,29 @@
+import pytest
+
+from utils.parser import parse_title, parse_titles
+
+KEYS = ('episode', 'resolution', 'container', 'subtitle', 'source_type')
+
+# (title, (episode, resolution, container, subtitle, source_type))
+# Expected values are what the original one-regex-per-field parser returned.
+GOLDEN = [
+    ("[银色子弹][名侦探柯南][1190][1080P][MKV][简日双语]", ("1190", "1080P", "MKV", "CHS_JP", None)),
+    ("[SilverBullet][Detective Conan][Movie 27][1080P][BDRip][CHS_JP]", ("M27", "1080P", None, "CHS_JP", "BDRIP")),
+    ("名侦探柯南 第1000集 720P MP4", ("1000", "720P", "MP4", None, None)),
+    ("[SBSUB][Conan][M26][1080P][WEBRIP][CHT]", ("M26", "1080P", None, "CHT", "WEBRIP")),
+    ("1080P·简日MP4", (None, "1080P", "MP4", "CHS_JP", None)),
+    ("[2024][1080P][繁日]", (None, "1080P", None, "CHT_JP", None)),
+    ("名侦探柯南 剧场版 1080P", ("M10", "1080P", None, None, None)),
+    ("MP4K", (None, "4K", "MP4", None, None)),
+]
+
+
+@pytest.mark.parametrize("title, expected", GOLDEN)
+def test_parse_title(title, expected):
+    result = parse_title(title)
+    assert tuple(result[k] for k in KEYS) == expected
+
+
+def test_parse_titles_matches_parse_title():
+    titles = [title for title, _ in GOLDEN]
+    assert list(parse_titles(titles)) == [parse_title(title) for title in titles]
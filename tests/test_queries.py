@@ -0,0 +1,14 @@
+import pytest
+
+from utils.queries import MAX_EPISODE_LIST, parse_episode_ranges
+
+
+def test_parse_episode_ranges():
+    assert parse_episode_ranges("1-3, 40,2,12-10") == [1, 2, 3, 10, 11, 12, 40]
+    assert parse_episode_ranges("") == []
+
+
+@pytest.mark.parametrize("text", ["1-999999999", f"1-{MAX_EPISODE_LIST},{MAX_EPISODE_LIST + 5}", "a-3", "-5"])
+def test_parse_episode_ranges_rejects(text):
+    with pytest.raises(ValueError):
+        parse_episode_ranges(text)
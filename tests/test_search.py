@@ -0,0 +1,68 @@
+import pytest
+
+from utils.ingest import ingest
+from utils.queries import query_episodes
+from utils.search import search_episodes
+from utils.series import save_series
+
+
+def record(episode, label, series_id=1, title=None):
+    return {
+        "magnet_link": f"magnet:?xt=urn:btih:{series_id}-{episode}-{label}", "series_id": series_id,
+        "episode": str(episode), "episode_num": episode, "kind": "tv", "episode_title": title,
+        "resolution": label.split('·')[0], "container": label[-3:], "subtitle": None,
+        "source_type": "WEBRIP", "raw_title": label, "publish_date": "2024-01-01",
+    }
+
+
+@pytest.fixture
+def conn(temp_db):
+    with temp_db.write() as conn:
+        other = save_series(conn.cursor(), "other", "Other")
+        ingest(conn, [
+            record(1, "1080P·简日MP4", title="密室"),
+            record(2, "720P·繁日MKV"),
+            record(3, "1080P·简日双语MP4"),
+            record(3, "720P·简体MP4"),
+        ])
+        ingest(conn, [record(9, "1080P·简日双语MP4", series_id=other)], series_id=other)
+    with temp_db.read() as conn:
+        yield conn
+
+
+def episodes(result):
+    return sorted(item["episode"] for item in result["results"])
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("日", ["1", "2", "3"]),            # 1 字：子串扫描
+    ("简日", ["1", "3"]),               # 2 字：子串扫描
+    ("密室", ["1"]),                    # 2 字，只在标题里
+    ("简日双", ["3"]),                  # 3 字：FTS
+    ("1080p 简日", ["1", "3"]),          # FTS + 短关键字
+    ("#3 简体", ["3"]),
+    ("韩语", []),
+])
+def test_search_term_lengths(conn, q, expected):
+    result = search_episodes(conn, q)
+    assert episodes(result) == expected
+    assert result["total"] == len(expected)
+
+
+def test_search_returns_only_matching_magnets(conn):
+    result = search_episodes(conn, "简日")
+    by_episode = {item["episode"]: item["data"] for item in result["results"]}
+    assert [row["raw_title"] for row in by_episode["3"]] == ["1080P·简日双语MP4"]
+
+
+def test_search_is_scoped_by_series(conn):
+    other = conn.execute("SELECT id FROM series WHERE slug = 'other'").fetchone()[0]
+    assert episodes(search_episodes(conn, "简日双语")) == ["3"]
+    assert episodes(search_episodes(conn, "简日双语", series_id=other)) == ["9"]
+    assert episodes(search_episodes(conn, "简日", series_id=other)) == ["9"]
+
+
+@pytest.mark.parametrize("q, expected", [("简日", [3, 1]), ("简日双", [3]), ("密室", [1]), ("日 720p", [3, 2])])
+def test_episode_list_keywords(conn, q, expected):
+    result = query_episodes(conn, q=q, status="existing")
+    assert [ep["num"] for ep in result["episodes"]] == expected
@@ -0,0 +1,37 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import web_server
+from utils.ingest import ingest
+
+
+@pytest.fixture
+def client(temp_db, monkeypatch):
+    monkeypatch.setattr(web_server, 'db', temp_db)
+    web_server.response_cache.clear()
+    with TestClient(web_server.app) as test_client:
+        yield test_client
+    web_server.response_cache.clear()
+
+
+def test_cache_key_keeps_parameters_apart(client, temp_db):
+    with temp_db.write() as conn:
+        ingest(conn, [{
+            "magnet_link": "magnet:?xt=urn:btih:" + "a" * 40, "series_id": 1,
+            "episode": "1", "episode_num": 1, "kind": "tv", "episode_title": None,
+            "resolution": "1080P", "container": "MP4", "subtitle": "简日", "source_type": "WEBRIP",
+            "raw_title": "1080P·简日MP4", "publish_date": "2024-01-01",
+        }])
+
+    split = client.get("/api/magnets?q=1080p&series=1").json()
+    # q 的值本身是 "1080p&series=1"，不能命中上一个请求的缓存
+    joined = client.get("/api/magnets?q=1080p%26series%3D1").json()
+    assert split["total"] == 1
+    assert joined["total"] == 0
+
+
+@pytest.mark.parametrize("max_episode", [10 ** 9, -1])
+def test_emby_missing_rejects_out_of_range_max_episode(client, max_episode):
+    res = client.post("/api/emby/missing", json={"host": "http://emby.test", "api_key": "k",
+                                                 "max_episode": max_episode})
+    assert res.status_code == 400
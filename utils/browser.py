@@ -0,0 +1,155 @@
+import os
+import time
+import asyncio
+
+from config import BROWSER_STATE_PATH
+
+# 抓取只需要 DOM：图片、字体、样式表、音视频都不下载
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "stylesheet", "media"})
+VIEWPORT = {'width': 1280, 'height': 720}
+
+# 滚动后等待新条目出现的上限（毫秒）；条目一出现就返回，网络空闲后也不再等
+GROWTH_TIMEOUT = 10000
+# 没有进行中的请求持续这么久（毫秒）才算网络空闲
+IDLE_QUIET = 500
+IDLE_TIMEOUT = 5000
+# 等待时每次在页面里挂 MutationObserver 的时长（毫秒），之间检查网络状态
+WAIT_SLICE = 250
+
+# 等到匹配 selector 的元素多于 count 个（由 DOM 变化触发）或超时，返回当前个数
+WAIT_FOR_MORE_JS = """
+([selector, count, timeout]) => new Promise(resolve => {
+    const current = () => document.querySelectorAll(selector).length;
+    if (current() > count) return resolve(current());
+    let timer = null;
+    const observer = new MutationObserver(() => {
+        if (current() > count) {
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve(current());
+        }
+    });
+    observer.observe(document.body, {childList: true, subtree: true});
+    timer = setTimeout(() => { observer.disconnect(); resolve(current()); }, timeout);
+})
+"""
+
+
+class _Traffic:
+    """In-flight requests of one page and when that last changed."""
+
+    def __init__(self, page):
+        self.inflight = set()
+        self.changed_at = time.monotonic()
+        page.on("request", self._start)
+        page.on("requestfinished", self._finish)
+        # 被拦截的请求也会触发 requestfailed
+        page.on("requestfailed", self._finish)
+
+    def _start(self, request):
+        self.inflight.add(request)
+        self.changed_at = time.monotonic()
+
+    def _finish(self, request):
+        self.inflight.discard(request)
+        self.changed_at = time.monotonic()
+
+    def idle(self, quiet, since=0):
+        """No request in flight for `quiet` ms (counted from `since` at the earliest)."""
+        return not self.inflight and time.monotonic() - max(self.changed_at, since) >= quiet / 1000
+
+
+class ScraperSession:
+    """
+    One headless Chromium plus a browser context for a scrape, used as an
+    async context manager around an async_playwright() instance. Several
+    pages of the session can load concurrently and share its cookies.
+
+    Cookies / localStorage (e.g. the copyright-gate consent) are loaded from
+    and saved to state_path, so later runs skip the gate. Requests for
+    block_types are aborted. Pages from new_page() track their in-flight
+    requests, so the wait_* helpers return as soon as the page settles
+    instead of sleeping for a fixed time.
+    """
+
+    def __init__(self, playwright, state_path=BROWSER_STATE_PATH, block_types=BLOCKED_RESOURCE_TYPES):
+        self.playwright = playwright
+        self.state_path = state_path
+        self.block_types = frozenset(block_types or ())
+        self.browser = None
+        self.context = None
+        self._traffic = {}
+
+    @property
+    def has_state(self):
+        return bool(self.state_path) and os.path.exists(self.state_path)
+
+    async def __aenter__(self):
+        self.browser = await self.playwright.chromium.launch(headless=True)
+        try:
+            self.context = await self.browser.new_context(
+                viewport=VIEWPORT,
+                storage_state=self.state_path if self.has_state else None
+            )
+        except Exception:
+            # 状态文件损坏时当作没有，重新过一遍版权页
+            self.context = await self.browser.new_context(viewport=VIEWPORT)
+        if self.block_types:
+            await self.context.route("**/*", self._route)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.browser.close()
+        return False
+
+    async def _route(self, route):
+        if route.request.resource_type in self.block_types:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def new_page(self):
+        page = await self.context.new_page()
+        self._traffic[page] = _Traffic(page)
+        return page
+
+    async def close_page(self, page):
+        self._traffic.pop(page, None)
+        await page.close()
+
+    async def save_state(self):
+        """Writes the context's cookies / localStorage to state_path."""
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + '.tmp'
+        await self.context.storage_state(path=tmp_path)
+        os.replace(tmp_path, self.state_path)
+
+    async def wait_for_more(self, page, selector, count, timeout=GROWTH_TIMEOUT, quiet=IDLE_QUIET):
+        """
+        Waits until more than `count` elements match `selector` and returns
+        the number of matches. Gives up after `timeout` ms, or earlier once
+        the page has had no request in flight for `quiet` ms (nothing more
+        is coming).
+        """
+        traffic = self._traffic[page]
+        # 滚动触发的请求可能有延迟，空闲时间从开始等待时算起
+        started = time.monotonic()
+        deadline = started + timeout / 1000
+        while True:
+            current = await page.evaluate(WAIT_FOR_MORE_JS, [selector, count, WAIT_SLICE])
+            if current > count or traffic.idle(quiet, started) or time.monotonic() >= deadline:
+                return current
+
+    async def wait_for_idle(self, page, quiet=IDLE_QUIET, timeout=IDLE_TIMEOUT):
+        """
+        Waits until the page has had no request in flight for `quiet` ms.
+        Returns False if it was still busy after `timeout` ms.
+        """
+        traffic = self._traffic[page]
+        deadline = time.monotonic() + timeout / 1000
+        while not traffic.idle(quiet):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
@@ -0,0 +1,133 @@
+import gzip
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖，没有时只提供 gzip
+    brotli = None
+
+# 小于该大小的响应不压缩，压缩收益抵不过开销
+MIN_COMPRESS_SIZE = 1024
+
+
+def get_data_version(cursor):
+    """
+    Returns the current data version stored in app_meta (0 if never written).
+    """
+    cursor.execute("SELECT value FROM app_meta WHERE key = 'data_version'")
+    row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+
+def bump_data_version(cursor):
+    """
+    Increments the data version. Every write path to `magnets` must call this
+    (inside its transaction) so cached snapshots get invalidated.
+    """
+    cursor.execute("""
+        INSERT INTO app_meta (key, value) VALUES ('data_version', '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+    """)
+
+
+def _accepts(request, encoding):
+    accept = request.headers.get('accept-encoding', '')
+    return any(part.split(';')[0].strip() == encoding for part in accept.split(','))
+
+
+def is_not_modified(request, etag):
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+
+def _cache_headers(etag):
+    return {
+        'ETag': etag,
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding'
+    }
+
+
+def not_modified_response(etag):
+    return Response(status_code=304, headers=_cache_headers(etag))
+
+
+class CachedResponse:
+    """
+    A JSON payload serialized once, plus its pre-compressed variants.
+    """
+
+    def __init__(self, etag, payload):
+        self.etag = etag
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.gzip = None
+        self.br = None
+        if len(self.body) >= MIN_COMPRESS_SIZE:
+            self.gzip = gzip.compress(self.body, compresslevel=6)
+            if brotli is not None:
+                self.br = brotli.compress(self.body, quality=5)
+
+    def render(self, request):
+        if is_not_modified(request, self.etag):
+            return not_modified_response(self.etag)
+
+        headers = _cache_headers(self.etag)
+        body = self.body
+        if self.br is not None and _accepts(request, 'br'):
+            body = self.br
+            headers['Content-Encoding'] = 'br'
+        elif self.gzip is not None and _accepts(request, 'gzip'):
+            body = self.gzip
+            headers['Content-Encoding'] = 'gzip'
+        return Response(content=body, media_type='application/json', headers=headers)
+
+
+class SnapshotCache:
+    """
+    In-memory LRU of rendered responses keyed by (data_version, request key).
+    Entries from older versions are dropped as soon as a newer version is seen.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_etag(version, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+        return f'"v{version}-{digest}"'
+
+    def get(self, version, key):
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, version, key, payload):
+        entry = CachedResponse(self.make_etag(version, key), payload)
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
@@ -0,0 +1,146 @@
+import json
+import asyncio
+import logging
+
+from utils.magnets import attach_trackers
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 5000
+# 等待变更时检查游标的间隔（秒）；爬虫在另一个进程里写库，只能轮询
+POLL_INTERVAL = 0.5
+# 读游标出错（如数据库被锁）时退避，间隔逐次翻倍直到这个上限（秒）
+MAX_POLL_BACKOFF = 10
+
+
+def get_cursor(cursor):
+    cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM magnet_changes")
+    return cursor.fetchone()[0]
+
+
+def log_reset(cursor):
+    """
+    Replaces the whole change log with one 'reset' entry, so every client
+    does a full resync. For bulk deletes like clearing the database.
+    """
+    cursor.execute("DELETE FROM magnet_changes")
+    cursor.execute("INSERT INTO magnet_changes (op) VALUES ('reset')")
+
+
+def get_changes(conn, since=None, limit=DEFAULT_LIMIT, series_id=None):
+    """
+    Magnets changed after cursor `since`:
+    {"cursor", "reset", "changed": [magnet rows], "deleted": [ids], "more"}
+
+    Several changes of one magnet collapse into its current row (or its id in
+    deleted). reset=True means the cursor is unknown, too old for the log or
+    from before a database clear; the client has to reload everything and
+    continue from the returned cursor. more=True means call again right away.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(seq), COALESCE(MAX(seq), 0) FROM magnet_changes")
+    oldest, latest = cursor.fetchone()
+    empty = {"cursor": latest, "reset": False, "changed": [], "deleted": [], "more": False}
+
+    reset = since is None or since > latest or (oldest is not None and since < oldest - 1)
+    if not reset:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM magnet_changes WHERE seq > ? AND op = 'reset')", (since,))
+        reset = bool(cursor.fetchone()[0])
+    if reset:
+        return dict(empty, reset=True)
+
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    cursor.execute("""
+        SELECT seq, op, magnet_id, series_id FROM magnet_changes
+        WHERE seq > ? ORDER BY seq LIMIT ?
+    """, (since, limit))
+    entries = cursor.fetchall()
+    if not entries:
+        return dict(empty, cursor=since)
+
+    last_op = {}
+    for _, op, magnet_id, entry_series in entries:
+        if series_id is None or entry_series == series_id:
+            last_op[magnet_id] = op
+
+    live = [magnet_id for magnet_id, op in last_op.items() if op != 'delete']
+    rows = []
+    if live:
+        cursor.execute("SELECT * FROM magnets WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id",
+                       (json.dumps(live),))
+        columns = [d[0] for d in cursor.description]
+        rows = attach_trackers(cursor, [dict(zip(columns, row)) for row in cursor.fetchall()])
+    found = {row['id'] for row in rows}
+
+    next_cursor = entries[-1][0]
+    return {
+        "cursor": next_cursor,
+        "reset": False,
+        "changed": rows,
+        # 日志里之后又被删掉的行也算删除
+        "deleted": sorted(magnet_id for magnet_id in last_op if magnet_id not in found),
+        "more": len(entries) == limit and next_cursor < latest,
+    }
+
+
+class ChangeWatcher:
+    """
+    Wakes long-poll / SSE clients when the change cursor moves. One shared
+    polling task reads the cursor every `interval` seconds while anyone is
+    waiting; read_cursor is an async callable returning the current cursor.
+    Errors from read_cursor are logged and polling backs off, then goes on.
+    """
+
+    def __init__(self, read_cursor, interval=POLL_INTERVAL, logger=None):
+        self.read_cursor = read_cursor
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.cursor = None
+        self._changed = None
+        self._waiters = 0
+        self._task = None
+
+    async def wait(self, since, timeout):
+        """
+        Waits until the cursor passes `since` or `timeout` seconds pass.
+        Returns True if it moved.
+        """
+        self._waiters += 1
+        if self._task is None:
+            # 上一轮轮询留下的游标可能已经过时；Condition 在当前事件循环里新建
+            self.cursor = None
+            self._changed = asyncio.Condition()
+            self._task = asyncio.create_task(self._poll())
+        try:
+            async with self._changed:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self.cursor is not None and self.cursor != since),
+                    timeout
+                )
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiters -= 1
+
+    async def _poll(self):
+        failures = 0
+        try:
+            while self._waiters:
+                try:
+                    cursor = await self.read_cursor()
+                except Exception as e:
+                    failures += 1
+                    delay = min(self.interval * 2 ** failures, MAX_POLL_BACKOFF)
+                    self.logger.error(f"Reading the change cursor failed ({failures}x), retrying in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+                    continue
+                if failures:
+                    self.logger.info(f"Reading the change cursor recovered after {failures} failures.")
+                    failures = 0
+                if cursor != self.cursor:
+                    async with self._changed:
+                        self.cursor = cursor
+                        self._changed.notify_all()
+                await asyncio.sleep(self.interval)
+        finally:
+            self._task = None
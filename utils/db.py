@@ -0,0 +1,159 @@
+import os
+import queue
+import asyncio
+import sqlite3
+import threading
+import functools
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DB_PATH
+from utils.migrations import apply_migrations
+
+# 读连接池 / 查询线程池大小（NAS 上 CPU 核数有限，不宜过大）
+READ_POOL_SIZE = 4
+BUSY_TIMEOUT_MS = 10000
+
+CONNECTION_PRAGMAS = [
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    # WAL 下 NORMAL 不会损坏数据库，只可能丢失断电前最后一次提交
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",      # 16 MB page cache per connection
+    "PRAGMA mmap_size = 134217728",    # 128 MB
+]
+
+
+def connect(path=DB_PATH, readonly=False):
+    """
+    Opens a tuned connection. Connections may be handed between threads,
+    but are only ever used by one thread at a time.
+    """
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+class Database:
+    """
+    One serialized writer connection plus a pool of reader connections.
+
+    With WAL enabled readers never wait for the writer, so the API keeps
+    answering while the scraper (a separate process) or the RSS monitor holds
+    the write lock. Writers in other processes are coordinated by SQLite itself
+    through busy_timeout.
+    """
+
+    def __init__(self, path=DB_PATH, pool_size=READ_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._readers = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(pool_size)
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._init_lock = threading.Lock()
+        self.schema_version = None
+
+    def init(self):
+        """
+        Creates the data directory, enables WAL and applies migrations.
+        Safe to call repeatedly; only the first call does any work.
+        """
+        with self._init_lock:
+            if self.schema_version is not None:
+                return self.schema_version
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            conn = connect(self.path)
+            try:
+                # journal_mode 是持久化的，设置一次即对所有连接生效
+                conn.execute("PRAGMA journal_mode = WAL")
+                self.schema_version = apply_migrations(conn)
+            finally:
+                conn.close()
+            return self.schema_version
+
+    @contextmanager
+    def read(self):
+        """
+        Borrows a read-only connection from the pool.
+        """
+        self._reader_slots.acquire()
+        try:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                conn = connect(self.path, readonly=True)
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._readers.put(conn)
+        finally:
+            self._reader_slots.release()
+
+    @contextmanager
+    def write(self):
+        """
+        Serialized access to the single writer connection.
+        Commits on success, rolls back on error.
+        """
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = connect(self.path)
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def close(self):
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# 进程内共享的默认实例
+db = Database()
+
+# 有界线程池：async 接口把 SQLite 调用放到这里，避免阻塞事件循环
+_executor = ThreadPoolExecutor(max_workers=READ_POOL_SIZE, thread_name_prefix='db')
+
+
+def _with_read(fn, args, kwargs):
+    with db.read() as conn:
+        return fn(conn, *args, **kwargs)
+
+
+def _with_write(fn, args, kwargs):
+    with db.write() as conn:
+        return fn(conn, *args, **kwargs)
+
+
+async def run_read(fn, *args, **kwargs):
+    """
+    Runs fn(conn, *args, **kwargs) with a pooled reader in the DB thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(_with_read, fn, args, kwargs))
+
+
+async def run_write(fn, *args, **kwargs):
+    """
+    Runs fn(conn, *args, **kwargs) on the writer connection in the DB thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(_with_write, fn, args, kwargs))
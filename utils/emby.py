@@ -0,0 +1,282 @@
+import time
+import asyncio
+import hashlib
+import datetime
+
+from utils.db import run_read, run_write
+from utils.queries import TV_EPISODE_SQL, get_max_episode
+from utils.series import DEFAULT_SERIES_ID
+
+# 每页拉取的条目数；大库分页拉取，避免单个巨大响应
+PAGE_SIZE = 500
+# 距上次同步不到这么久（秒）时直接用数据库里的快照
+CACHE_TTL = 600
+
+
+class EmbyError(Exception):
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def encode_ranges(nums):
+    """
+    [1, 2, 3, 40] -> [[1, 3], [40, 40]]
+    """
+    ranges = []
+    for num in sorted(nums):
+        if ranges and num == ranges[-1][1] + 1:
+            ranges[-1][1] = num
+        else:
+            ranges.append([num, num])
+    return ranges
+
+
+def _watermark(items, previous=None):
+    """
+    Newest DateLastSaved seen, used as MinDateLastSaved next time. Emby's own
+    timestamps are preferred over our clock; MinDateLastSaved is inclusive,
+    so items saved at exactly the watermark are simply fetched again.
+    """
+    saved = [item['last_saved'] for item in items if item['last_saved']]
+    if previous:
+        saved.append(previous)
+    if saved:
+        return max(saved)
+    # Emby 的时间都是 UTC
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+# --- 数据库中的媒体库快照 ---
+
+def get_library_state(conn, host, tmdb_id):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT series_id, last_saved, synced_at,
+               (SELECT COUNT(DISTINCT item_id) FROM emby_episodes e WHERE e.host = l.host AND e.tmdb_id = l.tmdb_id)
+        FROM emby_libraries l WHERE host = ? AND tmdb_id = ?
+    """, (host, tmdb_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {"series_id": row[0], "last_saved": row[1], "synced_at": row[2], "item_count": row[3]}
+
+
+def save_library(conn, host, tmdb_id, series_id, items, full, last_saved):
+    """
+    Applies fetched episode items. A full sync replaces the snapshot; an
+    incremental one replaces only the items that came back.
+    Returns the number of distinct items now stored.
+    """
+    cursor = conn.cursor()
+    if full:
+        cursor.execute("DELETE FROM emby_episodes WHERE host = ? AND tmdb_id = ?", (host, tmdb_id))
+    else:
+        cursor.executemany("DELETE FROM emby_episodes WHERE host = ? AND tmdb_id = ? AND item_id = ?",
+                           [(host, tmdb_id, item['id']) for item in items])
+
+    rows = []
+    for item in items:
+        # 没有集号的条目也记录下来，用于和 Emby 的总数比对
+        for num in item['numbers'] or [None]:
+            rows.append((host, tmdb_id, item['id'], num))
+    cursor.executemany("INSERT INTO emby_episodes (host, tmdb_id, item_id, episode_num) VALUES (?, ?, ?, ?)", rows)
+
+    cursor.execute("""
+        INSERT INTO emby_libraries (host, tmdb_id, series_id, last_saved, synced_at) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(host, tmdb_id) DO UPDATE SET
+            series_id = excluded.series_id,
+            last_saved = excluded.last_saved,
+            synced_at = excluded.synced_at
+    """, (host, tmdb_id, series_id, last_saved, time.time()))
+
+    cursor.execute("SELECT COUNT(DISTINCT item_id) FROM emby_episodes WHERE host = ? AND tmdb_id = ?", (host, tmdb_id))
+    return cursor.fetchone()[0]
+
+
+def missing_episodes(conn, host, tmdb_id, max_episode=None, series_id=DEFAULT_SERIES_ID):
+    """
+    TV episodes 1..max_episode absent from the Emby snapshot, as ranges, plus
+    the subset that already has at least one magnet of the series (downloadable now).
+    """
+    cursor = conn.cursor()
+    if not max_episode:
+        max_episode = get_max_episode(cursor, series_id)
+
+    cursor.execute(f"""
+        WITH RECURSIVE eps(num) AS (
+            SELECT 1 WHERE ? >= 1
+            UNION ALL
+            SELECT num + 1 FROM eps WHERE num < ?
+        )
+        SELECT eps.num,
+               EXISTS (SELECT 1 FROM magnets m
+                       WHERE m.series_id = ? AND m.{TV_EPISODE_SQL} AND m.episode_num = eps.num)
+        FROM eps
+        WHERE NOT EXISTS (
+            SELECT 1 FROM emby_episodes e
+            WHERE e.host = ? AND e.tmdb_id = ? AND e.episode_num = eps.num
+        )
+    """, (max_episode, max_episode, series_id, host, tmdb_id))
+    rows = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT COUNT(DISTINCT episode_num) FROM emby_episodes
+        WHERE host = ? AND tmdb_id = ? AND episode_num IS NOT NULL
+    """, (host, tmdb_id))
+    total = cursor.fetchone()[0]
+
+    downloadable = [num for num, has_magnet in rows if has_magnet]
+    return {
+        "missing": encode_ranges(num for num, _ in rows),
+        "missing_count": len(rows),
+        "downloadable": encode_ranges(downloadable),
+        "downloadable_count": len(downloadable),
+        "total_count": total,
+        "max_episode": max_episode,
+    }
+
+
+class EmbyClient:
+    """
+    Async Emby API client with a pooled HTTP connection. Library snapshots are
+    kept in SQLite (emby_libraries / emby_episodes) and refreshed incrementally
+    with MinDateLastSaved.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, page_size=PAGE_SIZE):
+        self.ttl = ttl
+        self.page_size = page_size
+        self._client = None
+        self._locks = {}
+        # (host, API key 的哈希) -> 上次被 Emby 接受的时间
+        self._verified = {}
+
+    def _http(self):
+        if self._client is None:
+            # httpx 在第一次请求 Emby 时才加载，不拖慢 web 服务启动
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get_items(self, host, api_key, params):
+        import httpx
+        try:
+            res = await self._http().get(
+                f"{host}/Items",
+                headers={"X-Emby-Token": api_key},
+                params=params
+            )
+            res.raise_for_status()
+            return res.json()
+        except httpx.HTTPStatusError as e:
+            raise EmbyError(f"Emby 返回错误: HTTP {e.response.status_code}")
+        except httpx.HTTPError as e:
+            raise EmbyError(f"无法连接 Emby: {e}")
+
+    async def find_series_id(self, host, api_key, tmdb_id):
+        data = await self._get_items(host, api_key, {
+            "Recursive": "true",
+            "IncludeItemTypes": "Series",
+            "AnyProviderIdEquals": f"tmdb.{tmdb_id}",
+            "Limit": 1
+        })
+        items = data.get('Items', [])
+        if not items:
+            raise EmbyError(f"未找到剧集 (TMDB: {tmdb_id})", status_code=404)
+        return items[0]['Id']
+
+    def _episode_params(self, series_id):
+        return {
+            "ParentId": series_id,
+            "Recursive": "true",
+            "IncludeItemTypes": "Episode",
+            "EnableImages": "false",
+            "EnableUserData": "false",
+        }
+
+    async def count_episodes(self, host, api_key, series_id):
+        data = await self._get_items(host, api_key, dict(self._episode_params(series_id), Limit=0))
+        return data.get('TotalRecordCount', 0)
+
+    async def fetch_episodes(self, host, api_key, series_id, min_date_last_saved=None):
+        """
+        Pages through the series' episodes with StartIndex/Limit, optionally
+        only those saved since min_date_last_saved. Returns a list of
+        {"id", "numbers", "last_saved"}; multi-episode files (IndexNumberEnd)
+        cover every number in their range.
+        """
+        params = dict(self._episode_params(series_id), Fields="IndexNumber,IndexNumberEnd,DateLastSaved")
+        if min_date_last_saved:
+            params["MinDateLastSaved"] = min_date_last_saved
+
+        items = []
+        start = 0
+        while True:
+            data = await self._get_items(host, api_key, dict(params, StartIndex=start, Limit=self.page_size))
+            page = data.get('Items', [])
+            for item in page:
+                index = item.get('IndexNumber')
+                numbers = []
+                if index is not None:
+                    end = item.get('IndexNumberEnd') or index
+                    numbers = list(range(index, end + 1))
+                items.append({"id": item['Id'], "numbers": numbers, "last_saved": item.get('DateLastSaved')})
+
+            start += len(page)
+            total = data.get('TotalRecordCount')
+            if not page or len(page) < self.page_size or (total is not None and start >= total):
+                break
+        return items
+
+    async def sync_library(self, host, api_key, tmdb_id, refresh=False):
+        """
+        Brings the stored snapshot up to date and returns (state, from_cache).
+        Within the TTL only the API key is checked (one Limit=0 request, at
+        most once per TTL per key), so a wrong or revoked key never gets the
+        cached library. Otherwise only items saved since the
+        last sync are fetched; a full resync happens on refresh, on first use,
+        or when the item count no longer matches Emby (deletions).
+        """
+        host = host.rstrip('/')
+        tmdb_id = str(tmdb_id)
+        key = (host, hashlib.sha256(api_key.encode('utf-8')).hexdigest())
+        # 快照按媒体库共享，锁也按媒体库，不同 key 的同步不会同时改同一份快照
+        lock = self._locks.setdefault((host, tmdb_id), asyncio.Lock())
+        async with lock:
+            state = await run_read(get_library_state, host, tmdb_id)
+            if state is not None and not refresh and time.time() - state['synced_at'] < self.ttl:
+                if time.time() - self._verified.get(key, 0) >= self.ttl:
+                    # 无效的 key 在这里抛出 EmbyError
+                    await self.count_episodes(host, api_key, state['series_id'])
+                    self._verified[key] = time.time()
+                return state, True
+
+            # 强制刷新时重新查找 series_id（剧集可能被重新刮削）
+            series_id = state['series_id'] if state is not None and not refresh else None
+            if series_id is None:
+                series_id = await self.find_series_id(host, api_key, tmdb_id)
+            full = state is None or refresh or state['series_id'] != series_id
+
+            if not full:
+                total = await self.count_episodes(host, api_key, series_id)
+                items = await self.fetch_episodes(host, api_key, series_id, state['last_saved'])
+                last_saved = _watermark(items, state['last_saved'])
+                stored = await run_write(save_library, host, tmdb_id, series_id, items, False, last_saved)
+                # 增量同步看不到删除，数量对不上时全量重来
+                full = stored != total
+
+            if full:
+                items = await self.fetch_episodes(host, api_key, series_id)
+                await run_write(save_library, host, tmdb_id, series_id, items, True, _watermark(items))
+
+            self._verified[key] = time.time()
+            return await run_read(get_library_state, host, tmdb_id), False
@@ -0,0 +1,290 @@
+import io
+import re
+import hashlib
+from datetime import datetime
+
+from lxml import etree
+
+from utils.parser import parse_title, episode_key
+
+DATE_RE = re.compile(r'\d{4}[-/]\d{2}[-/]\d{2}')
+SUBTITLE_RE = re.compile(r'·\s*(.*?)\s*(?=MP4|MKV|AVI)', re.IGNORECASE)
+
+# 参与条目指纹计算；提取逻辑或 parse_title 的结果变化时加一，所有条目都会重新解析
+EXTRACTOR_VERSION = 1
+
+# 数据页的分区：list 是列表 <ul id>，container 是“加载全部”按钮所在的容器（爬虫用），number_re 从集数
+# 标签取集号，增量抓取时加载到已收录的集号就停（None 表示总是加载全部）。
+# 只有 tv 和线上页面核对过；movie / special 是照 tv 的命名推测的（verified=False），核对之前默认不抓取，
+# 需要时用 scraper_history.py --sections 显式打开。页面结构样例见 benchmarks/fixtures/sections_sample.html
+SECTIONS = {
+    "tv": {"list": "tvlist", "container": "#tvcontainer", "number_re": r"^\d+$", "verified": True},
+    "movie": {"list": "movielist", "container": "#moviecontainer", "number_re": r"^(?:M|剧场版)\s*(\d+)",
+              "verified": False},
+    "special": {"list": "splist", "container": "#spcontainer", "number_re": None, "verified": False},
+}
+DEFAULT_SECTIONS = tuple(name for name, section in SECTIONS.items() if section['verified'])
+
+# 列表 <ul id> -> 分区名。tvlist 里也混有剧场版（M26），kind 按集数标签判断；
+# 其他分区的集数标签格式不固定，认不出来时 kind 取分区名
+SECTION_LISTS = {section['list']: name for name, section in SECTIONS.items()}
+NUMBER_RE = re.compile(r'\d+')
+
+
+def _class_test(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# 预编译的 XPath，每个 li 内的查找都只走自己的子树
+X_DIV_L = etree.XPath(f"(.//div[{_class_test('resdiv-l')}])[1]")
+X_EPISODE_SPAN = etree.XPath("./span[1]")
+X_TITLE_SPAN = etree.XPath(f"(.//span[{_class_test('restitle')}])[1]")
+X_DIV_R = etree.XPath(f"(.//div[{_class_test('resdiv-r')}])[1]")
+X_SPANS = etree.XPath(".//span")
+X_BTN_GROUPS = etree.XPath(f".//div[{_class_test('btn-group')}]")
+X_FIRST_LINK = etree.XPath("(.//a)[1]")
+X_RESLINKS = etree.XPath(f".//input[{_class_test('reslink')}]")
+X_RESB = etree.XPath(f"(.//label[{_class_test('resb')}])[1]")
+X_LABEL_CONTAINER = etree.XPath("ancestor::div[2]")
+
+
+def is_episode_label(text):
+    return text.isdigit() or text.upper().startswith('M') or '剧场版' in text
+
+
+def detail_fields(detail_label, source_type_label):
+    """
+    Metadata for one magnet, from its resb label ("1080P·简日MP4") and the
+    source button of its group ("WEBRIP").
+    """
+    parsed = parse_title(detail_label)
+    source_type = parsed['source_type']
+    # 如果 detail_label 里没写 WEBRIP，从外层按钮补救
+    if not source_type and source_type_label:
+        source_type = source_type_label.upper()
+
+    subtitle = None
+    sub_match = SUBTITLE_RE.search(detail_label)
+    if sub_match:
+        subtitle = sub_match.group(1).strip()
+    else:
+        if "简日" in detail_label: subtitle = "简日"
+        elif "繁日" in detail_label: subtitle = "繁日"
+        elif "简繁" in detail_label: subtitle = "简繁"
+        elif "简体" in detail_label or "简" in detail_label: subtitle = "简体"
+        elif "繁体" in detail_label or "繁" in detail_label: subtitle = "繁体"
+
+    return {
+        "resolution": parsed['resolution'],
+        "container": parsed['container'],
+        "subtitle": subtitle,
+        "source_type": source_type,
+    }
+
+
+def section_episode_key(episode, section):
+    """episode_key(), falling back to (first number, section) outside the TV list."""
+    episode_num, kind = episode_key(episode)
+    if kind is None and section != "tv":
+        num_match = NUMBER_RE.search(episode)
+        episode_num, kind = (int(num_match.group(0)) if num_match else None), section
+    return episode_num, kind
+
+
+def hash_key(episode, section):
+    """item_hashes key of an item; TV items keep the bare label used before sections."""
+    return episode if section == "tv" else f"{section}:{episode}"
+
+
+def make_record(magnet_link, episode, episode_title, detail_label, source_type_label, publish_date,
+                section="tv"):
+    episode_num, kind = section_episode_key(episode, section)
+    record = {
+        "magnet_link": magnet_link,
+        "episode": episode,
+        "episode_num": episode_num,
+        "kind": kind,
+        "episode_title": episode_title,
+        # 直接用 detail_label 作为 raw_title，前端只显示 "1080P·简日MP4..." 这一段
+        "raw_title": detail_label,
+        "publish_date": publish_date,
+    }
+    record.update(detail_fields(detail_label, source_type_label))
+    return record
+
+
+def _text(el):
+    """Same as BeautifulSoup's get_text(strip=True)."""
+    if el is None:
+        return ""
+    return "".join(t.strip() for t in el.itertext())
+
+
+def _first(xpath, el):
+    found = xpath(el)
+    return found[0] if found else None
+
+
+def _section(li, lists):
+    """Section of the nearest enclosing list in `lists`, or None."""
+    for ul in li.iterancestors('ul'):
+        section = lists.get(ul.get('id'))
+        if section is not None:
+            return section
+    return None
+
+
+def item_hash(li):
+    """
+    Fingerprint of one li.ylist-items: its markup plus EXTRACTOR_VERSION.
+    """
+    digest = hashlib.blake2b(str(EXTRACTOR_VERSION).encode(), digest_size=16)
+    digest.update(etree.tostring(li, with_tail=False))
+    return digest.hexdigest()
+
+
+def _item_episode(li, section):
+    div_l = _first(X_DIV_L, li)
+    if div_l is None:
+        return None, None
+    episode = _text(_first(X_EPISODE_SPAN, div_l))
+    # TV 列表里只收集数 / 剧场版，其他分区的标签（SP、OVA…）都收
+    valid = is_episode_label(episode) if section == "tv" else bool(episode)
+    return (div_l, episode) if valid else (div_l, None)
+
+
+def _records_from_item(li, div_l, episode, today, section):
+    episode_title = _text(_first(X_TITLE_SPAN, div_l))
+
+    publish_date = today
+    div_r = _first(X_DIV_R, li)
+    if div_r is not None:
+        date_spans = X_SPANS(div_r)
+        if date_spans:
+            date_text = _text(date_spans[-1])
+            if DATE_RE.match(date_text):
+                publish_date = date_text
+
+    for group in X_BTN_GROUPS(div_l):
+        type_link = _first(X_FIRST_LINK, group)
+        source_type_label = _text(type_link) if type_link is not None else "Unknown"
+        group_label = None
+        for magnet_input in X_RESLINKS(group):
+            magnet_link = magnet_input.get('value')
+            if not magnet_link:
+                continue
+
+            # 精准查找：input 外两层 div 里的 label.resb
+            container = _first(X_LABEL_CONTAINER, magnet_input)
+            detail_label = _text(_first(X_RESB, container)) if container is not None else ""
+            # 兜底：组内第一个 label.resb
+            if not detail_label:
+                if group_label is None:
+                    group_label = _text(_first(X_RESB, group))
+                detail_label = group_label
+
+            yield make_record(magnet_link, episode, episode_title, detail_label,
+                              source_type_label, publish_date, section)
+
+
+def extract_records(html, today=None, known_hashes=None, seen_hashes=None, lists=SECTION_LISTS):
+    """
+    Yields one flat record per magnet in the section lists of the page
+    (`lists`: {ul id: section}, by default every SECTION_LISTS present),
+    newest episode first within each list.
+
+    Streams over the document with lxml iterparse: each li.ylist-items is
+    handled as soon as it is complete and then dropped, so memory stays flat
+    no matter how much history the page holds.
+
+    known_hashes: {hash_key: item_hash} from an earlier run; items whose
+    markup is unchanged are skipped without parsing. seen_hashes, if given,
+    is filled with the hash of every episode item on the page.
+    """
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+
+    for _, li in etree.iterparse(io.BytesIO(html), events=('end',), tag='li',
+                                 html=True, encoding='utf-8', huge_tree=True):
+        if 'ylist-items' not in (li.get('class') or '').split():
+            continue
+        section = _section(li, lists)
+        if section is None:
+            continue
+        div_l, episode = _item_episode(li, section)
+        if episode is not None:
+            hashing = known_hashes is not None or seen_hashes is not None
+            digest = item_hash(li) if hashing else None
+            key = hash_key(episode, section)
+            if seen_hashes is not None:
+                seen_hashes[key] = digest
+            if known_hashes is None or known_hashes.get(key) != digest:
+                yield from _records_from_item(li, div_l, episode, today, section)
+
+        # 释放已处理的子树以及之前的兄弟节点
+        li.clear(keep_tail=True)
+        parent = li.getparent()
+        while li.getprevious() is not None:
+            del parent[0]
+
+
+def extract_records_bs4(html, today=None):
+    """
+    The original BeautifulSoup extraction, kept as the reference for parity
+    checks (benchmarks/bench_extractor.py). Not used by the scraper.
+    """
+    from bs4 import BeautifulSoup
+
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    soup = BeautifulSoup(html, 'lxml')
+    tv_list = soup.find('ul', id='tvlist')
+    if not tv_list:
+        return
+
+    for item in tv_list.find_all('li', class_='ylist-items'):
+        div_l = item.find('div', class_='resdiv-l')
+        if not div_l: continue
+
+        spans_l = div_l.find_all('span', recursive=False)
+        if not spans_l: continue
+
+        episode = spans_l[0].get_text(strip=True)
+        if not is_episode_label(episode):
+            continue
+
+        title_span = div_l.find('span', class_='restitle')
+        ep_title = title_span.get_text(strip=True) if title_span else ""
+
+        publish_date = today
+        div_r = item.find('div', class_='resdiv-r')
+        if div_r:
+            date_spans = div_r.find_all('span')
+            if date_spans:
+                date_text = date_spans[-1].get_text(strip=True)
+                if DATE_RE.match(date_text):
+                    publish_date = date_text
+
+        for group in div_l.find_all('div', class_='btn-group'):
+            type_link = group.find('a')
+            source_type_label = type_link.get_text(strip=True) if type_link else "Unknown"
+
+            for magnet_input in group.find_all('input', class_='reslink'):
+                magnet_link = magnet_input.get('value')
+                if not magnet_link: continue
+
+                detail_label = ""
+                parent_flex = magnet_input.find_parent('div')
+                if parent_flex:
+                    parent_container = parent_flex.find_parent('div')
+                    if parent_container:
+                        resb_label = parent_container.find('label', class_='resb')
+                        if resb_label:
+                            detail_label = resb_label.get_text(strip=True)
+
+                if not detail_label:
+                    resb_label_fallback = group.find('label', class_='resb')
+                    detail_label = resb_label_fallback.get_text(strip=True) if resb_label_fallback else ""
+
+                yield make_record(magnet_link, episode, ep_title, detail_label,
+                                  source_type_label, publish_date)
@@ -0,0 +1,110 @@
+import re
+import asyncio
+import hashlib
+import datetime
+from urllib.parse import urlsplit
+
+import httpx
+
+# 连接 5 秒，其余 20 秒
+FETCH_TIMEOUT = httpx.Timeout(20, connect=5)
+# 同一站点同时进行的请求数（多个源常在同一个站点上）
+PER_HOST_LIMIT = 2
+
+# 每次请求都会变化但与条目无关的字段，不参与指纹计算
+VOLATILE_RE = re.compile(rb'<(lastBuildDate|pubDate|updated)>[^<]*</\1>\s*', re.IGNORECASE)
+
+
+def content_hash(body):
+    """
+    Fingerprint of a feed body. Only the channel-level build timestamp is
+    ignored; any change to an entry changes the hash.
+    """
+    head, sep, rest = body.partition(b'<item')
+    if not sep:
+        head, sep, rest = body.partition(b'<entry')
+    return hashlib.sha256(VOLATILE_RE.sub(b'', head) + sep + rest).hexdigest()
+
+
+def get_feed_state(cursor, url):
+    cursor.execute("SELECT etag, last_modified, content_hash FROM feed_state WHERE url = ?", (url,))
+    row = cursor.fetchone()
+    if not row:
+        return {"etag": None, "last_modified": None, "content_hash": None}
+    return {"etag": row[0], "last_modified": row[1], "content_hash": row[2]}
+
+
+def save_feed_state(cursor, url, etag, last_modified, digest, changed):
+    now = datetime.datetime.now().isoformat()
+    cursor.execute("""
+        INSERT INTO feed_state (url, etag, last_modified, content_hash, checked_at, changed_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            etag = excluded.etag,
+            last_modified = excluded.last_modified,
+            content_hash = excluded.content_hash,
+            checked_at = excluded.checked_at,
+            changed_at = COALESCE(excluded.changed_at, feed_state.changed_at)
+    """, (url, etag, last_modified, digest, now, now if changed else None))
+
+
+class HostLimiter:
+    """
+    One semaphore per host, so concurrent fetches of many feeds never open
+    more than `limit` requests against the same site.
+    """
+
+    def __init__(self, limit=PER_HOST_LIMIT):
+        self.limit = limit
+        self._semaphores = {}
+
+    def __call__(self, url):
+        host = urlsplit(url).netloc.lower()
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.limit)
+        return self._semaphores[host]
+
+
+async def fetch_feed(client, url, state, agent):
+    """
+    Conditional GET of a feed through an httpx.AsyncClient. Returns a dict with
+    status 'not_modified' (HTTP 304), 'unchanged' (same fingerprint) or 'changed',
+    plus the new validators; 'body' and 'headers' are only set when changed.
+    Raises httpx.HTTPError on network or HTTP errors.
+    """
+    headers = {"User-Agent": agent}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    res = await client.get(url, headers=headers)
+    if res.status_code == 304:
+        # 304 可能不带校验值，沿用旧的
+        return {
+            "status": "not_modified",
+            "etag": res.headers.get("ETag") or state.get("etag"),
+            "last_modified": res.headers.get("Last-Modified") or state.get("last_modified"),
+            "content_hash": state.get("content_hash"),
+            "body": None,
+            "headers": None,
+        }
+    res.raise_for_status()
+
+    digest = content_hash(res.content)
+    result = {
+        "etag": res.headers.get("ETag"),
+        "last_modified": res.headers.get("Last-Modified"),
+        "content_hash": digest,
+        "body": None,
+        "headers": None,
+    }
+    if digest == state.get("content_hash"):
+        result["status"] = "unchanged"
+        return result
+
+    result["status"] = "changed"
+    result["body"] = res.content
+    # feedparser 按小写键读取响应头
+    result["headers"] = {k.lower(): v for k, v in res.headers.items()}
+    return result
@@ -0,0 +1,145 @@
+import time
+import datetime
+
+from utils.cache import bump_data_version
+from utils.picks import rebuild_picks
+from utils.magnets import parse_magnet, save_trackers, LOOKUP_CHUNK
+from utils.series import DEFAULT_SERIES_ID
+
+FIELDS = ("infohash", "magnet_link", "series_id", "episode", "episode_num", "kind", "episode_title",
+          "resolution", "container", "subtitle", "source_type", "raw_title", "publish_date")
+# 已存在的行只比较这些列，有差异才更新
+UPDATE_FIELDS = ("magnet_link", "episode_title", "resolution", "container", "subtitle", "source_type",
+                 "raw_title", "publish_date")
+
+# 批次较大时（全量抓取）直接扫全表，比按磁链逐个查索引更快
+FULL_SCAN_THRESHOLD = 2000
+
+INSERT_SQL = f"INSERT INTO magnets ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})"
+UPDATE_SQL = f"UPDATE magnets SET {', '.join(f'{col} = ?' for col in UPDATE_FIELDS)} WHERE id = ?"
+
+
+def _load_existing(cursor, keys):
+    """
+    Every stored row sharing a (series_id, infohash) with the batch:
+    {(series_id, infohash): {episode: (id, *UPDATE_FIELDS)}}
+    """
+    existing = {}
+    sql = f"SELECT id, series_id, infohash, episode, {', '.join(UPDATE_FIELDS)} FROM magnets"
+    if len(keys) > FULL_SCAN_THRESHOLD:
+        queries = [(sql, ())]
+    else:
+        # BLOB 没法放进 json_each，按剧集分组、按块用 IN (?, ...) 走 (series_id, infohash, episode) 索引
+        by_series = {}
+        for series_id, infohash in keys:
+            by_series.setdefault(series_id, []).append(infohash)
+        queries = [(f"{sql} WHERE series_id = ? AND infohash IN ({', '.join('?' * len(chunk))})",
+                    [series_id] + chunk)
+                   for series_id, hashes in by_series.items()
+                   for chunk in (hashes[i:i + LOOKUP_CHUNK] for i in range(0, len(hashes), LOOKUP_CHUNK))]
+    for query, params in queries:
+        cursor.execute(query, params)
+        for row in cursor:
+            key = (row[1], row[2])
+            if key in keys:
+                existing.setdefault(key, {})[row[3]] = (row[0],) + row[4:]
+    return existing
+
+
+def ingest(conn, records, update=True, series_id=DEFAULT_SERIES_ID):
+    """
+    Writes a batch of magnet records (dicts with FIELDS) in one transaction and
+    returns {"inserted", "updated", "unchanged", "new", "db_seconds"}; "new"
+    holds the inserted records.
+
+    Existing rows are loaded once and the batch is diffed in memory, so only
+    new or changed rows are written. Rows match on (series_id, infohash,
+    episode), so the same torrent under another tracker list or dn= is not
+    stored twice, while the same release in another series gets its own row;
+    a record without an episode matches any row of its series with the same
+    infohash. With update=False a known infohash is never touched (RSS monitor).
+    Trackers are split off into magnet_trackers. New rows belong to
+    `series_id` unless the record carries its own.
+    """
+    started = time.perf_counter()
+    # 同一批里重复的记录以最后一条为准
+    batch = {}
+    trackers = []
+    for record in records:
+        infohash, canonical, record_trackers = parse_magnet(record['magnet_link'])
+        record_series = record.get('series_id') or series_id
+        batch[(record_series, infohash, record.get('episode'))] = dict(
+            record, infohash=infohash, magnet_link=canonical, series_id=record_series)
+        if record_trackers:
+            trackers.append((infohash, record_trackers))
+
+    summary = {"inserted": 0, "updated": 0, "unchanged": 0, "new": [], "db_seconds": 0.0}
+    if not batch:
+        return summary
+
+    cursor = conn.cursor()
+    # 先拿写锁再读，读到的状态在写入前不会被其他进程改动
+    if not conn.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+    existing = _load_existing(cursor, {(record_series, infohash) for record_series, infohash, _ in batch})
+
+    inserts = []
+    updates = []
+    changed = []
+    for (record_series, infohash, episode), record in batch.items():
+        stored = existing.get((record_series, infohash))
+        if stored and (not update or episode is None):
+            summary["unchanged"] += 1
+            continue
+
+        row = stored.get(episode) if stored else None
+        if row is None:
+            inserts.append(tuple(map(record.get, FIELDS)))
+            summary["new"].append(record)
+            changed.append(record)
+            continue
+
+        values = tuple(map(record.get, UPDATE_FIELDS))
+        if values == row[1:]:
+            summary["unchanged"] += 1
+        else:
+            updates.append(values + (row[0],))
+            changed.append(record)
+
+    if inserts:
+        cursor.executemany(INSERT_SQL, inserts)
+    if updates:
+        cursor.executemany(UPDATE_SQL, updates)
+    new_trackers = save_trackers(cursor, trackers)
+    if inserts or updates:
+        # 只重算受影响集数的精选
+        rebuild_picks(cursor, {(record['series_id'], record.get('kind'), record.get('episode_num'))
+                               for record in changed})
+    if inserts or updates or new_trackers:
+        bump_data_version(cursor)
+
+    summary["inserted"] = len(inserts)
+    summary["updated"] = len(updates)
+    summary["db_seconds"] = time.perf_counter() - started
+    return summary
+
+
+def get_item_hashes(cursor):
+    """
+    {hash_key: markup hash} of the list items stored by previous scrapes
+    (the bare episode label for TV items, "section:label" for the others).
+    """
+    cursor.execute("SELECT episode, hash FROM item_hashes")
+    return dict(cursor.fetchall())
+
+
+def save_item_hashes(cursor, hashes):
+    """
+    Records item hashes; call in the same transaction as the ingest of those
+    items, so a failed write never marks an item as done.
+    """
+    now = datetime.datetime.now().isoformat()
+    cursor.executemany("""
+        INSERT INTO item_hashes (episode, hash, seen_at) VALUES (?, ?, ?)
+        ON CONFLICT(episode) DO UPDATE SET hash = excluded.hash, seen_at = excluded.seen_at
+    """, [(episode, digest, now) for episode, digest in hashes.items()])
@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import uuid
+import time
+import signal
+import asyncio
+from collections import deque, OrderedDict
+
+# 每个任务保留的输出行数
+LINE_BUFFER = 500
+# 保留的历史任务数
+JOB_HISTORY = 20
+# 取消任务时先 SIGTERM，超时后 SIGKILL
+CANCEL_GRACE = 10
+# 单行输出的上限，超出部分丢弃；读取时每次最多读这么多字节
+MAX_LINE = 16 * 1024
+READ_CHUNK = 64 * 1024
+# 子进程输出中以此开头的行是结构化进度
+PROGRESS_PREFIX = "PROGRESS "
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+def report_progress(**fields):
+    """
+    Called from inside a job subprocess: emits one structured progress event.
+    """
+    print(PROGRESS_PREFIX + json.dumps(fields, ensure_ascii=False), flush=True)
+
+
+class JobConflict(Exception):
+    def __init__(self, job):
+        super().__init__(f"A '{job.kind}' job is already running ({job.id})")
+        self.job = job
+
+
+class Job:
+    """
+    One run of a subprocess, with its progress, a bounded tail of its output
+    and the SSE subscribers listening to it.
+    """
+
+    def __init__(self, kind, args):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.args = args
+        self.status = "starting"
+        self.progress = {}
+        self.lines = deque(maxlen=LINE_BUFFER)
+        self.returncode = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.process = None
+        self.cancel_requested = False
+        self._subscribers = set()
+        self._watcher = None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def to_dict(self, tail=50):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "args": self.args,
+            "status": self.status,
+            "progress": self.progress,
+            "returncode": self.returncode,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "lines": list(self.lines)[-tail:] if tail else [],
+        }
+
+    def _publish(self, event, data):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # 消费太慢的订阅者直接丢弃本条事件，不拖慢任务本身
+                pass
+
+    async def events(self, keepalive=15):
+        """
+        Async iterator of (event, data): a 'status' snapshot first, then live
+        'progress' / 'line' events, ending with a final 'status' once finished.
+        A 'ping' is yielded after `keepalive` idle seconds.
+        """
+        queue = asyncio.Queue(maxsize=LINE_BUFFER)
+        self._subscribers.add(queue)
+        try:
+            yield "status", self.to_dict()
+            while not self.finished:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield "ping", None
+                    continue
+                yield event, data
+                if event == "status" and data["status"] in FINISHED:
+                    return
+            # 订阅期间任务已结束，但结束事件可能因队列满被丢弃
+            yield "status", self.to_dict(tail=0)
+        finally:
+            self._subscribers.discard(queue)
+
+
+class JobManager:
+    """
+    Runs scripts as subprocesses, at most one running job per kind.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self, cwd, history=JOB_HISTORY):
+        self.cwd = cwd
+        self.history = history
+        self._jobs = OrderedDict()
+        self._running = {}
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def running(self, kind):
+        return self._running.get(kind)
+
+    def list(self):
+        return [job.to_dict(tail=0) for job in reversed(self._jobs.values())]
+
+    async def start(self, kind, script, args=(), on_finish=None):
+        """
+        Starts `python script *args` as a job of the given kind.
+        Raises JobConflict if a job of that kind is still running.
+        """
+        current = self._running.get(kind)
+        if current is not None:
+            raise JobConflict(current)
+
+        # 检查和登记之间没有 await，同一事件循环内不会出现两个同类任务
+        job = Job(kind, list(args))
+        self._running[kind] = job
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.history:
+            oldest = next(iter(self._jobs.values()))
+            if not oldest.finished:
+                break
+            self._jobs.popitem(last=False)
+
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        try:
+            job.process = await asyncio.create_subprocess_exec(
+                sys.executable, script, *job.args,
+                cwd=self.cwd, env=env,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                limit=1024 * 1024
+            )
+        except Exception as e:
+            job.lines.append(f"Failed to start: {e}")
+            self._finish(job, "failed")
+            raise
+
+        job.status = "running"
+        job._publish("status", job.to_dict(tail=0))
+        job._watcher = asyncio.create_task(self._watch(job, on_finish))
+        return job
+
+    async def _read_lines(self, stream):
+        """
+        Yields output lines without the newline. A line longer than MAX_LINE
+        is cut to MAX_LINE bytes plus a marker and the rest of it is dropped.
+        """
+        pending = b""
+        truncated = False
+        while True:
+            chunk = await stream.read(READ_CHUNK)
+            if not chunk:
+                if pending and not truncated:
+                    yield pending
+                return
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                if truncated:
+                    # 超长行的剩余部分
+                    truncated = False
+                    continue
+                yield line
+            if truncated:
+                pending = b""
+            elif len(pending) > MAX_LINE:
+                yield pending[:MAX_LINE] + b" ...[truncated]"
+                truncated = True
+                pending = b""
+
+    async def _watch(self, job, on_finish):
+        status = "failed"
+        try:
+            async for raw in self._read_lines(job.process.stdout):
+                line = raw.decode('utf-8', errors='replace').rstrip()
+                if line.startswith(PROGRESS_PREFIX):
+                    try:
+                        update = json.loads(line[len(PROGRESS_PREFIX):])
+                    except ValueError:
+                        update = None
+                    if isinstance(update, dict):
+                        job.progress.update(update)
+                        job._publish("progress", dict(job.progress))
+                        continue
+                job.lines.append(line)
+                job._publish("line", line)
+
+            job.returncode = await job.process.wait()
+            if job.cancel_requested:
+                status = "cancelled"
+            else:
+                status = "succeeded" if job.returncode == 0 else "failed"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            job.lines.append(f"Job watcher failed: {e!r}")
+        finally:
+            # 不再读输出的子进程会卡在写满的管道上，直接结束掉
+            if job.process.returncode is None:
+                try:
+                    job.process.kill()
+                except ProcessLookupError:
+                    pass
+            # 无论怎样结束都要登记，否则这一类任务会一直返回 409
+            self._finish(job, status)
+            if on_finish is not None:
+                on_finish(job)
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        if self._running.get(job.kind) is job:
+            del self._running[job.kind]
+        job._publish("status", job.to_dict(tail=0))
+
+    async def cancel(self, job):
+        """
+        SIGTERM, then SIGKILL if the process is still alive after CANCEL_GRACE seconds.
+        """
+        if job.finished or job.process is None:
+            return False
+        job.cancel_requested = True
+        try:
+            job.process.send_signal(signal.SIGTERM)
+            try:
+                await asyncio.wait_for(job.process.wait(), CANCEL_GRACE)
+            except asyncio.TimeoutError:
+                job.process.kill()
+        except ProcessLookupError:
+            pass
+        return True
+
+    async def shutdown(self):
+        for job in list(self._running.values()):
+            await self.cancel(job)
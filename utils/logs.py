@@ -0,0 +1,88 @@
+import os
+import asyncio
+
+from config import LOGS_DIR, LOG_NAMES
+
+TAIL_BLOCK = 8192
+# 实时跟踪时检查新内容的间隔（秒）
+FOLLOW_INTERVAL = 0.5
+
+
+def log_path(name):
+    if name not in LOG_NAMES:
+        raise ValueError(f"Unknown log: {name}")
+    return os.path.join(LOGS_DIR, f"{name}.log")
+
+
+def tail_lines(path, n=50):
+    """
+    Last n lines of a file, read backwards from the end in blocks, so the cost
+    does not depend on the file size.
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b''
+        # 多读一个换行，保证第一行是完整的
+        while pos > 0 and data.count(b'\n') <= n:
+            step = min(TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.decode('utf-8', errors='ignore').splitlines(keepends=True)
+    return lines[-n:] if n else []
+
+
+async def follow(path, interval=FOLLOW_INTERVAL):
+    """
+    Async iterator over lines appended to the file from now on, like `tail -F`:
+    survives the file being rotated, truncated or not existing yet.
+    """
+    f = None
+    buffer = b''
+    # 只有第一次打开时跳到末尾；之后（轮转或文件后创建）都是新内容
+    seek_end = True
+    try:
+        while True:
+            if f is None:
+                try:
+                    f = open(path, 'rb')
+                    if seek_end:
+                        f.seek(0, os.SEEK_END)
+                except FileNotFoundError:
+                    await asyncio.sleep(interval)
+                    continue
+                finally:
+                    seek_end = False
+
+            chunk = f.read()
+            if chunk:
+                buffer += chunk
+                *complete, buffer = buffer.split(b'\n')
+                for line in complete:
+                    yield line.decode('utf-8', errors='ignore') + '\n'
+                continue
+
+            await asyncio.sleep(interval)
+            # 轮转后原路径指向新文件；截断后文件比当前位置短
+            try:
+                st = os.stat(path)
+                rotated = st.st_ino != os.fstat(f.fileno()).st_ino
+                truncated = not rotated and st.st_size < f.tell()
+            except FileNotFoundError:
+                rotated, truncated = True, False
+            if truncated:
+                f.seek(0)
+                buffer = b''
+            elif rotated:
+                # 先读完旧文件剩下的内容，再切换到新文件
+                rest = buffer + f.read()
+                f.close()
+                buffer = b''
+                for line in rest.split(b'\n'):
+                    if line:
+                        yield line.decode('utf-8', errors='ignore') + '\n'
+                f = None
+    finally:
+        if f is not None:
+            f.close()
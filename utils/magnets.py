@@ -0,0 +1,96 @@
+import re
+import base64
+import hashlib
+
+BTIH_RE = re.compile(r'^urn:btih:([0-9a-fA-F]{40}|[A-Za-z2-7]{32})$')
+
+# IN (...) 里一次最多放的参数个数（旧版 SQLite 上限 999）
+LOOKUP_CHUNK = 500
+
+
+def parse_magnet(link):
+    """
+    Splits a magnet URI into (infohash, canonical link, trackers).
+
+    infohash is the 20-byte BTIH (hex or base32 form). Links without one
+    (other URN types, plain URLs) get the SHA-1 of the link text instead,
+    so they still have a stable key. The canonical link keeps every
+    parameter except the tr= trackers, in their original order, with the
+    BTIH written as lowercase hex. Trackers are returned raw, as they appear.
+    """
+    link = link or ''
+    if not link.lower().startswith('magnet:?'):
+        return hashlib.sha1(link.encode('utf-8')).digest(), link, []
+
+    infohash = None
+    params = []
+    trackers = []
+    for param in link[len('magnet:?'):].split('&'):
+        key, _, value = param.partition('=')
+        if key == 'tr':
+            if value and value not in trackers:
+                trackers.append(value)
+            continue
+        if key == 'xt' and infohash is None:
+            match = BTIH_RE.match(value)
+            if match:
+                raw = match.group(1)
+                infohash = bytes.fromhex(raw) if len(raw) == 40 else base64.b32decode(raw.upper())
+                param = f"xt=urn:btih:{infohash.hex()}"
+        if param:
+            params.append(param)
+
+    canonical = 'magnet:?' + '&'.join(params)
+    if infohash is None:
+        infohash = hashlib.sha1(canonical.encode('utf-8')).digest()
+    return infohash, canonical, trackers
+
+
+def build_magnet(link, trackers):
+    return link + ''.join(f"&tr={tracker}" for tracker in trackers)
+
+
+def save_trackers(cursor, items):
+    """
+    Stores trackers for (infohash, [tracker, ...]) pairs; already known
+    trackers are ignored. Returns the number of new tracker rows.
+    """
+    rows = [(infohash, tracker) for infohash, trackers in items for tracker in trackers]
+    if not rows:
+        return 0
+    before = cursor.connection.total_changes
+    cursor.executemany("INSERT OR IGNORE INTO magnet_trackers (infohash, url) VALUES (?, ?)", rows)
+    return cursor.connection.total_changes - before
+
+
+def load_trackers(cursor, infohashes):
+    """
+    {infohash: [tracker, ...]} in insertion order.
+    """
+    infohashes = list(set(infohashes))
+    found = {}
+    for i in range(0, len(infohashes), LOOKUP_CHUNK):
+        chunk = infohashes[i:i + LOOKUP_CHUNK]
+        cursor.execute(f"""
+            SELECT infohash, url FROM magnet_trackers
+            WHERE infohash IN ({', '.join('?' * len(chunk))}) ORDER BY rowid
+        """, chunk)
+        for infohash, url in cursor.fetchall():
+            found.setdefault(infohash, []).append(url)
+    return found
+
+
+def attach_trackers(cursor, rows):
+    """
+    Prepares magnet rows (dicts from SELECT m.*) for the API: the trackers
+    are appended back onto magnet_link and the infohash becomes hex text.
+    """
+    trackers = load_trackers(cursor, [row['infohash'] for row in rows if row.get('infohash')])
+    for row in rows:
+        infohash = row.get('infohash')
+        if infohash is None:
+            continue
+        if infohash in trackers:
+            row['magnet_link'] = build_magnet(row['magnet_link'], trackers[infohash])
+        row['infohash'] = infohash.hex()
+    return rows
@@ -0,0 +1,257 @@
+import os
+import math
+import time
+import threading
+
+# 请求耗时直方图的桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 抓取阶段可能持续数分钟
+PHASE_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+# /metrics 里统计行数的表
+DB_TABLES = ("magnets", "best_picks", "emby_episodes", "feed_state")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [每个桶的计数..., 总和, 总数]；渲染时再累加，观测只需一次自增
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = _format_labels(self.label_names, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class PhaseClock:
+    """
+    Records how long each consecutive phase of a run took:
+    clock.lap('navigation') stores the time since the previous lap.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.timings[phase] = round(self.timings.get(phase, 0) + now - self._last, 3)
+        self._last = now
+        return self.timings[phase]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_request_seconds = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time until the response headers were sent, per route.",
+    ("method", "route", "status")))
+scrape_phase_seconds = REGISTRY.register(Histogram(
+    "scrape_phase_duration_seconds", "Duration of each scrape phase.", ("phase",), PHASE_BUCKETS))
+rss_fetch_seconds = REGISTRY.register(Histogram(
+    "rss_fetch_duration_seconds", "Conditional GET of the RSS feed.", ("status",)))
+rss_parse_seconds = REGISTRY.register(Histogram(
+    "rss_parse_duration_seconds", "feedparser + parse_title over a changed feed."))
+parse_title_calls = REGISTRY.register(Counter(
+    "parse_title_calls_total", "parse_title calls (cache hits + misses) by calling process.", ("process",)))
+parse_title_hits = REGISTRY.register(Counter(
+    "parse_title_cache_hits_total", "parse_title calls answered from the cache.", ("process",)))
+parse_title_hit_ratio = REGISTRY.register(Gauge(
+    "parse_title_cache_hit_ratio", "Cache hit ratio of parse_title.", ("process",)))
+db_size_bytes = REGISTRY.register(Gauge(
+    "db_size_bytes", "SQLite database size, main file and WAL.", ("file",)))
+db_rows = REGISTRY.register(Gauge(
+    "db_rows", "Row count per table.", ("table",)))
+job_last_success = REGISTRY.register(Gauge(
+    "job_last_success_timestamp_seconds", "Unix time of the last successful run.", ("job",)))
+job_runs = REGISTRY.register(Counter(
+    "job_runs_total", "Finished job runs by status.", ("job", "status")))
+
+
+def record_parse_stats(process, hits, misses):
+    """
+    Adds one run's parse_title cache statistics (deltas) and updates the
+    cumulative hit ratio of that process kind.
+    """
+    parse_title_calls.inc(hits + misses, process=process)
+    parse_title_hits.inc(hits, process=process)
+    calls = parse_title_calls.get(process=process)
+    if calls:
+        parse_title_hit_ratio.set(parse_title_hits.get(process=process) / calls, process=process)
+
+
+def record_job_result(job, status, finished_at=None):
+    job_runs.inc(job=job, status=status)
+    if status == "succeeded":
+        job_last_success.set(finished_at or time.time(), job=job)
+
+
+def collect_db_stats(conn, path):
+    """
+    Refreshes the DB gauges; called when /metrics is scraped. COUNT(*) walks
+    the smallest index of each table, a few milliseconds at our sizes.
+    """
+    for suffix, file in (("", "main"), ("-wal", "wal")):
+        try:
+            db_size_bytes.set(os.path.getsize(path + suffix), file=file)
+        except OSError:
+            db_size_bytes.set(0, file=file)
+    cursor = conn.cursor()
+    for table in DB_TABLES:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        db_rows.set(cursor.fetchone()[0], table=table)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware timing every HTTP request up to its response start,
+    so streaming (SSE) endpoints are measured by their setup cost only.
+    Requests are labelled with the route template to keep cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                http_request_seconds.observe(
+                    time.perf_counter() - start,
+                    method=scope["method"],
+                    route=getattr(route, "path", "unmatched"),
+                    status=message["status"],
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
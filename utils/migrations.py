@@ -0,0 +1,381 @@
+import datetime
+
+from config import (CREATE_TABLE_SQL, CREATE_META_TABLE_SQL, CREATE_FTS_SQL, CREATE_CHANGES_SQL,
+                    SBSUB_RSS_URL, EMBY_SERIES_NAME)
+from utils.parser import episode_key
+from utils.picks import rebuild_picks
+from utils.magnets import parse_magnet, save_trackers
+from utils.cache import bump_data_version
+
+CREATE_SCHEMA_VERSION_SQL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT,
+    applied_at TEXT
+);
+"""
+
+
+def _mark_picks_stale(cursor):
+    # best_picks 按当前代码的表结构重建；迁移中途的旧结构可能还对不上，
+    # 所以只记个标记，等全部迁移完成后再统一重建（标记与迁移同一事务，中断后也不会丢）
+    cursor.execute("""
+        INSERT INTO app_meta (key, value) VALUES ('picks_stale', '1')
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """)
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def migrate_base_schema(cursor):
+    """
+    v1: magnets, app_meta and the FTS5 title index.
+    Databases created before migrations existed already have some of these,
+    so every statement is idempotent.
+    """
+    cursor.execute(CREATE_TABLE_SQL)
+    cursor.execute(CREATE_META_TABLE_SQL)
+    fts_existed = _table_exists(cursor, 'magnets_fts')
+    for statement in CREATE_FTS_SQL.split(';\n\n'):
+        if statement.strip():
+            cursor.execute(statement)
+    if not fts_existed:
+        cursor.execute("INSERT INTO magnets_fts (magnets_fts) VALUES ('rebuild')")
+
+
+def migrate_episode_num(cursor):
+    """
+    v2: numeric episode key + movie/TV kind, backfilled from `episode`,
+    and indexes for the hot lookups.
+    """
+    cursor.execute("ALTER TABLE magnets ADD COLUMN episode_num INTEGER")
+    cursor.execute("ALTER TABLE magnets ADD COLUMN kind TEXT")
+
+    cursor.execute("SELECT DISTINCT episode FROM magnets WHERE episode IS NOT NULL")
+    updates = []
+    for (episode,) in cursor.fetchall():
+        num, kind = episode_key(episode)
+        if kind:
+            updates.append((num, kind, episode))
+    cursor.executemany("UPDATE magnets SET episode_num = ?, kind = ? WHERE episode = ?", updates)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_magnets_magnet_link ON magnets(magnet_link)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_magnets_episode_num ON magnets(kind, episode_num)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_magnets_publish_date ON magnets(publish_date)")
+
+
+def migrate_feed_state(cursor):
+    """
+    v3: per-feed validators (ETag / Last-Modified) and content fingerprint
+    for conditional RSS polling.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS feed_state (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            checked_at TEXT,
+            changed_at TEXT
+        )
+    """)
+
+
+def migrate_best_picks(cursor):
+    """
+    v4: materialized best magnet per episode, maintained by utils.ingest.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS best_picks (
+            kind TEXT NOT NULL,
+            episode_num INTEGER NOT NULL,
+            magnet_id INTEGER NOT NULL,
+            PRIMARY KEY (kind, episode_num)
+        )
+    """)
+    _mark_picks_stale(cursor)
+
+
+def migrate_emby_library(cursor):
+    """
+    v5: persisted Emby episode index, synced incrementally by utils.emby.
+    One row per (item, episode number); multi-episode files get several rows.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS emby_libraries (
+            host TEXT NOT NULL,
+            tmdb_id TEXT NOT NULL,
+            series_id TEXT,
+            last_saved TEXT,
+            synced_at REAL,
+            PRIMARY KEY (host, tmdb_id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS emby_episodes (
+            host TEXT NOT NULL,
+            tmdb_id TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            episode_num INTEGER
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_emby_episodes_num ON emby_episodes(host, tmdb_id, episode_num)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_emby_episodes_item ON emby_episodes(host, tmdb_id, item_id)")
+
+
+def migrate_item_hashes(cursor):
+    """
+    v6: markup fingerprint of every tvlist item, so scrapes skip unchanged episodes.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_hashes (
+            episode TEXT PRIMARY KEY,
+            hash TEXT NOT NULL,
+            seen_at TEXT
+        )
+    """)
+
+
+def migrate_infohash(cursor):
+    """
+    v7: magnets keyed by the 20-byte BTIH infohash instead of the full link
+    text. Trackers move to magnet_trackers and magnet_link keeps the
+    canonical tracker-less link. Rows that were the same torrent under
+    different tracker lists or dn= values collapse into one per episode;
+    the most recently inserted row wins.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS magnet_trackers (
+            infohash BLOB NOT NULL,
+            url TEXT NOT NULL,
+            UNIQUE (infohash, url)
+        )
+    """)
+
+    cursor.execute("SELECT id, magnet_link, episode FROM magnets ORDER BY id")
+    keep = {}
+    trackers = []
+    for row_id, link, episode in cursor.fetchall():
+        infohash, canonical, row_trackers = parse_magnet(link)
+        keep[(infohash, episode)] = (row_id, infohash, canonical)
+        trackers.append((infohash, row_trackers))
+    save_trackers(cursor, trackers)
+
+    cursor.execute("CREATE TEMP TABLE magnet_keys (id INTEGER PRIMARY KEY, infohash BLOB, magnet_link TEXT)")
+    cursor.executemany("INSERT INTO magnet_keys VALUES (?, ?, ?)", keep.values())
+
+    # SQLite 无法删除表级 UNIQUE 约束，只能重建表（保留原 id，best_picks / FTS 都按 id 关联）
+    cursor.execute("""
+        CREATE TABLE magnets_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            infohash BLOB NOT NULL,
+            magnet_link TEXT,
+            episode TEXT,
+            episode_num INTEGER,
+            kind TEXT,
+            episode_title TEXT,
+            resolution TEXT,
+            container TEXT,
+            subtitle TEXT,
+            source_type TEXT,
+            raw_title TEXT,
+            publish_date TEXT,
+            UNIQUE (infohash, episode)
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO magnets_new (id, infohash, magnet_link, episode, episode_num, kind, episode_title,
+                                 resolution, container, subtitle, source_type, raw_title, publish_date)
+        SELECT m.id, k.infohash, k.magnet_link, m.episode, m.episode_num, m.kind, m.episode_title,
+               m.resolution, m.container, m.subtitle, m.source_type, m.raw_title, m.publish_date
+        FROM magnets m JOIN magnet_keys k ON k.id = m.id
+    """)
+    cursor.execute("DROP TABLE magnet_keys")
+    cursor.execute("DROP TABLE magnets")
+    cursor.execute("ALTER TABLE magnets_new RENAME TO magnets")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_magnets_episode_num ON magnets(kind, episode_num)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_magnets_publish_date ON magnets(publish_date)")
+    # 删表时触发器一并删除，重新创建后重建 FTS 索引
+    for statement in CREATE_FTS_SQL.split(';\n\n'):
+        if statement.strip():
+            cursor.execute(statement)
+    cursor.execute("INSERT INTO magnets_fts (magnets_fts) VALUES ('rebuild')")
+
+    _mark_picks_stale(cursor)
+    bump_data_version(cursor)
+
+
+def migrate_series(cursor):
+    """
+    v8: series and feeds tables for multi-feed monitoring. Existing magnets
+    and the SBSUB feed belong to the default series (id 1); episode lookups
+    and best_picks are keyed by series from now on.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS series (
+            id INTEGER PRIMARY KEY,
+            slug TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            tmdb_id TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS feeds (
+            id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL UNIQUE,
+            series_id INTEGER NOT NULL REFERENCES series(id),
+            name TEXT,
+            enabled INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO series (id, slug, name, tmdb_id) VALUES (1, 'conan', ?, '30983')",
+                   (EMBY_SERIES_NAME,))
+    cursor.execute("INSERT OR IGNORE INTO feeds (url, series_id, name) VALUES (?, 1, 'SBSUB')", (SBSUB_RSS_URL,))
+
+    cursor.execute("ALTER TABLE magnets ADD COLUMN series_id INTEGER NOT NULL DEFAULT 1")
+    cursor.execute("DROP INDEX IF EXISTS idx_magnets_episode_num")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_magnets_series_episode ON magnets(series_id, kind, episode_num)")
+
+    cursor.execute("DROP TABLE IF EXISTS best_picks")
+    cursor.execute("""
+        CREATE TABLE best_picks (
+            series_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            episode_num INTEGER NOT NULL,
+            magnet_id INTEGER NOT NULL,
+            PRIMARY KEY (series_id, kind, episode_num)
+        )
+    """)
+    _mark_picks_stale(cursor)
+    bump_data_version(cursor)
+
+
+def migrate_change_log(cursor):
+    """
+    v9: trigger-maintained change log of magnets for /api/magnets/changes.
+    Starts with a 'reset' entry: cursors from before the log existed
+    (or from another database) have to do one full sync first.
+    """
+    for statement in CREATE_CHANGES_SQL.split(';\n\n'):
+        if statement.strip():
+            cursor.execute(statement)
+    cursor.execute("INSERT INTO magnet_changes (op) VALUES ('reset')")
+
+
+def migrate_series_key(cursor):
+    """
+    v10: magnets unique per (series_id, infohash, episode), so the same
+    release in two series is two rows instead of one shared by both.
+    Rebuilds the table (keeping ids) and recreates its triggers and indexes.
+    """
+    cursor.execute("""
+        CREATE TABLE magnets_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            infohash BLOB NOT NULL,
+            magnet_link TEXT,
+            series_id INTEGER NOT NULL DEFAULT 1,
+            episode TEXT,
+            episode_num INTEGER,
+            kind TEXT,
+            episode_title TEXT,
+            resolution TEXT,
+            container TEXT,
+            subtitle TEXT,
+            source_type TEXT,
+            raw_title TEXT,
+            publish_date TEXT,
+            UNIQUE (series_id, infohash, episode)
+        )
+    """)
+    columns = ("id, infohash, magnet_link, series_id, episode, episode_num, kind, episode_title, "
+               "resolution, container, subtitle, source_type, raw_title, publish_date")
+    cursor.execute(f"INSERT INTO magnets_new ({columns}) SELECT {columns} FROM magnets")
+    cursor.execute("DROP TABLE magnets")
+    cursor.execute("ALTER TABLE magnets_new RENAME TO magnets")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_magnets_series_episode ON magnets(series_id, kind, episode_num)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_magnets_publish_date ON magnets(publish_date)")
+    # 删表时 FTS 和变更日志的触发器一并删除；id 不变，FTS 索引本身不用重建
+    for sql in (CREATE_FTS_SQL, CREATE_CHANGES_SQL):
+        for statement in sql.split(';\n\n'):
+            if statement.strip():
+                cursor.execute(statement)
+    bump_data_version(cursor)
+
+
+# (version, description, function) — append only, never renumber
+MIGRATIONS = [
+    (1, "base schema", migrate_base_schema),
+    (2, "episode_num/kind columns and indexes", migrate_episode_num),
+    (3, "feed_state table", migrate_feed_state),
+    (4, "best_picks table", migrate_best_picks),
+    (5, "emby library tables", migrate_emby_library),
+    (6, "item_hashes table", migrate_item_hashes),
+    (7, "infohash key and magnet_trackers", migrate_infohash),
+    (8, "series and feeds", migrate_series),
+    (9, "magnet change log", migrate_change_log),
+    (10, "magnets unique per series", migrate_series_key),
+]
+
+
+def get_schema_version(cursor):
+    cursor.execute(CREATE_SCHEMA_VERSION_SQL)
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    return cursor.fetchone()[0] or 0
+
+
+def apply_migrations(conn):
+    """
+    Brings the database up to the latest schema version and returns it.
+    Each migration runs in its own transaction together with its version row,
+    so a failed migration leaves the database at the previous version.
+    """
+    cursor = conn.cursor()
+    current = get_schema_version(cursor)
+    conn.commit()
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            # IMMEDIATE: 拿到写锁后再确认版本，避免 web 服务与爬虫进程同时迁移
+            cursor.execute("BEGIN IMMEDIATE")
+            current = get_schema_version(cursor)
+            if version <= current:
+                conn.rollback()
+                continue
+            migrate(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.datetime.now().isoformat())
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+
+    _rebuild_stale_picks(conn)
+    return current
+
+
+def _rebuild_stale_picks(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM app_meta WHERE key = 'picks_stale'")
+    if cursor.fetchone() is None:
+        return
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("DELETE FROM app_meta WHERE key = 'picks_stale'")
+        # 另一个进程可能已经重建过了
+        if cursor.rowcount:
+            rebuild_picks(cursor)
+            bump_data_version(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
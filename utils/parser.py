@@ -1,92 +1,142 @@
 import re
 
+from functools import lru_cache
+
+# 字幕按优先级匹配（不是按出现位置），数字越小优先级越高
+SUBTITLE_PRIORITY = [
+    ('sub_bi', 'CHS_JP'),     # CHS_JP / CHT_JP / CHS&JP / CHT&JP, normalized
+    ('sub_chs_jp', 'CHS_JP'),
+    ('sub_cht_jp', 'CHT_JP'),
+    ('sub_chs', 'CHS'),
+    ('sub_cht', 'CHT'),
+    ('sub_jp', 'JP'),
+]
+
+# One combined pattern, scanned once per title. The whole alternation is a
+# zero-width lookahead, so a token never consumes characters that start a token
+# of another category (e.g. "MP4K" yields both MP4 and 4K, like separate searches).
+# The leading character class is a cheap gate: positions that can't start any
+# token are rejected before the alternatives are tried.
+TOKEN_RE = re.compile(r"""(?=[M剧0-9第ACBJ简繁日WHD])(?=(?:
+      (?P<movie>M|Movie|剧场版)(?=[\s_]*(?P<movie_num>\d{1,2}))
+    | (?:^|(?<=[\[【\s]))(?P<ep>\d{3,4})(?=[\]】\s]|$)
+    | 第(?P<ep_cn>\d{3,4})(?=话|集)
+    | (?P<resolution>1080P|720P|2160P|4K)
+    | (?P<container>MKV|MP4|AVI)
+    | (?P<sub_bi>CHS_JP|CHT_JP|CHS&JP|CHT&JP)
+    | (?P<sub_chs_jp>简日)
+    | (?P<sub_cht_jp>繁日)
+    | (?P<sub_chs>CHS|简体)
+    | (?P<sub_cht>CHT|BIG5|繁体)
+    | (?P<sub_jp>JP|JAPANESE|日吉)
+    | (?P<source_type>WEBRIP|HDTV|BDRIP|BLURAY|DVDISO|DVD)
+))""", re.IGNORECASE | re.VERBOSE)
+
+SUBTITLE_RANK = {group: (rank, value) for rank, (group, value) in enumerate(SUBTITLE_PRIORITY)}
+
+PARSE_CACHE_SIZE = 8192
+
+EMPTY_RESULT = {
+    'episode': None,
+    'resolution': None,
+    'container': None,
+    'subtitle': None,
+    'source_type': None
+}
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_cached(title):
+    movie = ep = ep_cn = resolution = container = source_type = None
+    sub_rank = None
+    subtitle = None
+
+    for m in TOKEN_RE.finditer(title):
+        kind = m.lastgroup
+        if kind == 'movie_num':
+            # lastgroup 指向 lookahead 里的数字组
+            if movie is None:
+                movie = m.group('movie_num')
+        elif kind == 'ep':
+            if ep is None:
+                ep = m.group('ep')
+        elif kind == 'ep_cn':
+            if ep_cn is None:
+                ep_cn = m.group('ep_cn')
+        elif kind == 'resolution':
+            if resolution is None:
+                resolution = m.group(kind).upper()
+        elif kind == 'container':
+            if container is None:
+                container = m.group(kind).upper()
+        elif kind == 'source_type':
+            if source_type is None:
+                source_type = m.group(kind).upper()
+        else:
+            rank, value = SUBTITLE_RANK[kind]
+            if sub_rank is None or rank < sub_rank:
+                sub_rank, subtitle = rank, value
+
+    # 1. Episode: movie wins; otherwise the first bracketed/standalone number
+    # (skipped when it looks like a year), then "第xxx话/集"
+    episode = None
+    if movie is not None:
+        episode = f"M{movie}"
+    else:
+        if ep is not None:
+            ep_num = int(ep)
+            if ep_num < 1990 or ep_num > 2100:
+                episode = str(ep_num)
+        if episode is None and ep_cn is not None:
+            episode = ep_cn
+
+    return (episode, resolution, container, subtitle, source_type)
+
+
 def parse_title(title):
     """
     Parses the raw title to extract metadata.
     Returns a dictionary with keys: episode, resolution, container, subtitle, source_type.
     Values are None if not found.
+    Results are memoized per title (the scraper sees the same labels thousands of times).
     """
     if not title:
-        return {
-            'episode': None,
-            'resolution': None,
-            'container': None,
-            'subtitle': None,
-            'source_type': None
-        }
-
-    result = {
-        'episode': None,
-        'resolution': None,
-        'container': None,
-        'subtitle': None,
-        'source_type': None
+        return dict(EMPTY_RESULT)
+
+    episode, resolution, container, subtitle, source_type = _parse_cached(title)
+    return {
+        'episode': episode,
+        'resolution': resolution,
+        'container': container,
+        'subtitle': subtitle,
+        'source_type': source_type
     }
-    
-    # 1. Episode
-    # Prioritize Movie (Mxx or 剧场版xx or Movie xx)
-    movie_match = re.search(r'(?:M|Movie|剧场版)[\s_]*(\d{1,2})', title, re.IGNORECASE)
-    if movie_match:
-        result['episode'] = f"M{movie_match.group(1)}"
-    else:
-        # Standard episode (3-4 digits), usually inside brackets or standalone
-        # Avoid years like 2024
-        # Look for [1190] or 【1190】 or " 1190 " or start of string "1190 ..."
-        ep_match = re.search(r'(?:^|[\[【\s])(\d{3,4})(?:[\]】\s]|$)', title)
-        if ep_match:
-            ep_num = int(ep_match.group(1))
-            if ep_num < 1990 or ep_num > 2100: # Simple heuristic to avoid years if possible, though 20xx is valid episode in future
-                 result['episode'] = str(ep_num)
-        
-        # Fallback: look for 第xxx话
-        if not result['episode']:
-             ep_match_2 = re.search(r'第(\d{3,4})(?:话|集)', title)
-             if ep_match_2:
-                 result['episode'] = ep_match_2.group(1)
-
-
-    # 2. Resolution
-    res_match = re.search(r'(1080[Pp]|720[Pp]|2160[Pp]|4[Kk])', title, re.IGNORECASE)
-    if res_match:
-        result['resolution'] = res_match.group(1).upper()
-
-    # 3. Container
-    cont_match = re.search(r'(MKV|MP4|AVI)', title, re.IGNORECASE)
-    if cont_match:
-        result['container'] = cont_match.group(1).upper()
-
-    # 4. Subtitle
-    # Common patterns: CHS, CHT, JP, 简日, 繁日, 简繁
-    sub_patterns = [
-        (r'(CHS_JP|CHT_JP|CHS\&JP|CHT\&JP)', 'CHS_JP'), # Normalize
-        (r'(简日|简日双语)', 'CHS_JP'),
-        (r'(繁日|繁日双语)', 'CHT_JP'),
-        (r'(CHS|简体)', 'CHS'),
-        (r'(CHT|BIG5|繁体)', 'CHT'),
-        (r'(JP|JAPANESE|日吉)', 'JP') # Typo in regex? JP usually implies raw if alone, but sometimes subtitles.
-    ]
-    
-    found_sub = False
-    for pat, val in sub_patterns:
-        if re.search(pat, title, re.IGNORECASE):
-            result['subtitle'] = val
-            found_sub = True
-            break
-            
-    # 5. Source Type
-    src_match = re.search(r'(WEBRIP|HDTV|BDRIP|BLURAY|DVDISO|DVD)', title, re.IGNORECASE)
-    if src_match:
-        result['source_type'] = src_match.group(1).upper()
-
-    return result
-
-if __name__ == "__main__":
-    # Test cases
-    test_titles = [
-        "[银色子弹][名侦探柯南][1190][1080P][MKV][简日双语]",
-        "[SilverBullet][Detective Conan][Movie 27][1080P][BDRip][CHS_JP]",
-        "名侦探柯南 第1000集 720P MP4",
-        "[SBSUB][Conan][M26][1080P][WEBRIP][CHT]"
-    ]
-    for t in test_titles:
-        print(f"Title: {t}\nResult: {parse_title(t)}\n")
+
+
+def parse_titles(titles):
+    """
+    Batch variant of parse_title: returns a list of results in input order.
+    """
+    return [parse_title(title) for title in titles]
+
+
+def parse_cache_info():
+    """
+    Hit/miss statistics of the parse cache (functools CacheInfo).
+    """
+    return _parse_cached.cache_info()
+
+def episode_key(episode):
+    """
+    Derives the numeric sort key and kind from a stored episode label.
+    "1190" -> (1190, 'tv'), "M26" / "剧场版26" -> (26, 'movie'), otherwise (None, None).
+    """
+    if not episode:
+        return None, None
+    episode = str(episode).strip()
+    if episode.isdigit():
+        return int(episode), 'tv'
+    if episode.upper().startswith('M') or '剧场版' in episode:
+        num_match = re.search(r'\d+', episode)
+        return (int(num_match.group(0)) if num_match else None), 'movie'
+    return None, None
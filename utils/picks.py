@@ -0,0 +1,156 @@
+import json
+
+from utils.cache import bump_data_version
+from utils.magnets import attach_trackers
+from utils.series import DEFAULT_SERIES_ID
+
+RANK_CATEGORIES = ('resolution', 'subtitle', 'source_type', 'container')
+
+# 默认优先级（与前端原先的默认配置一致）
+DEFAULT_RANKING = {
+    'resolution': ['1080P', '1080p', '720P', '720p', '4K', '2160P', 'Unknown'],
+    'subtitle': ['简日双语', '简日', '繁日', 'CHS_JP', 'Unknown'],
+    'source_type': ['WEBRIP', 'WebRip', 'BDRIP', 'BDRip', 'HDTV', 'Unknown'],
+    'container': ['MP4', 'mp4', 'MKV', 'mkv', 'Unknown'],
+}
+
+# 不在优先级列表里的值排在最后
+UNRANKED = 999
+
+RANK_COLUMNS = "id, series_id, kind, episode_num, " + ", ".join(RANK_CATEGORIES)
+
+
+def get_ranking(cursor):
+    cursor.execute("SELECT value FROM app_meta WHERE key = 'ranking_config'")
+    row = cursor.fetchone()
+    ranking = dict(DEFAULT_RANKING)
+    if row:
+        ranking.update(json.loads(row[0]))
+    return ranking
+
+
+def validate_ranking(config):
+    """
+    Returns a clean ranking dict; raises ValueError on malformed input.
+    Missing categories fall back to the defaults.
+    """
+    if not isinstance(config, dict):
+        raise ValueError("ranking must be an object")
+    ranking = dict(DEFAULT_RANKING)
+    for category, values in config.items():
+        if category not in RANK_CATEGORIES:
+            raise ValueError(f"unknown category: {category}")
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            raise ValueError(f"{category} must be a list of strings")
+        ranking[category] = values
+    return ranking
+
+
+def rank_key(row, ranking):
+    """
+    Sort key of one magnet (a dict with the RANK_CATEGORIES and id): per
+    category, the position of the first priority entry that contains or is
+    contained in the value; ties go to the newest row.
+    """
+    key = []
+    for category in RANK_CATEGORIES:
+        value = row[category] or 'Unknown'
+        index = UNRANKED
+        for i, item in enumerate(ranking[category]):
+            if item in value or value in item:
+                index = i
+                break
+        key.append(index)
+    key.append(-row['id'])
+    return key
+
+
+def pick_best(rows, ranking):
+    return min(rows, key=lambda row: rank_key(row, ranking)) if rows else None
+
+
+def rebuild_picks(cursor, episodes=None, ranking=None):
+    """
+    Recomputes best_picks for the given (series_id, kind, episode_num) triples, or for
+    every episode when episodes is None. Returns the number of episodes updated.
+    """
+    ranking = ranking or get_ranking(cursor)
+    if episodes is None:
+        cursor.execute("DELETE FROM best_picks")
+        cursor.execute(f"SELECT {RANK_COLUMNS} FROM magnets WHERE kind IS NOT NULL AND episode_num IS NOT NULL")
+    else:
+        episodes = [list(ep) for ep in episodes if ep[1] is not None and ep[2] is not None]
+        if not episodes:
+            return 0
+        cursor.execute(f"""
+            SELECT {RANK_COLUMNS} FROM magnets
+            WHERE (series_id, kind, episode_num) IN (
+                SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]')
+                FROM json_each(?)
+            )
+        """, (json.dumps(episodes),))
+
+    columns = [d[0] for d in cursor.description]
+    best = {}
+    for values in cursor.fetchall():
+        row = dict(zip(columns, values))
+        ep = (row['series_id'], row['kind'], row['episode_num'])
+        key = rank_key(row, ranking)
+        current = best.get(ep)
+        if current is None or key < current[0]:
+            best[ep] = (key, row['id'])
+
+    if episodes is not None:
+        # 没有任何磁链的集（已被删除）不再保留精选
+        gone = [ep for ep in map(tuple, episodes) if ep not in best]
+        cursor.executemany("DELETE FROM best_picks WHERE series_id = ? AND kind = ? AND episode_num = ?", gone)
+    cursor.executemany("""
+        INSERT INTO best_picks (series_id, kind, episode_num, magnet_id) VALUES (?, ?, ?, ?)
+        ON CONFLICT(series_id, kind, episode_num) DO UPDATE SET magnet_id = excluded.magnet_id
+    """, [(*ep, magnet_id) for ep, (_, magnet_id) in best.items()])
+    return len(best)
+
+
+def set_ranking(cursor, config):
+    """
+    Stores a new ranking and rebuilds every pick with it.
+    """
+    ranking = validate_ranking(config)
+    cursor.execute("""
+        INSERT INTO app_meta (key, value) VALUES ('ranking_config', ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (json.dumps(ranking, ensure_ascii=False),))
+    rebuild_picks(cursor, ranking=ranking)
+    bump_data_version(cursor)
+    return ranking
+
+
+def get_picks(conn, episodes=None, ep_from=None, ep_to=None, kind='tv', series_id=DEFAULT_SERIES_ID):
+    """
+    Best magnet per episode of one series straight from best_picks, newest episode first.
+    """
+    where = ["b.series_id = ?", "b.kind = ?"]
+    params = [series_id, kind]
+    if episodes is not None:
+        where.append("b.episode_num IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(episodes)))
+    if ep_from is not None:
+        where.append("b.episode_num >= ?")
+        params.append(ep_from)
+    if ep_to is not None:
+        where.append("b.episode_num <= ?")
+        params.append(ep_to)
+
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT m.* FROM best_picks b JOIN magnets m ON m.id = b.magnet_id
+        WHERE {' AND '.join(where)}
+        ORDER BY b.episode_num DESC
+    """, params)
+    columns = [d[0] for d in cursor.description]
+    picks = attach_trackers(cursor, [dict(zip(columns, row)) for row in cursor.fetchall()])
+    return {
+        "picks": [{"num": item['episode_num'], "data": item} for item in picks],
+        "total": len(picks),
+        "ranking": get_ranking(cursor)
+    }
@@ -0,0 +1,207 @@
+from utils.search import split_keywords, split_terms, like_pattern, SHORT_TERM_SQL
+from utils.picks import get_ranking, pick_best
+from utils.magnets import attach_trackers
+from utils.series import DEFAULT_SERIES_ID
+
+# 只有 TV 集数参与按集分页（剧场版等 kind 不同）
+TV_EPISODE_SQL = "kind = 'tv'"
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 500
+# 集数列表（"1-12,40"）最多展开的集数，防止 "1-999999999" 在请求线程里建出巨大的列表
+MAX_EPISODE_LIST = 10000
+
+
+def parse_episode_ranges(text):
+    """
+    Parses a compact episode list such as "1-12,40" into a sorted list of ints.
+    Raises ValueError if it would expand to more than MAX_EPISODE_LIST episodes.
+    """
+    episodes = set()
+    if not text:
+        return []
+    total = 0
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = part.split('-', 1)
+            lo, hi = int(lo), int(hi)
+            if lo > hi:
+                lo, hi = hi, lo
+        else:
+            lo = hi = int(part)
+        # 先按区间长度累计，超限时还没有分配任何东西
+        total += hi - lo + 1
+        if total > MAX_EPISODE_LIST:
+            raise ValueError(f"episode list too long (max {MAX_EPISODE_LIST} episodes)")
+        episodes.update(range(lo, hi + 1))
+    return sorted(episodes)
+
+
+def get_max_episode(cursor, series_id=DEFAULT_SERIES_ID):
+    cursor.execute(f"SELECT MAX(episode_num) FROM magnets WHERE series_id = ? AND {TV_EPISODE_SQL}", (series_id,))
+    row = cursor.fetchone()
+    return row[0] or 0
+
+
+def get_max_episodes(cursor, series_id=DEFAULT_SERIES_ID):
+    """{kind: highest episode_num} of a series, e.g. {'tv': 1190, 'movie': 28}."""
+    cursor.execute("""
+        SELECT kind, MAX(episode_num) FROM magnets
+        WHERE series_id = ? AND kind IS NOT NULL GROUP BY kind
+    """, (series_id,))
+    return {kind: num for kind, num in cursor.fetchall() if num is not None}
+
+
+def query_episodes(conn, page=1, page_size=DEFAULT_PAGE_SIZE, ep_from=None, ep_to=None,
+                   q=None, status='all', episodes=None, locate=None,
+                   resolution=None, subtitle=None, source_type=None, container=None, best=False,
+                   series_id=DEFAULT_SERIES_ID):
+    """
+    Returns one page of episodes of one series (newest first) together with the filtered total.
+
+    Every episode between 1 and the highest known episode is a candidate, so
+    missing episodes show up as empty entries just like the old client-side list.
+    Filtering happens in SQL; only the magnets of the requested page are loaded.
+
+    page_size=0 returns every matching episode (used by "copy all").
+    locate=<episode> overrides page with the page that contains that episode.
+    best=True keeps only the best-ranked magnet of each episode (smart filter).
+    """
+    cursor = conn.cursor()
+    max_ep = get_max_episode(cursor, series_id)
+
+    target_ep, keywords = split_keywords(q)
+    tags = {'resolution': resolution, 'subtitle': subtitle,
+            'source_type': source_type, 'container': container}
+    tag_filters = {k: v for k, v in tags.items() if v}
+
+    lo = max(ep_from or 1, 1)
+    hi = min(ep_to, max(max_ep, 1)) if ep_to else max(max_ep, 1)
+    if target_ep is not None:
+        lo, hi = max(lo, target_ep), min(hi, target_ep)
+
+    # --- 按集聚合的命中统计（一次扫描） ---
+    hit_where = ["series_id = ?", TV_EPISODE_SQL]
+    hit_params = [series_id]
+    for field, value in tag_filters.items():
+        hit_where.append(f"{field} = ?")
+        hit_params.append(value)
+
+    kw_columns = []
+    kw_params = []
+    for i, kw in enumerate(keywords):
+        match, _ = split_terms([kw])
+        if match:
+            # 长关键字走 FTS 索引，短关键字（如 "简日"）只能逐行子串匹配（和 search_episodes 同样逐列 LIKE）
+            kw_columns.append(f", MAX(id IN (SELECT rowid FROM magnets_fts WHERE magnets_fts MATCH ?)) AS kw{i}")
+            kw_params.append(match)
+        else:
+            kw_columns.append(f", MAX({SHORT_TERM_SQL}) AS kw{i}")
+            kw_params.extend([like_pattern(kw)] * SHORT_TERM_SQL.count('?'))
+
+    # --- 外层对集数序列的筛选 ---
+    where = []
+    where_params = []
+    if status == 'existing':
+        where.append("hits.cnt IS NOT NULL")
+    elif status == 'missing':
+        where.append("hits.cnt IS NULL")
+    if tag_filters:
+        where.append("hits.cnt IS NOT NULL")
+    for i, kw in enumerate(keywords):
+        where.append(f"(instr(CAST(eps.num AS TEXT), ?) > 0 OR hits.kw{i} = 1)")
+        where_params.append(kw)
+    if episodes is not None:
+        where.append("eps.num IN (SELECT value FROM json_each(?))")
+        where_params.append('[' + ','.join(str(int(e)) for e in episodes) + ']')
+
+    base_sql = f"""
+        WITH RECURSIVE eps(num) AS (
+            SELECT ? WHERE ? >= ?
+            UNION ALL
+            SELECT num - 1 FROM eps WHERE num > ?
+        ),
+        hits AS (
+            SELECT episode_num AS num, COUNT(*) AS cnt {''.join(kw_columns)}
+            FROM magnets m
+            WHERE {' AND '.join(hit_where)}
+            GROUP BY 1
+        )
+        SELECT eps.num, COALESCE(hits.cnt, 0) FROM eps LEFT JOIN hits ON hits.num = eps.num
+        {('WHERE ' + ' AND '.join(where)) if where else ''}
+    """
+    params = [hi, hi, lo, lo] + kw_params + hit_params + where_params
+
+    cursor.execute(f"SELECT COUNT(*) FROM ({base_sql})", params)
+    total = cursor.fetchone()[0]
+
+    page_size = max(0, min(int(page_size), MAX_PAGE_SIZE)) if page_size else 0
+    page = max(int(page or 1), 1)
+
+    if locate is not None and page_size:
+        cursor.execute(f"SELECT COUNT(*) FROM ({base_sql}) WHERE num > ?", params + [int(locate)])
+        page = cursor.fetchone()[0] // page_size + 1
+
+    sql = base_sql + " ORDER BY eps.num DESC"
+    page_params = list(params)
+    if page_size:
+        sql += " LIMIT ? OFFSET ?"
+        page_params += [page_size, (page - 1) * page_size]
+    cursor.execute(sql, page_params)
+    page_eps = [row[0] for row in cursor.fetchall()]
+
+    # --- 只加载当前页涉及的磁链 ---
+    grouped = {num: [] for num in page_eps}
+    if page_eps:
+        page_json = '[' + ','.join(str(n) for n in page_eps) + ']'
+        if best and not tag_filters:
+            # 精选直接读物化的 best_picks 表
+            cursor.execute(f"""
+                SELECT m.* FROM best_picks b JOIN magnets m ON m.id = b.magnet_id
+                WHERE b.series_id = ? AND b.kind = 'tv' AND b.episode_num IN (SELECT value FROM json_each(?))
+            """, (series_id, page_json))
+        else:
+            row_where = ["series_id = ?", TV_EPISODE_SQL, "episode_num IN (SELECT value FROM json_each(?))"]
+            row_params = [series_id, page_json]
+            for field, value in tag_filters.items():
+                row_where.append(f"{field} = ?")
+                row_params.append(value)
+            cursor.execute(
+                f"SELECT * FROM magnets WHERE {' AND '.join(row_where)} ORDER BY id DESC",
+                row_params
+            )
+        columns = [d[0] for d in cursor.description]
+        rows = attach_trackers(cursor, [dict(zip(columns, row)) for row in cursor.fetchall()])
+        for item in rows:
+            grouped[item['episode_num']].append(item)
+
+        if best and tag_filters:
+            # 带标签筛选时精选要在筛选后的磁链里重新排名
+            ranking = get_ranking(cursor)
+            for num, rows in grouped.items():
+                grouped[num] = [pick_best(rows, ranking)] if rows else []
+
+    return {
+        "episodes": [{"num": num, "data": grouped[num]} for num in page_eps],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "max_episode": max_ep
+    }
+
+
+def get_tag_options(conn):
+    """
+    Distinct values of the four tag columns, for the priority settings popover.
+    """
+    cursor = conn.cursor()
+    options = {}
+    # 获取四个核心维度的所有去重选项
+    for field in ('resolution', 'subtitle', 'source_type', 'container'):
+        # field 来自上面的固定列表，拼接进 SQL 是安全的
+        cursor.execute(f"SELECT DISTINCT {field} FROM magnets WHERE {field} IS NOT NULL AND {field} != ''")
+        options[field] = sorted(row[0] for row in cursor.fetchall() if row[0])
+    return options
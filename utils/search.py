@@ -0,0 +1,130 @@
+import re
+import json
+
+from config import FTS_COLUMNS
+from utils.magnets import attach_trackers
+from utils.series import DEFAULT_SERIES_ID
+
+# trigram 分词器的最短可索引长度。更短的关键字（"简日"、"日"）用不了索引，只能逐行逐列 LIKE，
+# 耗时随行数线性增长（10 万行约 0.2-0.3 秒）；结果按数据版本缓存，重复查询不受影响
+MIN_FTS_TERM = 3
+
+
+def split_keywords(query):
+    """
+    Splits a search string into (target_episode, keywords).
+    A "#123" token selects exactly one episode, the rest are substring keywords.
+    """
+    target_ep = None
+    keywords = []
+    for kw in (query or '').lower().split():
+        if target_ep is None and re.fullmatch(r'#\d+', kw):
+            target_ep = int(kw[1:])
+        else:
+            keywords.append(kw)
+    return target_ep, keywords
+
+
+def fts_phrase(term):
+    """
+    Quotes a user term as an FTS5 phrase (a plain substring match with trigram).
+    """
+    return '"' + term.replace('"', '""') + '"'
+
+
+def split_terms(keywords):
+    """
+    Splits keywords into an FTS5 MATCH expression (terms with >= 3 chars)
+    and the short terms that have to fall back to a substring scan.
+    """
+    long_terms = [kw for kw in keywords if len(kw) >= MIN_FTS_TERM]
+    short_terms = [kw for kw in keywords if len(kw) < MIN_FTS_TERM]
+    match = ' AND '.join(fts_phrase(kw) for kw in long_terms) if long_terms else None
+    return match, short_terms
+
+
+# 短关键字的子串回退：逐列 LIKE（ASCII 不区分大小写），比拼接整行再 instr 快得多
+SHORT_TERM_SQL = "(" + " OR ".join(
+    f"m.{col.strip()} LIKE ? ESCAPE '\\'" for col in FTS_COLUMNS.split(',')
+) + ")"
+
+
+def like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def search_episodes(conn, q, limit=50, series_id=DEFAULT_SERIES_ID):
+    """
+    Ranked keyword search within one series. Returns matching episodes,
+    best match first, each with the magnets that matched.
+    """
+    target_ep, keywords = split_keywords(q)
+    match, short_terms = split_terms(keywords)
+
+    # FTS 之外的条件（短关键字、集号、剧集），两步查询共用
+    filters = []
+    filter_params = []
+    for kw in short_terms:
+        filters.append(SHORT_TERM_SQL)
+        filter_params.extend([like_pattern(kw)] * SHORT_TERM_SQL.count('?'))
+    if target_ep is not None:
+        filters.append("m.kind = 'tv' AND m.episode_num = ?")
+        filter_params.append(target_ep)
+
+    if not match and not filters:
+        return {"query": q or "", "results": [], "total": 0}
+    filters.append("m.series_id = ?")
+    filter_params.append(series_id)
+
+    if match:
+        # CROSS JOIN 固定由 FTS 驱动；否则规划器会按 series_id 扫 magnets，每行跑一次 MATCH
+        source = "magnets_fts CROSS JOIN magnets m ON m.id = magnets_fts.rowid"
+        score = "bm25(magnets_fts)"
+        where = ["magnets_fts MATCH ?"] + filters
+        params = [match] + filter_params
+    else:
+        source = "magnets m"
+        score = "0"
+        where = filters
+        params = filter_params
+
+    # MATERIALIZED: bm25() 只能在 FTS 扫描本身中求值，不能被展开到外层聚合
+    hits_cte = (f"WITH hits AS MATERIALIZED (SELECT m.id, m.episode, {score} AS score "
+                f"FROM {source} WHERE {' AND '.join(where)})")
+    cursor = conn.cursor()
+
+    # 1. 按集聚合，集的得分取其最佳匹配（bm25 越小越相关）
+    cursor.execute(f"""
+        {hits_cte}
+        SELECT episode, MIN(score) AS best, COUNT(*) OVER () AS total
+        FROM hits
+        GROUP BY episode
+        ORDER BY best, MAX(id) DESC
+        LIMIT ?
+    """, params + [limit])
+    top = cursor.fetchall()
+    if not top:
+        return {"query": q or "", "results": [], "total": 0}
+
+    results = {row[0]: {"episode": row[0], "score": row[1], "data": []} for row in top}
+
+    # 2. 只加载入选集数的匹配磁链：先按集数缩小范围再套用同样的条件，不再把所有命中重新物化一遍
+    #    （短关键字命中几万行时，这一步原来占了大半时间）
+    row_where = list(filters)
+    if match:
+        row_where.append("m.id IN (SELECT rowid FROM magnets_fts WHERE magnets_fts MATCH ?)")
+    cursor.execute(f"""
+        SELECT m.* FROM magnets m
+        WHERE m.episode IN (SELECT value FROM json_each(?)) AND {' AND '.join(row_where)}
+        ORDER BY m.id DESC
+    """, [json.dumps(list(results))] + filter_params + ([match] if match else []))
+    columns = [d[0] for d in cursor.description]
+    for item in attach_trackers(cursor, [dict(zip(columns, row)) for row in cursor.fetchall()]):
+        results[item['episode']]["data"].append(item)
+
+    return {
+        "query": q or "",
+        "results": list(results.values()),
+        "total": top[0][2]
+    }
@@ -0,0 +1,106 @@
+import re
+
+# 迁移时建立的默认剧集（名侦探柯南），也是爬虫数据所属的剧集
+DEFAULT_SERIES_ID = 1
+
+SLUG_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+
+
+def _rows(cursor):
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def list_series(cursor):
+    cursor.execute("""
+        SELECT s.id, s.slug, s.name, s.tmdb_id,
+               (SELECT COUNT(*) FROM feeds f WHERE f.series_id = s.id) AS feeds
+        FROM series s ORDER BY s.id
+    """)
+    return _rows(cursor)
+
+
+def resolve_series(cursor, key):
+    """
+    Series id for an id or slug (None -> the default series).
+    Raises ValueError for unknown series.
+    """
+    if key is None or key == '':
+        return DEFAULT_SERIES_ID
+    key = str(key)
+    if key.isdigit():
+        cursor.execute("SELECT id FROM series WHERE id = ?", (int(key),))
+    else:
+        cursor.execute("SELECT id FROM series WHERE slug = ?", (key,))
+    row = cursor.fetchone()
+    if not row:
+        raise ValueError(f"unknown series: {key}")
+    return row[0]
+
+
+def get_series(cursor, series_id):
+    cursor.execute("SELECT id, slug, name, tmdb_id FROM series WHERE id = ?", (series_id,))
+    rows = _rows(cursor)
+    return rows[0] if rows else None
+
+
+def save_series(cursor, slug, name, tmdb_id=None):
+    """
+    Creates the series or updates the one with the same slug. Returns its id.
+    """
+    if not SLUG_RE.match(slug or ''):
+        raise ValueError("slug must be 1-32 chars of a-z, 0-9, '-' or '_'")
+    if not (name or '').strip():
+        raise ValueError("name is required")
+    cursor.execute("""
+        INSERT INTO series (slug, name, tmdb_id) VALUES (?, ?, ?)
+        ON CONFLICT(slug) DO UPDATE SET name = excluded.name, tmdb_id = excluded.tmdb_id
+    """, (slug, name.strip(), tmdb_id or None))
+    return resolve_series(cursor, slug)
+
+
+def delete_series(cursor, series_id):
+    """
+    Only empty series (no feeds, no magnets) can be deleted.
+    """
+    if series_id == DEFAULT_SERIES_ID:
+        raise ValueError("the default series cannot be deleted")
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM feeds WHERE series_id = ?) OR "
+                   "EXISTS (SELECT 1 FROM magnets WHERE series_id = ?)", (series_id, series_id))
+    if cursor.fetchone()[0]:
+        raise ValueError("series still has feeds or magnets")
+    cursor.execute("DELETE FROM series WHERE id = ?", (series_id,))
+    return cursor.rowcount > 0
+
+
+def list_feeds(cursor, enabled_only=False):
+    cursor.execute(f"""
+        SELECT f.id, f.url, f.name, f.series_id, s.slug AS series, f.enabled
+        FROM feeds f JOIN series s ON s.id = f.series_id
+        {'WHERE f.enabled' if enabled_only else ''}
+        ORDER BY f.id
+    """)
+    feeds = _rows(cursor)
+    for feed in feeds:
+        feed['enabled'] = bool(feed['enabled'])
+    return feeds
+
+
+def save_feed(cursor, url, series_id, name=None, enabled=True):
+    """
+    Creates the feed or updates the one with the same URL. Returns its id.
+    """
+    if not re.match(r'^https?://', url or ''):
+        raise ValueError("feed url must start with http:// or https://")
+    cursor.execute("""
+        INSERT INTO feeds (url, series_id, name, enabled) VALUES (?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            series_id = excluded.series_id, name = excluded.name, enabled = excluded.enabled
+    """, (url, series_id, name, int(bool(enabled))))
+    cursor.execute("SELECT id FROM feeds WHERE url = ?", (url,))
+    return cursor.fetchone()[0]
+
+
+def delete_feed(cursor, feed_id):
+    cursor.execute("DELETE FROM feeds WHERE id = ?", (feed_id,))
+    return cursor.rowcount > 0
@@ -0,0 +1,101 @@
+import os
+import re
+import gzip
+import datetime
+
+from config import SNAPSHOT_DIR, SNAPSHOT_KEEP
+
+try:
+    import zstandard
+except ImportError:  # zstandard 是可选依赖，没有时用 gzip
+    zstandard = None
+
+ZSTD_LEVEL = 10
+GZIP_LEVEL = 6
+TIMESTAMP_FORMAT = '%Y%m%dT%H%M%S'
+NAME_RE = re.compile(r'^tvlist_(\d{8}T\d{6})\.html\.(zst|gz)$')
+
+
+def _compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data), 'zst'
+    return gzip.compress(data, compresslevel=GZIP_LEVEL), 'gz'
+
+
+def _decompress(data, compression):
+    if compression == 'gz':
+        return gzip.decompress(data)
+    if zstandard is None:
+        raise RuntimeError("snapshot is zstd-compressed but the zstandard package is not installed")
+    return zstandard.ZstdDecompressor().decompress(data, max_output_size=1024 * 1024 * 1024)
+
+
+def _parse_name(name):
+    match = NAME_RE.match(name)
+    if not match:
+        return None
+    return {
+        "name": name,
+        "taken_at": datetime.datetime.strptime(match.group(1), TIMESTAMP_FORMAT),
+        "compression": match.group(2),
+    }
+
+
+def save_snapshot(html, directory=SNAPSHOT_DIR, keep=SNAPSHOT_KEEP, taken_at=None):
+    """
+    Stores a captured page (zstd if available, gzip otherwise) and prunes
+    all but the newest `keep` snapshots. Returns the snapshot name.
+    """
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+    taken_at = taken_at or datetime.datetime.now()
+    os.makedirs(directory, exist_ok=True)
+
+    data, compression = _compress(html)
+    name = f"tvlist_{taken_at.strftime(TIMESTAMP_FORMAT)}.html.{compression}"
+    path = os.path.join(directory, name)
+    # 先写临时文件再改名，中途中断不会留下半个快照
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+    for old in list_snapshots(directory)[keep:]:
+        os.remove(os.path.join(directory, old['name']))
+    return name
+
+
+def list_snapshots(directory=SNAPSHOT_DIR):
+    """
+    Stored snapshots, newest first: dicts with name, taken_at, compression, bytes.
+    """
+    if not os.path.isdir(directory):
+        return []
+    snapshots = []
+    for name in os.listdir(directory):
+        info = _parse_name(name)
+        if info is not None:
+            info["bytes"] = os.path.getsize(os.path.join(directory, name))
+            snapshots.append(info)
+    snapshots.sort(key=lambda info: info["taken_at"], reverse=True)
+    return snapshots
+
+
+def load_snapshot(name, directory=SNAPSHOT_DIR):
+    """
+    Returns (html, info) for a snapshot name, or the newest one for 'latest'.
+    Raises FileNotFoundError for unknown names.
+    """
+    if name == 'latest':
+        snapshots = list_snapshots(directory)
+        if not snapshots:
+            raise FileNotFoundError("no snapshots stored")
+        info = snapshots[0]
+    else:
+        # 只接受本模块生成的文件名，防止路径穿越
+        info = _parse_name(name)
+        if info is None or not os.path.exists(os.path.join(directory, name)):
+            raise FileNotFoundError(f"unknown snapshot: {name}")
+
+    with open(os.path.join(directory, info["name"]), 'rb') as f:
+        html = _decompress(f.read(), info["compression"])
+    return html.decode('utf-8'), info
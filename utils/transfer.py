@@ -0,0 +1,170 @@
+import io
+import csv
+import json
+
+from utils.db import db
+from utils.ingest import ingest
+from utils.parser import episode_key
+from utils.series import resolve_series
+
+# 导出的列：series 用 slug（不同实例的 id 可能不同），magnet_link 带回 tracker
+EXPORT_FIELDS = ("series", "episode", "episode_num", "kind", "episode_title", "resolution", "container",
+                 "subtitle", "source_type", "raw_title", "publish_date", "magnet_link")
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+# 导出时每次读取的行数（每页一次短读）/ 导入时每个事务写入的行数
+FETCH_SIZE = 1000
+IMPORT_CHUNK = 2000
+MAX_ERRORS = 20
+
+
+def export_page(conn, series_id=None, after=0, limit=FETCH_SIZE):
+    """
+    Up to `limit` magnets with id > after (of one series, or all), oldest
+    first, as dicts with EXPORT_FIELDS. Returns (last id, records).
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT m.id, s.slug, m.episode, m.episode_num, m.kind, m.episode_title, m.resolution, m.container,
+               m.subtitle, m.source_type, m.raw_title, m.publish_date, m.magnet_link,
+               (SELECT group_concat(url, char(10)) FROM (
+                    SELECT url FROM magnet_trackers t WHERE t.infohash = m.infohash ORDER BY t.rowid))
+        FROM magnets m JOIN series s ON s.id = m.series_id
+        WHERE m.id > ? {'AND m.series_id = ?' if series_id is not None else ''}
+        ORDER BY m.id
+        LIMIT ?
+    """, (after,) + (() if series_id is None else (series_id,)) + (limit,))
+    records = []
+    last_id = after
+    for row in cursor.fetchall():
+        last_id = row[0]
+        record = dict(zip(EXPORT_FIELDS, row[1:-1]))
+        if row[-1]:
+            record["magnet_link"] += ''.join(f"&tr={tracker}" for tracker in row[-1].split('\n'))
+        records.append(record)
+    return last_id, records
+
+
+def export_rows(series_id=None):
+    """
+    Every magnet (or every magnet of one series) in id order. Each page is a
+    short pooled read, so a slow download neither holds a reader slot nor
+    pins a WAL snapshot; rows written meanwhile show up in later pages.
+    """
+    after = 0
+    while True:
+        with db.read() as conn:
+            after, records = export_page(conn, series_id, after)
+        if not records:
+            return
+        yield from records
+
+
+def stream_export(fmt, series_id=None):
+    """
+    Generator of text chunks for a StreamingResponse, one chunk per page.
+    """
+    rows = export_rows(series_id)
+    if fmt == "csv":
+        buffer = io.StringIO()
+        # BOM：Excel 打开中文 CSV 时才能识别 UTF-8
+        buffer.write('\ufeff')
+        writer = csv.DictWriter(buffer, EXPORT_FIELDS, lineterminator='\n')
+        writer.writeheader()
+        for i, record in enumerate(rows, 1):
+            writer.writerow(record)
+            if i % FETCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        batch = []
+        for record in rows:
+            batch.append(json.dumps(record, ensure_ascii=False) + '\n')
+            if len(batch) >= FETCH_SIZE:
+                yield ''.join(batch)
+                batch = []
+        yield ''.join(batch)
+
+
+def _read_rows(f, fmt, summary):
+    if fmt == "csv":
+        try:
+            yield from csv.DictReader(f)
+        except csv.Error as e:
+            _error(summary, f"invalid CSV, import stopped: {e}")
+        return
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            # 坏行跳过，继续读下一行
+            _error(summary, f"invalid JSON: {e}")
+
+
+def _to_record(row):
+    link = (row.get("magnet_link") or '').strip()
+    if not link:
+        raise ValueError("missing magnet_link")
+    record = {field: row.get(field) or None for field in EXPORT_FIELDS}
+    record["magnet_link"] = link
+    if record["episode_num"] is not None:
+        record["episode_num"] = int(record["episode_num"])
+    elif record["episode"] is not None:
+        # 旧数据 / 手写文件可能没有 episode_num，按集数标签推算
+        record["episode_num"], record["kind"] = episode_key(record["episode"])
+    return record
+
+
+def _error(summary, message):
+    summary["errors"] += 1
+    # 同一原因（如未知剧集）只记一条示例
+    if len(summary["error_samples"]) < MAX_ERRORS and message not in summary["error_samples"]:
+        summary["error_samples"].append(message)
+
+
+def import_file(f, fmt):
+    """
+    Upserts an export file (NDJSON or CSV text stream) through utils.ingest,
+    IMPORT_CHUNK rows per write transaction, so memory stays flat and the RSS
+    monitor / scraper can write between chunks. Bad rows are skipped and
+    reported; returns the summed ingest counters.
+    """
+    summary = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0, "errors": 0, "error_samples": []}
+    series_ids = {}
+
+    def flush(records):
+        with db.write() as conn:
+            cursor = conn.cursor()
+            batch = []
+            for record in records:
+                slug = record.pop("series")
+                try:
+                    if slug not in series_ids:
+                        series_ids[slug] = resolve_series(cursor, slug)
+                except ValueError as e:
+                    _error(summary, str(e))
+                    continue
+                batch.append(dict(record, series_id=series_ids[slug]))
+            result = ingest(conn, batch)
+        for key in ("inserted", "updated", "unchanged"):
+            summary[key] += result[key]
+
+    records = []
+    for row in _read_rows(f, fmt, summary):
+        summary["rows"] += 1
+        try:
+            records.append(_to_record(row))
+        except (ValueError, TypeError, AttributeError) as e:
+            _error(summary, f"row {summary['rows']}: {e}")
+            continue
+        if len(records) >= IMPORT_CHUNK:
+            flush(records)
+            records = []
+    if records:
+        flush(records)
+    return summary
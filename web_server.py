@@ -1,59 +1,123 @@
-
+import io
 import os
 import sqlite3
 import asyncio
-import subprocess
-import requests
-from fastapi import FastAPI, BackgroundTasks, Request
-from fastapi.responses import JSONResponse, FileResponse
+import datetime
+import functools
+import json
+import tempfile
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
 from pydantic import BaseModel
+from typing import Optional
 
 # Import existing configs
-from config import DB_PATH, SBSUB_RSS_URL, setup_logger, CREATE_TABLE_SQL
-# Import monitoring logic
-from monitor_rss import monitor
+from config import BASE_DIR, DATA_DIR, SBSUB_RSS_URL, setup_logger
+from utils.queries import query_episodes, get_tag_options, parse_episode_ranges, DEFAULT_PAGE_SIZE, MAX_EPISODE_LIST
+from utils.search import search_episodes
+from utils.picks import get_picks, get_ranking, set_ranking
+from utils.series import (list_series, get_series, save_series, delete_series, resolve_series,
+                          list_feeds, save_feed, delete_feed)
+from utils.db import db, run_read, run_write
+from utils.cache import SnapshotCache, get_data_version, bump_data_version
+from utils.emby import EmbyClient, EmbyError, missing_episodes
+from utils.jobs import JobManager, JobConflict
+from utils.logs import log_path, tail_lines, follow
+from utils.snapshots import list_snapshots
+from utils.transfer import FORMATS, stream_export, import_file
+from utils.changes import ChangeWatcher, get_changes, get_cursor, log_reset, DEFAULT_LIMIT, MAX_LIMIT
+from utils import metrics
 
 # Logging Setup
 logger = setup_logger('web_server')
 
-app = FastAPI()
-
-@app.on_event("startup")
-async def startup_event():
-    # Ensure data directory exists
-    if not os.path.exists(os.path.dirname(DB_PATH)):
-        os.makedirs(os.path.dirname(DB_PATH))
-    
-    # Initialize DB
+@asynccontextmanager
+async def lifespan(app):
+    # Initialize DB (creates data dir, enables WAL, applies migrations)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(CREATE_TABLE_SQL)
-        conn.commit()
-        conn.close()
-        logger.info("Database schema initialized.")
+        version = db.init()
+        logger.info(f"Database schema initialized (version {version}).")
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
+    yield
+    if scheduler is not None:
+        scheduler.shutdown(wait=False)
+    await job_manager.shutdown()
+    await emby_client.close()
+    db.close()
+
+# 导入本模块没有副作用（不启动线程、不连数据库）；
+# feedparser / apscheduler / httpx 等较重的依赖在第一次用到时才加载
+app = FastAPI(lifespan=lifespan)
+# 每个路由的请求耗时直方图，见 /metrics
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Scheduler Setup
-scheduler = BackgroundScheduler()
+# Shared Emby client: pooled connections; library snapshots live in SQLite
+emby_client = EmbyClient()
+
+# Scrape subprocesses: one running job per kind, progress streamed over SSE
+job_manager = JobManager(cwd=BASE_DIR)
+
+# Long-poll / SSE clients of /api/magnets/changes share one cursor poller
+change_watcher = ChangeWatcher(functools.partial(run_read, lambda conn: get_cursor(conn.cursor())), logger=logger)
+
+# Pre-serialized / compressed API responses, invalidated by data_version
+response_cache = SnapshotCache()
+
+def cache_key(request: Request):
+    # 重新编码参数，值里的 & / = 不会和参数分隔符混淆
+    return request.url.path + "?" + urlencode(sorted(request.query_params.multi_items()))
+
+def in_series(fn, series, **kwargs):
+    """
+    build(conn) for cached_snapshot that resolves the `series` query parameter
+    (id or slug, empty = default series) and calls fn(conn, series_id=..., **kwargs).
+    """
+    def build(conn):
+        return fn(conn, series_id=resolve_series(conn.cursor(), series), **kwargs)
+    return build
+
+def cached_snapshot(conn, key, build):
+    """
+    Returns the cached response for the current data version, building it with build(conn) on a miss.
+    Runs inside the DB thread pool.
+    """
+    version = get_data_version(conn.cursor())
+    cached = response_cache.get(version, key)
+    if cached is None:
+        cached = response_cache.put(version, key, build(conn))
+    return cached
+
+# Scheduler Setup: created by the first /api/rss/config call, stopped with the app
+scheduler = None
+
+def get_scheduler():
+    global scheduler
+    if scheduler is None:
+        from apscheduler.schedulers.background import BackgroundScheduler
+        scheduler = BackgroundScheduler()
+        scheduler.start()
+    return scheduler
 
 def run_rss_monitor():
     logger.info("Running scheduled RSS monitor...")
     try:
-        monitor()
+        # feedparser 等只在定时任务真正运行时加载（在调度器线程里）
+        from monitor_rss import monitor
+        ok = monitor()
     except Exception as e:
+        ok = False
         logger.error(f"RSS Monitor failed: {e}")
+    metrics.record_job_result("rss_monitor", "succeeded" if ok else "failed")
 
 # Default job: Run every hour
-# scheduler.add_job(run_rss_monitor, CronTrigger.from_crontab('0 * * * *'), id='rss_monitor')
-scheduler.start()
+# get_scheduler().add_job(run_rss_monitor, CronTrigger.from_crontab('0 * * * *'), id='rss_monitor')
 
 class CronConfig(BaseModel):
     cron_expression: str
@@ -64,185 +128,484 @@ class EmbyConfigRequest(BaseModel):
     host: str
     api_key: str
     tmdb_id: str = "30983"         # 默认柯南 ID
-    max_episode: int = 1191
+    max_episode: int = 0           # 0 = 以数据库里最新的集数为准
+    refresh: bool = False          # 忽略增量同步，强制全量拉取媒体库
+    series: Optional[str] = None   # 剧集 id 或 slug；指定时优先使用该剧集的 TMDB ID
+
+class SeriesRequest(BaseModel):
+    slug: str
+    name: str
+    tmdb_id: Optional[str] = None
+
+class FeedRequest(BaseModel):
+    url: str
+    series: str = "1"              # 剧集 id 或 slug
+    name: Optional[str] = None
+    enabled: bool = True
 
 @app.get("/")
 async def read_root():
     return FileResponse("static/index.html")
 
 @app.get("/api/magnets")
-async def get_magnets():
+async def get_magnets(
+    request: Request,
+    page: int = 1,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    ep_from: Optional[int] = None,
+    ep_to: Optional[int] = None,
+    q: Optional[str] = None,
+    status: str = "all",
+    episodes: Optional[str] = None,
+    locate: Optional[int] = None,
+    resolution: Optional[str] = None,
+    subtitle: Optional[str] = None,
+    source_type: Optional[str] = None,
+    container: Optional[str] = None,
+    best: bool = False,
+    series: Optional[str] = None
+):
+    """
+    Paginated, server-side filtered episode list of one series.
+    episodes: compact list like "1-12,40" (used by the Emby missing filter)
+    status: all / existing / missing
+    best: only the best-ranked magnet per episode (smart filter)
+    series: series id or slug (default: the first series)
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM magnets ORDER BY id DESC") # Show newest first
-        rows = cursor.fetchall()
-        conn.close()
-        
-        # Determine max episode for "missing" logic
-        episodes = []
-        max_ep = 0
-        data_map = {}
-        
-        for row in rows:
-            item = dict(row)
-            episodes.append(item)
-            try:
-                ep_num = int(item['episode']) if item['episode'] and item['episode'].isdigit() else 0
-                if ep_num > max_ep:
-                    max_ep = ep_num
-                # Group by episode number
-                if ep_num > 0:
-                    if ep_num not in data_map:
-                        data_map[ep_num] = []
-                    data_map[ep_num].append(item)
-            except:
-                pass
-
-        return JSONResponse(content={
-            "data": episodes,
-            "max_episode": max_ep,
-            "grouped_by_episode": data_map
-        })
+        build = in_series(
+            query_episodes,
+            series,
+            page=page,
+            page_size=page_size,
+            ep_from=ep_from,
+            ep_to=ep_to,
+            q=q,
+            status=status,
+            episodes=parse_episode_ranges(episodes) if episodes is not None else None,
+            locate=locate,
+            resolution=resolution,
+            subtitle=subtitle,
+            source_type=source_type,
+            container=container,
+            best=best
+        )
+        cached = await run_read(cached_snapshot, cache_key(request), build)
+        return cached.render(request)
+    except ValueError as e:
+        return JSONResponse(content={"error": f"参数错误: {e}"}, status_code=400)
+    except Exception as e:
+        logger.error(f"Get magnets failed: {e}", exc_info=True)
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@app.get("/api/search")
+async def search(request: Request, q: str = "", limit: int = 50, series: Optional[str] = None):
+    """
+    Ranked full-text search over titles and tags of one series, grouped by episode.
+    Terms shorter than 3 characters (e.g. "简日") can't use the trigram index
+    and fall back to a substring scan of the series.
+    """
+    try:
+        build = in_series(search_episodes, series, q=q, limit=max(1, min(limit, 500)))
+        cached = await run_read(cached_snapshot, cache_key(request), build)
+        return cached.render(request)
+    except ValueError as e:
+        return JSONResponse(content={"error": f"参数错误: {e}"}, status_code=400)
+    except sqlite3.OperationalError as e:
+        logger.error(f"Search failed: {e}")
+        return JSONResponse(content={"error": f"搜索语法错误: {e}"}, status_code=400)
     except Exception as e:
+        logger.error(f"Search failed: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 @app.get("/api/options")
-async def get_options():
+async def get_options(request: Request):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        options = {}
-        # 获取四个核心维度的所有去重选项
-        fields = {
-            'resolution': '分辨率',
-            'subtitle': '字幕',
-            'source_type': '来源',
-            'container': '容器'
-        }
-        
-        for field in fields.keys():
-            # Use f-string for field name is safe here because keys are hardcoded above
-            cursor.execute(f"SELECT DISTINCT {field} FROM magnets WHERE {field} IS NOT NULL AND {field} != ''")
-            # 过滤掉 None，转为列表
-            items = [row[0] for row in cursor.fetchall() if row[0]]
-            options[field] = sorted(items)
-            
-        conn.close()
-        return options
+        cached = await run_read(cached_snapshot, cache_key(request), get_tag_options)
+        return cached.render(request)
     except Exception as e:
         logger.error(f"Get options failed: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+@app.get("/api/picks")
+async def get_best_picks(
+    request: Request,
+    episodes: Optional[str] = None,
+    ep_from: Optional[int] = None,
+    ep_to: Optional[int] = None,
+    kind: str = "tv",
+    series: Optional[str] = None
+):
+    """
+    Best magnet per episode from the materialized best_picks table.
+    episodes: compact list like "1-12,40"; ep_from / ep_to: inclusive range
+    """
+    try:
+        build = in_series(
+            get_picks,
+            series,
+            episodes=parse_episode_ranges(episodes) if episodes is not None else None,
+            ep_from=ep_from,
+            ep_to=ep_to,
+            kind=kind
+        )
+        cached = await run_read(cached_snapshot, cache_key(request), build)
+        return cached.render(request)
+    except ValueError as e:
+        return JSONResponse(content={"error": f"参数错误: {e}"}, status_code=400)
+    except Exception as e:
+        logger.error(f"Get picks failed: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+class RankingConfig(BaseModel):
+    ranking: dict
+
+@app.get("/api/picks/config")
+async def get_ranking_config():
+    return {"ranking": await run_read(lambda conn: get_ranking(conn.cursor()))}
+
+@app.post("/api/picks/config")
+async def update_ranking_config(config: RankingConfig):
+    """
+    Saves the smart-filter priorities and recomputes every best pick.
+    """
+    try:
+        ranking = await run_write(lambda conn: set_ranking(conn.cursor(), config.ranking))
+    except ValueError as e:
+        return JSONResponse(content={"error": f"参数错误: {e}"}, status_code=400)
+    return {"ranking": ranking}
+
+@app.get("/api/series")
+async def get_series_list():
+    def load(conn):
+        cursor = conn.cursor()
+        return {"series": list_series(cursor), "feeds": list_feeds(cursor)}
+    return await run_read(load)
+
+@app.post("/api/series")
+async def update_series(req: SeriesRequest):
+    """
+    Creates a series, or updates the one with the same slug.
+    """
+    def save(conn):
+        cursor = conn.cursor()
+        series_id = save_series(cursor, req.slug, req.name, req.tmdb_id)
+        # 缓存的 /api/magnets 等响应按 series 参数解析，改动后一并失效
+        bump_data_version(cursor)
+        return get_series(cursor, series_id)
+
+    try:
+        return await run_write(save)
+    except ValueError as e:
+        return JSONResponse({"error": f"参数错误: {e}"}, status_code=400)
+
+@app.delete("/api/series/{series_id}")
+async def remove_series(series_id: int):
+    def remove(conn):
+        cursor = conn.cursor()
+        deleted = delete_series(cursor, series_id)
+        bump_data_version(cursor)
+        return deleted
+
+    try:
+        if not await run_write(remove):
+            return JSONResponse({"error": "剧集不存在"}, status_code=404)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    return {"status": "success"}
+
+@app.post("/api/feeds")
+async def update_feed(req: FeedRequest):
+    """
+    Adds a feed to a series, or updates the feed with the same URL.
+    The RSS monitor checks every enabled feed concurrently.
+    """
+    def save(conn):
+        cursor = conn.cursor()
+        feed_id = save_feed(cursor, req.url, resolve_series(cursor, req.series), req.name, req.enabled)
+        return next(feed for feed in list_feeds(cursor) if feed['id'] == feed_id)
+
+    try:
+        return await run_write(save)
+    except ValueError as e:
+        return JSONResponse({"error": f"参数错误: {e}"}, status_code=400)
+
+@app.delete("/api/feeds/{feed_id}")
+async def remove_feed(feed_id: int):
+    if not await run_write(lambda conn: delete_feed(conn.cursor(), feed_id)):
+        return JSONResponse({"error": "订阅源不存在"}, status_code=404)
+    return {"status": "success"}
+
 @app.post("/api/emby/missing")
 async def check_emby_missing(config: EmbyConfigRequest):
+    # max_episode 决定要比对的集数序列长度，不限制的话一个请求就能长时间占住读线程
+    if not 0 <= config.max_episode <= MAX_EPISODE_LIST:
+        return JSONResponse({"error": f"参数错误: max_episode 必须在 0-{MAX_EPISODE_LIST} 之间"}, status_code=400)
+
+    def load_series(conn):
+        cursor = conn.cursor()
+        return get_series(cursor, resolve_series(cursor, config.series))
+
     try:
-        headers = {"X-Emby-Token": config.api_key}
-        
-        # 1. 获取 Series ID (优先使用 TMDB ID)
-        search_params = {
-            "Recursive": "true",
-            "IncludeItemTypes": "Series"
-        }
-        
-        # 强制使用 TMDB ID 查询
-        if not config.tmdb_id:
-             return JSONResponse({"error": "必须提供 TMDB ID"}, status_code=400)
-             
-        search_params["AnyProviderIdEquals"] = f"tmdb.{config.tmdb_id}"
-
-        search_res = requests.get(
-            f"{config.host}/Items",
-            headers=headers,
-            params=search_params,
-            timeout=5
+        series = await run_read(load_series)
+    except ValueError as e:
+        return JSONResponse({"error": f"参数错误: {e}"}, status_code=400)
+    # 指定了剧集时用剧集登记的 TMDB ID，否则用请求里的
+    tmdb_id = (series['tmdb_id'] if config.series else None) or config.tmdb_id
+    # 强制使用 TMDB ID 查询
+    if not tmdb_id:
+        return JSONResponse({"error": "必须提供 TMDB ID"}, status_code=400)
+
+    try:
+        state, from_cache = await emby_client.sync_library(
+            config.host, config.api_key, tmdb_id, refresh=config.refresh
         )
-        
-        items = search_res.json().get('Items', [])
-        if not items:
-            return JSONResponse({"error": f"未找到剧集 (TMDB: {config.tmdb_id})"}, status_code=404)
-        
-        series_id = items[0]['Id']
-        
-        # 2. 获取所有集数
-        ep_res = requests.get(
-            f"{config.host}/Items",
-            headers=headers,
-            params={
-                "ParentId": series_id,
-                "Recursive": "true",
-                "IncludeItemTypes": "Episode",
-                "Fields": "IndexNumber"
-            },
-            timeout=10
+        # 缺失 / 可下载的集数直接在 SQLite 里和该剧集的 magnets 对比
+        result = await run_read(
+            missing_episodes, config.host.rstrip('/'), tmdb_id, config.max_episode or None, series['id']
         )
-        
-        existing = set()
-        for item in ep_res.json().get('Items', []):
-            if 'IndexNumber' in item:
-                existing.add(item['IndexNumber'])
-        
-        # 3. 计算缺失
-        full_set = set(range(1, config.max_episode + 1))
-        missing = sorted(list(full_set - existing))
-        
-        return {"missing_episodes": missing, "total_count": len(existing)}
-        
+        result.update(cached=from_cache, fetched_at=state['synced_at'])
+        return result
+    except EmbyError as e:
+        logger.error(f"Emby check failed: {e}")
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
     except Exception as e:
         logger.error(f"Emby check failed: {e}")
         return JSONResponse({"error": str(e)}, status_code=500)
 
+@app.get("/api/export")
+async def export_magnets(format: str = "ndjson", series: Optional[str] = None):
+    """
+    Streams every magnet (or one series) as NDJSON or CSV, straight from a
+    database cursor; the whole table is never held in memory.
+    """
+    if format not in FORMATS:
+        return JSONResponse({"error": f"不支持的格式: {format}"}, status_code=400)
+    try:
+        series_id = await resolve_series_param(series)
+    except ValueError as e:
+        return JSONResponse({"error": f"参数错误: {e}"}, status_code=400)
+    filename = f"magnets_{series or 'all'}_{datetime.date.today():%Y%m%d}.{format}"
+    return StreamingResponse(
+        stream_export(format, series_id),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.post("/api/import")
+async def import_magnets(request: Request, format: str = "ndjson"):
+    """
+    Bulk upsert from an /api/export file sent as the raw request body, e.g.
+    curl --data-binary @magnets.ndjson "http://nas:8000/api/import?format=ndjson"
+    """
+    if format not in FORMATS:
+        return JSONResponse({"error": f"不支持的格式: {format}"}, status_code=400)
+    # 上传内容边收边写到数据目录下的临时文件（NAS 的 /tmp 常是内存盘），再分批入库
+    with tempfile.TemporaryFile(dir=DATA_DIR) as f:
+        async for chunk in request.stream():
+            f.write(chunk)
+        f.seek(0)
+        text = io.TextIOWrapper(f, encoding='utf-8-sig', newline='')
+        try:
+            summary = await asyncio.to_thread(import_file, text, format)
+        except UnicodeDecodeError as e:
+            return JSONResponse({"error": f"文件不是 UTF-8 编码: {e}"}, status_code=400)
+        except Exception as e:
+            logger.error(f"Import failed: {e}")
+            return JSONResponse({"error": str(e)}, status_code=500)
+        finally:
+            text.detach()
+    logger.info(f"Imported {summary['rows']} rows: {summary['inserted']} inserted, "
+                f"{summary['updated']} updated, {summary['errors']} errors")
+    return summary
+
 @app.delete("/api/database")
 async def clear_database():
-    try:
-        conn = sqlite3.connect(DB_PATH)
+    def clear(conn):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM magnets")
-        conn.commit()
-        conn.close()
+        cursor.execute("DELETE FROM best_picks")
+        # 指纹也要清掉，否则下次抓取会把未变化的条目当作已入库而跳过
+        cursor.execute("DELETE FROM item_hashes")
+        # 逐行的删除记录没有意义，直接让所有客户端全量重新同步
+        log_reset(cursor)
+        bump_data_version(cursor)
+
+    try:
+        await run_write(clear)
         logger.info("Database cleared by user request.")
         return {"status": "success", "message": "数据库已清空"}
     except Exception as e:
         logger.error(f"Failed to clear database: {e}")
         return JSONResponse({"error": str(e)}, status_code=500)
 
+def log_job_result(job):
+    duration = job.finished_at - job.started_at
+    metrics.record_job_result(job.kind, job.status, job.finished_at)
+    # 子进程随最终进度上报各阶段耗时和 parse_title 缓存命中
+    for phase, seconds in job.progress.get("timings", {}).items():
+        metrics.scrape_phase_seconds.observe(seconds, phase=phase)
+    cache = job.progress.get("parse_cache")
+    if cache:
+        metrics.record_parse_stats(job.kind, cache["hits"], cache["misses"])
+    if job.status == "succeeded":
+        logger.info(f"Job {job.id} ({job.kind} {' '.join(job.args)}) succeeded in {duration:.0f}s: {job.progress}")
+    else:
+        logger.error(f"Job {job.id} ({job.kind} {' '.join(job.args)}) {job.status} (code {job.returncode})")
+        for line in list(job.lines)[-20:]:
+            logger.error(f"  {line}")
+
+async def start_scrape_job(args, label):
+    try:
+        job = await job_manager.start("scrape", "scraper_history.py", args, on_finish=log_job_result)
+    except JobConflict as e:
+        return JSONResponse({"error": "已有抓取任务在运行", "job_id": e.job.id}, status_code=409)
+    except Exception as e:
+        logger.error(f"Failed to start {label} scrape: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+    logger.info(f"Started {label} scrape job {job.id}")
+    return {"message": f"{label.capitalize()} scrape triggered in background", "job_id": job.id}
+
 @app.post("/api/scrape/full")
-async def trigger_full_scrape(background_tasks: BackgroundTasks):
-    def run_scraper():
-        logger.info("Starting full scrape via subprocess...")
-        # Use subprocess to run the script in a separate process
-        try:
-            import sys
-            # Capture output to ensure errors are logged even if the script crashes early
-            result = subprocess.run(
-                [sys.executable, "scraper_history.py"], 
-                capture_output=True, 
-                text=True,
-                check=False
-            )
-            
-            # stdout is usually already logged by the scraper's logger to file, 
-            # but we can log it here for debug if needed, or just rely on the file.
-            # However, stderr often contains crash info that didn't make it to the log file.
-            if result.stdout:
-                # Avoid flooding logs if stdout is huge, but here it's useful
-                logger.info(f"Scraper process output: \n{result.stdout.strip()}")
-            
-            if result.returncode != 0:
-                logger.error(f"Scraper process failed (code {result.returncode})")
-                if result.stderr:
-                    logger.error(f"Scraper stderr: \n{result.stderr.strip()}")
-            elif result.stderr:
-                # Sometimes warnings go to stderr even on success
-                logger.warning(f"Scraper stderr: \n{result.stderr.strip()}")
-                
-        except Exception as e:
-            logger.error(f"Full scrape subprocess failed: {e}")
+async def trigger_full_scrape():
+    return await start_scrape_job(["--full"], "full")
+
+@app.post("/api/scrape/incremental")
+async def trigger_incremental_scrape():
+    # 只加载到数据库已有的最新一集为止
+    return await start_scrape_job([], "incremental")
+
+@app.get("/api/snapshots")
+async def get_snapshots():
+    snapshots = list_snapshots()
+    return {"snapshots": [dict(info, taken_at=info["taken_at"].isoformat()) for info in snapshots]}
 
-    background_tasks.add_task(run_scraper)
-    return {"message": "Full scrape triggered in background"}
+@app.post("/api/snapshots/{name}/replay")
+async def replay_snapshot(name: str):
+    """
+    Re-runs extraction + ingest from a stored page snapshot ('latest' for the newest)
+    as a scrape job, without launching a browser.
+    """
+    snapshots = list_snapshots()
+    if not snapshots or (name != "latest" and name not in {info["name"] for info in snapshots}):
+        return JSONResponse({"error": "快照不存在"}, status_code=404)
+    return await start_scrape_job(["--replay", name], "replay")
+
+@app.get("/api/jobs")
+async def list_jobs():
+    return {"jobs": job_manager.list()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "任务不存在"}, status_code=404)
+    return job.to_dict()
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "任务不存在"}, status_code=404)
+    if not await job_manager.cancel(job):
+        return JSONResponse({"error": "任务已结束"}, status_code=409)
+    return {"message": "Job cancelled", "job_id": job.id}
+
+def sse_message(event, data, event_id=None):
+    if event == "ping":
+        return ": ping\n\n"
+    # 带 id 时浏览器断线重连会通过 Last-Event-ID 带回来
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events: status snapshot, then progress / line events until the job ends.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "任务不存在"}, status_code=404)
+
+    async def stream():
+        async for event, data in job.events():
+            yield sse_message(event, data)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def resolve_series_param(series):
+    return await run_read(lambda conn: resolve_series(conn.cursor(), series)) if series else None
+
+@app.get("/api/magnets/changes")
+async def magnet_changes(
+    since: Optional[int] = None,
+    limit: int = DEFAULT_LIMIT,
+    series: Optional[str] = None,
+    wait: float = 0
+):
+    """
+    Incremental sync: magnets changed after cursor `since`, plus the cursor to
+    send next time. Without `since` (or with reset=true in the answer) the
+    client reloads /api/magnets and continues from the returned cursor.
+    wait: long-poll up to that many seconds (max 60) until something changes.
+    """
+    try:
+        series_id = await resolve_series_param(series)
+    except ValueError as e:
+        return JSONResponse({"error": f"参数错误: {e}"}, status_code=400)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max(0, min(wait, 60))
+    while True:
+        result = await run_read(get_changes, since, limit, series_id)
+        remaining = deadline - loop.time()
+        if result["reset"] or result["changed"] or result["deleted"] or result["more"] or remaining <= 0:
+            return result
+        # 游标可能因为其他剧集的变更前进了，继续等本剧集的
+        since = result["cursor"]
+        await change_watcher.wait(since, remaining)
+
+@app.get("/api/magnets/changes/stream")
+async def stream_magnet_changes(request: Request, since: Optional[int] = None, series: Optional[str] = None):
+    """
+    Server-Sent Events: a 'changes' event (the /api/magnets/changes payload,
+    id = cursor) whenever magnets change, or 'reset' when the client has to
+    reload everything. Reconnects resume from Last-Event-ID.
+    """
+    try:
+        series_id = await resolve_series_param(series)
+    except ValueError as e:
+        return JSONResponse({"error": f"参数错误: {e}"}, status_code=400)
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+
+    async def stream():
+        cursor = since
+        while True:
+            result = await run_read(get_changes, cursor, MAX_LIMIT, series_id)
+            if result["reset"]:
+                yield sse_message("reset", {"cursor": result["cursor"]}, result["cursor"])
+            elif result["changed"] or result["deleted"]:
+                yield sse_message("changes", result, result["cursor"])
+            cursor = result["cursor"]
+            if result["more"]:
+                continue
+            if not await change_watcher.wait(cursor, 15):
+                yield sse_message("ping", None)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus text exposition. Everything except the DB gauges is kept
+    in memory as it happens; those are refreshed here.
+    """
+    await run_read(metrics.collect_db_stats, db.path)
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.post("/api/rss/config")
 async def configure_rss(config: CronConfig):
@@ -251,22 +614,27 @@ async def configure_rss(config: CronConfig):
         if not config.cron_expression.strip():
             return JSONResponse(content={"error": "Cron expression cannot be empty"}, status_code=400)
 
+        from apscheduler.triggers.cron import CronTrigger
         trigger = CronTrigger.from_crontab(config.cron_expression)
-        
+
         job_id = 'rss_monitor'
-        job_exists = scheduler.get_job(job_id)
+        # 关闭一个从未开启过的任务时不必启动调度器
+        if not config.enabled and scheduler is None:
+            return {"message": "RSS Monitor DISABLED"}
+        rss_scheduler = get_scheduler()
+        job_exists = rss_scheduler.get_job(job_id)
         
         if config.enabled:
             if job_exists:
-                scheduler.reschedule_job(job_id, trigger=trigger)
+                rss_scheduler.reschedule_job(job_id, trigger=trigger)
                 logger.info(f"Rescheduled RSS job: {config.cron_expression}")
             else:
-                scheduler.add_job(run_rss_monitor, trigger, id=job_id)
+                rss_scheduler.add_job(run_rss_monitor, trigger, id=job_id)
                 logger.info(f"Added RSS job: {config.cron_expression}")
             return {"message": f"RSS Monitor ENABLED with schedule: {config.cron_expression}"}
         else:
             if job_exists:
-                scheduler.remove_job(job_id)
+                rss_scheduler.remove_job(job_id)
                 logger.info("Removed RSS job")
             return {"message": "RSS Monitor DISABLED"}
             
@@ -283,27 +651,53 @@ async def configure_rss(config: CronConfig):
         logger.error(f"RSS Config Error: {e}")
         return JSONResponse(content={"error": f"配置错误: {e}"}, status_code=400)
 
+def resolve_log(name):
+    """
+    Explicit name, or scraper.log with a fallback to web_server.log like before.
+    """
+    if name:
+        return log_path(name)
+    target_log = log_path("scraper")
+    if not os.path.exists(target_log):
+        target_log = log_path("web_server")
+    return target_log
+
 @app.get("/api/system/logs")
-async def get_logs():
-    # Read the latest logs from logs/ directory
-    # Prioritize scraper.log
-    
-    target_log = os.path.join("logs", "scraper.log")
+async def get_logs(name: Optional[str] = None, lines: int = 50):
+    try:
+        target_log = resolve_log(name)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
     if not os.path.exists(target_log):
-        # Fallback to web_server.log
-        target_log = os.path.join("logs", "web_server.log")
-        if not os.path.exists(target_log):
-             return {"logs": ["Log file not found."]}
+        return {"logs": ["Log file not found."]}
 
     try:
-        # Simple tail implementation
-        with open(target_log, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-            last_50 = lines[-50:]
-            return {"logs": last_50}
+        # 从文件末尾倒着读，不随文件大小变慢
+        return {"logs": tail_lines(target_log, max(0, min(lines, 1000)))}
     except Exception as e:
         return {"logs": [f"Error reading logs: {e}"]}
 
+@app.get("/api/system/logs/stream")
+async def stream_logs(name: Optional[str] = None, lines: int = 50):
+    """
+    Server-Sent Events: the last `lines` lines, then every new line as it is written.
+    """
+    try:
+        target_log = resolve_log(name)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    async def stream():
+        initial = []
+        if os.path.exists(target_log):
+            initial = tail_lines(target_log, max(0, min(lines, 1000)))
+        yield sse_message("tail", initial)
+        async for line in follow(target_log):
+            yield sse_message("line", line)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=4869)